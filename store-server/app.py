@@ -1,24 +1,22 @@
 import asyncio
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from sqlalchemy import select, update
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.routing import APIRoute
-from operations.utils.conf import Base
-from operations.schemas.object_schemas import (
-    DBLogicalObject,
-    DBPhysicalObjectLocator,
-    Status,
-    HealthcheckResponse,
-)
-from operations.schemas.bucket_schemas import DBLogicalBucket, DBPhysicalBucketLocator
+from operations.schemas.object_schemas import HealthcheckResponse
 from operations.bucket_operations import router as bucket_operations_router
 from operations.object_operations import router as object_operations_router
-from operations.utils.db import engine
+from operations.utils.db import engine, logger
+from operations.utils.key_filter import key_filter
+from operations.utils.lease import WORKERS, Lease
+from operations.utils.metrics import CONTENT_TYPE, MetricsMiddleware, render
+from operations.utils.migrations import run_migrations
+from operations.utils.sweeper import sweep_timed_out_locks
 
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 
 load_dotenv()
 app.include_router(bucket_operations_router)
@@ -26,6 +24,8 @@ app.include_router(object_operations_router)
 
 stop_task_flag = asyncio.Event()
 background_tasks = set()
+# Outlives the sweep interval, so the worker holding it keeps it from one sweep to the next
+sweeper_lease = Lease("lock_timeout_sweeper", ttl=timedelta(minutes=25))
 
 
 async def rm_lock_on_timeout(minutes: int = 10, test: bool = False):
@@ -33,88 +33,11 @@ async def rm_lock_on_timeout(minutes: int = 10, test: bool = False):
     if not test:
         await asyncio.sleep(minutes)
     while not stop_task_flag.is_set() or test:
-        async with engine.begin() as db:
+        # only the worker holding the lease sweeps, so workers never fight over the same rows
+        if await sweeper_lease.acquire():
             # calculate time for which we can timeout. Anything before or equal to 10 minutes ago will timeout
-            cutoff_time = datetime.utcnow() - timedelta(minutes)
-
-            # time out Physical objects that have been running for more than 10 minutes
-            stmt_timeout_physical_objects = (
-                update(DBPhysicalObjectLocator)
-                .where(DBPhysicalObjectLocator.lock_acquired_ts <= cutoff_time)
-                .values(status=Status.ready, lock_acquired_ts=None)
-            )
-            await db.execute(stmt_timeout_physical_objects)
-
-            # time out Physical buckets that have been running for more than 10 minutes
-            stmt_timeout_physical_buckets = (
-                update(DBPhysicalBucketLocator)
-                .where(DBPhysicalBucketLocator.lock_acquired_ts <= cutoff_time)
-                .values(status=Status.ready, lock_acquired_ts=None)
-            )
-            await db.execute(stmt_timeout_physical_buckets)
-
-            # find Logical objects that are pending
-            stmt_find_pending_logical_objs = select(DBLogicalObject).where(
-                DBLogicalObject.status == Status.pending
-            )
-            pendingLogicalObjs = (
-                await db.execute(stmt_find_pending_logical_objs)
-            ).fetchall()
-
-            if pendingLogicalObjs is not None:
-                # loop through list of pending logical objects
-                for logical_obj in pendingLogicalObjs:
-                    # get all physical objects corresponding to a given logical object
-                    stmt3 = (
-                        select(DBPhysicalObjectLocator)
-                        .join(DBLogicalObject)
-                        .where(
-                            logical_obj.id == DBPhysicalObjectLocator.logical_object_id
-                        )
-                    )
-                    objects = (await db.execute(stmt3)).fetchall()
-
-                    # set logical objects status to "Ready" if all of its physical objects are "Ready"
-                    if all([Status.ready == obj.status for obj in objects]):
-                        edit_logical_obj_stmt = (
-                            update(DBLogicalObject)
-                            .where(objects[0].logical_object_id == logical_obj.id)
-                            .values(status=Status.ready)
-                        )
-                        await db.execute(edit_logical_obj_stmt)
-
-            # find Logical buckets that are pending
-            stmt_find_pending_logical_buckets = select(DBLogicalBucket).where(
-                DBLogicalBucket.status == Status.pending
-            )
-            pendingLogicalBuckets = (
-                await db.execute(stmt_find_pending_logical_buckets)
-            ).fetchall()
-
-            if pendingLogicalBuckets is not None:
-                # loop through list of pending logical buckets
-                for logical_bucket in pendingLogicalBuckets:
-                    # get all physical buckets corresponding to a given logical object
-                    stmt3 = (
-                        select(DBPhysicalBucketLocator)
-                        .join(DBLogicalBucket)
-                        .where(
-                            logical_bucket.id
-                            == DBPhysicalBucketLocator.logical_bucket_id
-                        )
-                    )
-                    buckets = (await db.execute(stmt3)).fetchall()
-
-                    # set logical buckets status to "Ready" if all of its physical buckets are "Ready"
-                    if all([Status.ready == bucket.status for bucket in buckets]):
-                        edit_logical_bucket_stmt = (
-                            update(DBLogicalBucket)
-                            .where(buckets[0].logical_bucket_id == logical_bucket.id)
-                            .values(status=Status.ready)
-                        )
-                        await db.execute(edit_logical_bucket_stmt)
-
-            await db.commit()
+            cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+            await sweep_timed_out_locks(cutoff_time)
 
         if test:
             break
@@ -127,14 +50,17 @@ async def shutdown_event():
     # Set the flag to signal the background task to stop
     stop_task_flag.set()
     background_tasks.discard
+    await sweeper_lease.release()
 
 
 @app.on_event("startup")
 async def startup():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        # await conn.exec_driver_sql("pragma journal_mode=memory")
-        # await conn.exec_driver_sql("pragma synchronous=OFF")
+        await run_migrations(conn)
+    if WORKERS > 1:
+        logger.info(f"Running as one of {WORKERS} workers, metadata caches disabled")
+    if key_filter is not None:
+        await key_filter.rebuild()
 
     task = asyncio.create_task(rm_lock_on_timeout())
     background_tasks.add(task)
@@ -145,6 +71,11 @@ async def healthz() -> HealthcheckResponse:
     return HealthcheckResponse(status="OK")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+
 ## Add routes above this function
 def use_route_names_as_operation_ids(app: FastAPI) -> None:
     """
@@ -0,0 +1,106 @@
+"""
+Measure `append_part` latency as a multipart upload accumulates parts.
+
+Run from the store-server directory:
+
+    python -m benchmark.append_part_latency --parts 10000 --window 1000
+
+Each part is appended to the primary locator, which records it in both the physical and the
+logical part tables. Latency is reported per window of consecutive part numbers, so it stays
+flat when recording a part does not depend on how many parts exist.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import List
+
+import typer
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from operations.object_operations import append_part
+from operations.schemas.object_schemas import (
+    DBLogicalObject,
+    DBPhysicalObjectLocator,
+    PatchUploadMultipartUploadPart,
+)
+from operations.utils.conf import Base, Status
+
+BUCKET = "bench-bucket"
+REGION = "aws:us-west-1"
+
+
+async def _measure(db_path: str, parts: int) -> List[float]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(
+                insert(DBLogicalObject).values(
+                    id=1,
+                    bucket=BUCKET,
+                    key="multipart-key",
+                    last_modified=datetime.utcnow(),
+                    status=Status.pending,
+                    multipart_upload_id="upload-id",
+                )
+            )
+            await conn.execute(
+                insert(DBPhysicalObjectLocator).values(
+                    id=1,
+                    logical_object_id=1,
+                    location_tag=REGION,
+                    cloud=REGION.split(":")[0],
+                    region=REGION.split(":")[1],
+                    bucket=f"skystore-{REGION.split(':')[1]}",
+                    key="multipart-key",
+                    status=Status.pending,
+                    is_primary=True,
+                    multipart_upload_id="physical-upload-id",
+                )
+            )
+
+        latencies = []
+        for part_number in range(1, parts + 1):
+            request = PatchUploadMultipartUploadPart(
+                id=1, part_number=part_number, etag=f"etag-{part_number}", size=5
+            )
+            async with session_maker() as db:
+                start = time.perf_counter()
+                await append_part(request, db)
+                latencies.append(time.perf_counter() - start)
+        return latencies
+    finally:
+        await engine.dispose()
+
+
+def main(
+    parts: int = typer.Option(10_000, help="Parts appended to one upload"),
+    window: int = typer.Option(1000, help="Parts per reported latency window"),
+    db_path: str = typer.Option("append_part_bench.db", help="Scratch SQLite database"),
+):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    latencies = asyncio.run(_measure(db_path, parts))
+
+    print(f"{'parts':>14} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for start in range(0, parts, window):
+        window_latencies = sorted(latencies[start : start + window])
+        p99 = window_latencies[
+            min(len(window_latencies) - 1, int(len(window_latencies) * 0.99))
+        ]
+        print(
+            f"{start + 1:>6}-{start + len(window_latencies):<7} "
+            f"{statistics.mean(window_latencies) * 1e3:>10.3f} "
+            f"{statistics.median(window_latencies) * 1e3:>10.3f} {p99 * 1e3:>10.3f}"
+        )
+
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    typer.run(main)
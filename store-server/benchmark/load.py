@@ -0,0 +1,618 @@
+"""
+Load test the metadata API with the request sequences the S3 proxy issues.
+
+Run from the store-server directory:
+
+    python -m benchmark.load --buckets 4 --objects 25000 --concurrency 32
+    python -m benchmark.load --server uvicorn --scenarios get_hit,push_write
+    python -m benchmark.load --db-url postgresql+asyncpg://... --output results.json
+    python -m benchmark.load --server uvicorn --workers 1,2,4 --scenarios get_hit,list
+
+The database (a scratch SQLite file by default) is reset and populated with `buckets` x
+`objects` ready objects stored in the buckets' primary region. Each scenario then runs
+`requests` flows, `concurrency` at a time, either in-process through `httpx.ASGITransport`
+or against a `uvicorn` subprocess. Scenarios:
+
+    get_hit       locate_object from the object's region
+    pull_miss     locate_object from another region, then copy the object there
+                  (start_upload + complete_upload with copy_on_read)
+    push_write    start_upload with push to the primary and `regions - 1` warmup regions,
+                  then complete_upload for every copy
+    multipart     a push multipart upload with `parts` parts: set_multipart_id,
+                  continue_upload + append_part per part, then continue_upload
+                  listing the parts and complete_upload
+    list          one list_objects_v2 page starting at a random key
+    bulk_delete   start_delete_objects on `delete_batch` keys, then
+                  complete_delete_objects
+
+Per scenario and per endpoint it reports throughput and p50/p95/p99 latency as JSON, and per
+endpoint the SQL statements, and repeated statement shapes, executed per call. Given several
+worker counts it repeats the scenarios against a fresh `uvicorn` at each count and reports each
+scenario's throughput relative to the first count. Read scenarios (get_hit, list) should scale
+close to linearly up to the number of cores the server and database have; the benchmark
+client runs in one process, so give it enough `concurrency` to keep every worker busy.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import typer
+
+SCENARIOS = ["get_hit", "pull_miss", "push_write", "multipart", "list", "bulk_delete"]
+INSERT_CHUNK = 10_000
+LAST_MODIFIED = "2020-01-01T00:00:00"
+
+
+def _bucket_name(b: int) -> str:
+    return f"bench-bucket-{b}"
+
+
+def _key(i: int) -> str:
+    return f"key-{i:09d}"
+
+
+def _summarize(latencies: List[float], duration: float) -> Dict[str, float]:
+    if not latencies:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+    return {
+        "count": len(latencies),
+        "per_second": len(latencies) / duration,
+        "latency_ms": {
+            "mean": float(np.mean(latencies) * 1e3),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+        },
+    }
+
+
+class RequestFailed(Exception):
+    pass
+
+
+def _summarize_statements(statements: List[int], repeated: List[int]) -> Dict:
+    if not statements:
+        return {}
+    return {
+        "sql_statements": {"mean": float(np.mean(statements)), "max": max(statements)},
+        "sql_repeated_statements": {
+            "mean": float(np.mean(repeated)),
+            "max": max(repeated),
+        },
+    }
+
+
+class Recorder:
+    """An httpx client that records the latency of every call by endpoint, and the SQL
+    statements the server reports for it in debug mode."""
+
+    def __init__(self, client: httpx.AsyncClient) -> None:
+        self.client = client
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statements: Dict[str, List[int]] = {}
+        self.repeated: Dict[str, List[int]] = {}
+
+    async def call(self, method: str, path: str, body: dict):
+        start = time.perf_counter()
+        resp = await self.client.request(method, path, json=body)
+        elapsed = time.perf_counter() - start
+        if resp.status_code >= 400:
+            self.errors[path] = self.errors.get(path, 0) + 1
+            raise RequestFailed(f"{method} {path}: {resp.status_code} {resp.text}")
+        self.latencies.setdefault(path, []).append(elapsed)
+        if "x-skystore-sql-statements" in resp.headers:
+            self.statements.setdefault(path, []).append(
+                int(resp.headers["x-skystore-sql-statements"])
+            )
+            self.repeated.setdefault(path, []).append(
+                int(resp.headers["x-skystore-sql-repeated"])
+            )
+        return resp.json()
+
+
+class LoadTest:
+    def __init__(
+        self,
+        regions: List[str],
+        buckets: int,
+        objects: int,
+        fanout: int,
+        parts: int,
+        delete_batch: int,
+    ) -> None:
+        self.regions = regions
+        self.buckets = buckets
+        self.objects = objects
+        self.fanout = fanout
+        self.parts = parts
+        self.delete_batch = delete_batch
+
+    def capacity(self, scenario: str) -> Optional[int]:
+        """Flows a scenario can run before it runs out of untouched objects."""
+        if scenario == "pull_miss":
+            return self.buckets * self.objects * (len(self.regions) - 1)
+        if scenario == "bulk_delete":
+            return self.buckets * (self.objects // self.delete_batch)
+        return None
+
+    async def create_buckets(self, client: httpx.AsyncClient) -> List[dict]:
+        """Create the buckets through the API; returns each bucket's primary locator."""
+        primaries = []
+        for b in range(self.buckets):
+            resp = await client.post(
+                "/start_create_bucket",
+                json={
+                    "bucket": _bucket_name(b),
+                    "client_from_region": self.regions[0],
+                    "warmup_regions": self.regions[1 : self.fanout],
+                },
+            )
+            resp.raise_for_status()
+            for locator in resp.json()["locators"]:
+                (
+                    await client.patch(
+                        "/complete_create_bucket",
+                        json={"id": locator["id"], "creation_date": LAST_MODIFIED},
+                    )
+                ).raise_for_status()
+                if locator["tag"] == self.regions[0]:
+                    primaries.append(locator)
+        return primaries
+
+    async def populate(self, engine, primaries: List[dict]) -> None:
+        """Bulk insert the ready objects, one primary copy each."""
+        from sqlalchemy import insert
+
+        from operations.schemas.object_schemas import (
+            DBLogicalObject,
+            DBPhysicalObjectLocator,
+        )
+        from operations.utils.conf import Status
+        from operations.utils.key_filter import key_filter
+
+        now = datetime.utcnow()
+        for b, primary in enumerate(primaries):
+            for start in range(0, self.objects, INSERT_CHUNK):
+                keys = [
+                    _key(i)
+                    for i in range(start, min(start + INSERT_CHUNK, self.objects))
+                ]
+                async with engine.begin() as conn:
+                    ids = (
+                        await conn.execute(
+                            insert(DBLogicalObject).returning(
+                                DBLogicalObject.id, sort_by_parameter_order=True
+                            ),
+                            [
+                                dict(
+                                    bucket=_bucket_name(b),
+                                    key=key,
+                                    size=1024,
+                                    last_modified=now,
+                                    etag="etag",
+                                    status=Status.ready,
+                                )
+                                for key in keys
+                            ],
+                        )
+                    ).scalars()
+                    await conn.execute(
+                        insert(DBPhysicalObjectLocator),
+                        [
+                            dict(
+                                logical_object_id=id,
+                                location_tag=primary["tag"],
+                                cloud=primary["cloud"],
+                                region=primary["region"],
+                                bucket=primary["bucket"],
+                                key=key,
+                                status=Status.ready,
+                                is_primary=True,
+                            )
+                            for id, key in zip(ids, keys)
+                        ],
+                    )
+
+        if key_filter is not None:
+            # The objects bypassed the API, so the in-process server's filter lacks them
+            await key_filter.rebuild()
+
+    async def _complete(self, r: Recorder, locators: List[dict], policy: str) -> None:
+        for locator in locators:
+            await r.call(
+                "PATCH",
+                "/complete_upload",
+                {
+                    "id": locator["id"],
+                    "size": 1024,
+                    "etag": "etag",
+                    "last_modified": LAST_MODIFIED,
+                    "policy": policy,
+                },
+            )
+
+    async def get_hit(self, r: Recorder, i: int) -> None:
+        await r.call(
+            "POST",
+            "/locate_object",
+            {
+                "bucket": _bucket_name(i % self.buckets),
+                "key": _key(random.randrange(self.objects)),
+                "client_from_region": self.regions[0],
+            },
+        )
+
+    async def pull_miss(self, r: Recorder, i: int) -> None:
+        # Every (object, region) pair is pulled at most once
+        j = i // self.buckets
+        request = {
+            "bucket": _bucket_name(i % self.buckets),
+            "key": _key(j % self.objects),
+            "client_from_region": self.regions[1 + j // self.objects],
+        }
+        await r.call("POST", "/locate_object", request)
+        resp = await r.call(
+            "POST",
+            "/start_upload",
+            {**request, "is_multipart": False, "policy": "copy_on_read"},
+        )
+        await self._complete(r, resp["locators"], "copy_on_read")
+
+    async def push_write(self, r: Recorder, i: int) -> None:
+        resp = await r.call(
+            "POST",
+            "/start_upload",
+            {
+                "bucket": _bucket_name(i % self.buckets),
+                "key": f"push-{i:09d}",
+                "client_from_region": self.regions[0],
+                "is_multipart": False,
+                "policy": "push",
+            },
+        )
+        await self._complete(r, resp["locators"], "push")
+
+    async def multipart(self, r: Recorder, i: int) -> None:
+        request = {
+            "bucket": _bucket_name(i % self.buckets),
+            "key": f"multipart-{i:09d}",
+            "client_from_region": self.regions[0],
+        }
+        resp = await r.call(
+            "POST",
+            "/start_upload",
+            {**request, "is_multipart": True, "policy": "push"},
+        )
+        upload_id = resp["multipart_upload_id"]
+        for locator in resp["locators"]:
+            await r.call(
+                "PATCH",
+                "/set_multipart_id",
+                {
+                    "id": locator["id"],
+                    "multipart_upload_id": f"{upload_id}-{locator['id']}",
+                },
+            )
+
+        continue_request = {**request, "multipart_upload_id": upload_id}
+        for part_number in range(1, self.parts + 1):
+            locators = await r.call(
+                "POST", "/continue_upload", {**continue_request, "do_list_parts": False}
+            )
+            for locator in locators:
+                await r.call(
+                    "PATCH",
+                    "/append_part",
+                    {
+                        "id": locator["id"],
+                        "part_number": part_number,
+                        "etag": f"etag-{part_number}",
+                        "size": 8 * 2**20,
+                    },
+                )
+        locators = await r.call(
+            "POST", "/continue_upload", {**continue_request, "do_list_parts": True}
+        )
+        await self._complete(r, locators, "push")
+
+    async def list(self, r: Recorder, i: int) -> None:
+        await r.call(
+            "POST",
+            "/list_objects_v2",
+            {
+                "bucket": _bucket_name(i % self.buckets),
+                "start_after": _key(random.randrange(self.objects)),
+            },
+        )
+
+    async def bulk_delete(self, r: Recorder, i: int) -> None:
+        # Take keys from the end so that pulled objects are deleted last
+        end = self.objects - (i // self.buckets) * self.delete_batch
+        resp = await r.call(
+            "POST",
+            "/start_delete_objects",
+            {
+                "bucket": _bucket_name(i % self.buckets),
+                "keys": [_key(k) for k in range(end - self.delete_batch, end)],
+            },
+        )
+        ids = [
+            locator["id"]
+            for locators in resp["locators"].values()
+            for locator in locators
+        ]
+        await r.call("PATCH", "/complete_delete_objects", {"ids": ids})
+
+    async def run(
+        self, client: httpx.AsyncClient, scenario: str, requests: int, concurrency: int
+    ) -> dict:
+        flow: Callable = getattr(self, scenario)
+        recorder = Recorder(client)
+        flow_latencies: List[float] = []
+        flow_errors: List[str] = []
+        counter = iter(range(requests))
+
+        async def worker():
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    await flow(recorder, i)
+                except RequestFailed as e:
+                    flow_errors.append(str(e))
+                    continue
+                flow_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+
+        result = {
+            "duration_s": duration,
+            "errors": len(flow_errors),
+            **_summarize(flow_latencies, duration),
+            "endpoints": {
+                path: {
+                    **_summarize(latencies, duration),
+                    "errors": recorder.errors.get(path, 0),
+                    **_summarize_statements(
+                        recorder.statements.get(path, []),
+                        recorder.repeated.get(path, []),
+                    ),
+                }
+                for path, latencies in recorder.latencies.items()
+            },
+        }
+        if flow_errors:
+            result["first_error"] = flow_errors[0]
+        return result
+
+
+def _reset_database(db_url: str) -> None:
+    if db_url.startswith("sqlite"):
+        path = db_url.split(":///", 1)[1]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def _start_uvicorn(port: int, workers: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--loop",
+            "uvloop",
+            "--http",
+            "httptools",
+            "--log-level",
+            "warning",
+        ],
+        env={**os.environ, "SKYSTORE_WORKERS": str(workers)},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/healthz").raise_for_status()
+            return server
+        except httpx.HTTPError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not become healthy")
+
+
+async def _run(
+    load_test: LoadTest,
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    server: str,
+    port: int,
+    workers: List[int],
+) -> Dict[int, dict]:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app import app
+    from operations.utils.migrations import run_migrations
+
+    engine = create_async_engine(os.environ["SKYSTORE_DB_URL"])
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+
+    local_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://skystore"
+    )
+    async with local_client:
+        primaries = await load_test.create_buckets(local_client)
+    start = time.perf_counter()
+    await load_test.populate(engine, primaries)
+    print(
+        f"Populated {load_test.buckets} x {load_test.objects} objects in "
+        f"{time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    await engine.dispose()
+
+    runs = {}
+    for worker_count in workers:
+        uvicorn = None
+        if server == "uvicorn":
+            uvicorn = _start_uvicorn(port, worker_count)
+            client = httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}",
+                limits=httpx.Limits(max_connections=concurrency),
+                timeout=60,
+            )
+        else:
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://skystore",
+                timeout=60,
+            )
+
+        results = runs[worker_count] = {}
+        try:
+            async with client:
+                for scenario in scenarios:
+                    flows = requests
+                    capacity = load_test.capacity(scenario)
+                    if capacity is not None and capacity < requests:
+                        print(
+                            f"{scenario}: the dataset only allows {capacity} flows",
+                            file=sys.stderr,
+                        )
+                        flows = capacity
+                    results[scenario] = await load_test.run(
+                        client, scenario, flows, concurrency
+                    )
+                    print(
+                        f"{scenario} ({worker_count} workers): "
+                        f"{results[scenario].get('per_second', 0):.1f} flows/s, "
+                        f"{results[scenario]['errors']} errors",
+                        file=sys.stderr,
+                    )
+        finally:
+            if uvicorn is not None:
+                uvicorn.terminate()
+                uvicorn.wait()
+    return runs
+
+
+def _scaling(runs: Dict[int, dict]) -> Dict[str, dict]:
+    """Throughput per worker count relative to the first run, per scenario."""
+    baseline_workers = next(iter(runs))
+    scaling = {}
+    for scenario, baseline in runs[baseline_workers].items():
+        scaling[scenario] = {
+            worker_count: results[scenario].get("per_second", 0)
+            / baseline["per_second"]
+            for worker_count, results in runs.items()
+            if baseline.get("per_second")
+        }
+    return scaling
+
+
+def main(
+    scenarios: str = typer.Option(
+        ",".join(SCENARIOS), help="Comma-separated scenarios"
+    ),
+    buckets: int = typer.Option(4, help="Pre-populated buckets"),
+    objects: int = typer.Option(25_000, help="Pre-populated objects per bucket"),
+    requests: int = typer.Option(2000, help="Flows per scenario"),
+    concurrency: int = typer.Option(16, help="Concurrent flows"),
+    regions: int = typer.Option(3, help="Regions a push write goes to"),
+    parts: int = typer.Option(5, help="Parts per multipart upload"),
+    delete_batch: int = typer.Option(100, help="Keys per bulk delete"),
+    server: str = typer.Option("inprocess", help="inprocess or uvicorn"),
+    port: int = typer.Option(8765, help="uvicorn port"),
+    workers: str = typer.Option(
+        "1",
+        help="uvicorn worker processes; a comma-separated list, e.g. 1,2,4, runs the "
+        "scenarios at each count and reports the speedup over the first",
+    ),
+    db_url: str = typer.Option(
+        "sqlite+aiosqlite:///load_bench.db",
+        help="Scratch database; SQLite files are deleted first",
+    ),
+    seed: int = typer.Option(0),
+    output: Optional[str] = typer.Option(None, help="Also write the JSON report here"),
+):
+    if server not in ("inprocess", "uvicorn"):
+        raise typer.BadParameter("--server must be inprocess or uvicorn")
+    scenario_list = scenarios.split(",")
+    worker_counts = [int(count) for count in workers.split(",")]
+    if len(worker_counts) > 1 and server != "uvicorn":
+        raise typer.BadParameter("Several worker counts need --server uvicorn")
+    for scenario in scenario_list:
+        if scenario not in SCENARIOS:
+            raise typer.BadParameter(f"Unknown scenario {scenario}")
+
+    # The server reads its database settings at import time
+    _reset_database(db_url)
+    os.environ["SKYSTORE_DB_URL"] = db_url
+    # Have the server report SQL statements per request in response headers
+    os.environ.setdefault("SKYSTORE_SQL_DEBUG", "1")
+    from operations.bucket_operations import init_region_tags
+
+    if not 1 <= regions <= len(init_region_tags):
+        raise typer.BadParameter(
+            f"--regions must be between 1 and the {len(init_region_tags)} INIT_REGIONS"
+        )
+    if len(init_region_tags) < 2 and "pull_miss" in scenario_list:
+        raise typer.BadParameter("pull_miss needs at least two INIT_REGIONS")
+
+    random.seed(seed)
+    load_test = LoadTest(
+        init_region_tags, buckets, objects, regions, parts, delete_batch
+    )
+    runs = asyncio.run(
+        _run(
+            load_test, scenario_list, requests, concurrency, server, port, worker_counts
+        )
+    )
+    report = {
+        "config": {
+            "server": server,
+            "workers": worker_counts,
+            "db_url": db_url,
+            "buckets": buckets,
+            "objects_per_bucket": objects,
+            "requests": requests,
+            "concurrency": concurrency,
+            "regions": init_region_tags[:regions],
+            "parts": parts,
+            "delete_batch": delete_batch,
+        },
+    }
+    if len(worker_counts) > 1:
+        report["runs"] = runs
+        report["scaling"] = _scaling(runs)
+    else:
+        report["scenarios"] = runs[worker_counts[0]]
+    _reset_database(db_url)
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    typer.run(main)
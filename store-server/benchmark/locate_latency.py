@@ -0,0 +1,160 @@
+"""
+Measure `locate_object` latency as the metadata database grows.
+
+Run from the store-server directory:
+
+    python -m benchmark.locate_latency --sizes 10000,1000000,10000000
+    python -m benchmark.locate_latency --no-indexes  # baseline without secondary indexes
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime
+from typing import List
+
+import typer
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from operations.object_operations import locate_object
+from operations.schemas.bucket_schemas import DBLogicalBucket, DBPhysicalBucketLocator
+from operations.schemas.object_schemas import (
+    DBLogicalObject,
+    DBPhysicalObjectLocator,
+    LocateObjectRequest,
+)
+from operations.utils.conf import Base, Status
+
+BUCKET = "bench-bucket"
+REGIONS = ["aws:us-west-1", "aws:us-east-1"]
+INSERT_CHUNK = 50_000
+
+
+def _populate(sync_engine, start: int, end: int) -> None:
+    """Insert objects [start, end) with one locator per region, primary in the first region."""
+    now = datetime.utcnow()
+    with sync_engine.begin() as conn:
+        for chunk_start in range(start, end, INSERT_CHUNK):
+            chunk_end = min(chunk_start + INSERT_CHUNK, end)
+            conn.execute(
+                insert(DBLogicalObject),
+                [
+                    dict(
+                        id=i + 1,
+                        bucket=BUCKET,
+                        key=f"key-{i:09d}",
+                        size=1024,
+                        last_modified=now,
+                        etag="etag",
+                        status=Status.ready,
+                    )
+                    for i in range(chunk_start, chunk_end)
+                ],
+            )
+            conn.execute(
+                insert(DBPhysicalObjectLocator),
+                [
+                    dict(
+                        logical_object_id=i + 1,
+                        location_tag=tag,
+                        cloud=tag.split(":")[0],
+                        region=tag.split(":")[1],
+                        bucket=f"skystore-{tag.split(':')[1]}",
+                        key=f"key-{i:09d}",
+                        status=Status.ready,
+                        is_primary=(j == 0),
+                    )
+                    for i in range(chunk_start, chunk_end)
+                    for j, tag in enumerate(REGIONS)
+                ],
+            )
+
+
+def _create_schema(sync_engine, indexes: bool) -> None:
+    Base.metadata.create_all(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(
+            insert(DBLogicalBucket).values(
+                id=1,
+                bucket=BUCKET,
+                prefix="",
+                status=Status.ready,
+                creation_date=datetime.utcnow(),
+            )
+        )
+        conn.execute(
+            insert(DBPhysicalBucketLocator),
+            [
+                dict(
+                    logical_bucket_id=1,
+                    location_tag=tag,
+                    cloud=tag.split(":")[0],
+                    region=tag.split(":")[1],
+                    bucket=f"skystore-{tag.split(':')[1]}",
+                    status=Status.ready,
+                    is_primary=(j == 0),
+                )
+                for j, tag in enumerate(REGIONS)
+            ],
+        )
+        if not indexes:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+async def _measure(db_path: str, num_objects: int, iterations: int) -> List[float]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    latencies = []
+    try:
+        for _ in range(iterations):
+            request = LocateObjectRequest(
+                bucket=BUCKET,
+                key=f"key-{random.randrange(num_objects):09d}",
+                client_from_region=random.choice(REGIONS + ["gcp:us-west1"]),
+            )
+            async with session_maker() as db:
+                start = time.perf_counter()
+                await locate_object(request, db)
+                latencies.append(time.perf_counter() - start)
+    finally:
+        await engine.dispose()
+    return latencies
+
+
+def main(
+    sizes: str = typer.Option(
+        "10000,1000000,10000000", help="Comma-separated object counts"
+    ),
+    iterations: int = typer.Option(200, help="locate_object calls per size"),
+    indexes: bool = typer.Option(True, help="Keep the secondary indexes"),
+    db_path: str = typer.Option("locate_bench.db", help="Scratch SQLite database"),
+):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    _create_schema(sync_engine, indexes)
+
+    populated = 0
+    print(f"{'objects':>12} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for size in sorted(int(s) for s in sizes.split(",")):
+        _populate(sync_engine, populated, size)
+        populated = size
+
+        latencies = sorted(asyncio.run(_measure(db_path, size, iterations)))
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(
+            f"{size:>12} {statistics.mean(latencies) * 1e3:>10.3f} "
+            f"{statistics.median(latencies) * 1e3:>10.3f} {p99 * 1e3:>10.3f}"
+        )
+
+    sync_engine.dispose()
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# `just test-postgres` runs the suite against a throwaway embedded Postgres server.
+# The URL must be set before app / operations.utils.db are imported.
+if os.environ.get("SKYSTORE_TEST_POSTGRES", "false").lower() in ("1", "true"):
+    import pgserver
+
+    _pg_server = pgserver.get_server(
+        tempfile.mkdtemp(prefix="skystore-pg-"), cleanup_mode="delete"
+    )
+    _pg_server.psql(
+        "CREATE DATABASE skystore TEMPLATE template0 LC_COLLATE 'C' LC_CTYPE 'C';"
+    )
+    os.environ["SKYSTORE_DB_URL"] = (
+        f"postgresql+asyncpg://postgres@/skystore?host={_pg_server.pgdata}"
+    )
+    # asyncpg connections are bound to an event loop, and each TestClient runs its own
+    os.environ["SKYSTORE_DB_POOL_SIZE"] = "0"
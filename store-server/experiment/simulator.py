@@ -0,0 +1,426 @@
+"""
+Offline policy simulator.
+
+Replays a trace in the `experiment/trace/*.csv` format (`timestamp,op,issue_region,data_id,size`)
+through the placement and transfer policies and accounts egress, storage and request cost and
+the estimated read transfer latency from the region profiles. Every (placement, transfer)
+combination is simulated in its own process:
+
+    python -m experiment.simulator experiment/trace/two_regions.csv
+    python -m experiment.simulator trace.csv.gz --placements push,write_local --transfers cheapest
+
+The trace is first encoded once into flat binary columns that each worker memory-maps, so
+parsing cost does not grow with the size of the policy grid.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import typer
+
+from operations.policy.placement_policy import get_placement_policy
+from operations.policy.transfer_policy import get_transfer_policy
+from operations.policy.utils.definitions import GB
+from operations.policy.utils.profile_matrix import load_profiles
+from operations.schemas.object_schemas import LocateObjectRequest, StartUploadRequest
+from operations.utils.conf import DEFAULT_INIT_REGIONS
+
+PLACEMENT_POLICIES = [
+    "single_region",
+    "replicate_all",
+    "push",
+    "copy_on_read",
+    "write_local",
+]
+TRANSFER_POLICIES = ["cheapest", "closest", "single"]
+
+CHUNK_ROWS = 1_000_000
+SECONDS_PER_MONTH = 30 * 24 * 3600
+# Read latency histogram: log-spaced buckets from 1us to ~28h
+LATENCY_BINS = np.logspace(-6, 5, 221)
+
+# Encoded trace columns and their on-disk dtypes
+COLUMNS = {
+    "timestamp": np.int64,
+    "is_write": np.bool_,
+    "region": np.int16,
+    "object": np.int64,
+    "size": np.int64,
+}
+
+
+def resolve_region(tag: str, region_index: Dict[str, int]) -> str:
+    """Profile region for a trace region; zonal profiles stand in for their region."""
+    if tag in region_index:
+        return tag
+    for region in region_index:
+        if region.startswith(tag + "-"):
+            return region
+    raise typer.BadParameter(f"Region {tag} is not in the network profiles")
+
+
+def read_trace(trace_path: str) -> Iterator[pd.DataFrame]:
+    """The trace in chunks of `CHUNK_ROWS` rows, from CSV (optionally compressed) or Parquet."""
+    if trace_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(trace_path).iter_batches(CHUNK_ROWS):
+            yield batch.to_pandas().astype({"data_id": str})
+    else:
+        yield from pd.read_csv(
+            trace_path,
+            chunksize=CHUNK_ROWS,
+            dtype={"op": str, "issue_region": str, "data_id": str, "size": np.int64},
+        )
+
+
+def encode_trace(trace_path: str, out_dir: str) -> Tuple[List[str], int]:
+    """Stream the trace into one binary file per column. Returns the issue regions, in id
+    order, and the number of distinct objects."""
+    region_ids: Dict[str, int] = {}
+    object_ids: Dict[str, int] = {}
+    files = {name: open(os.path.join(out_dir, name), "wb") for name in COLUMNS}
+    try:
+        for chunk in read_trace(trace_path):
+            timestamps = pd.to_datetime(chunk["timestamp"], format="%Y-%m-%d %H:%M:%S")
+            for region in chunk["issue_region"].unique():
+                region_ids.setdefault(region, len(region_ids))
+            columns = {
+                "timestamp": timestamps.to_numpy()
+                .astype("datetime64[s]")
+                .astype(np.int64),
+                "is_write": (chunk["op"] == "write").to_numpy(),
+                "region": chunk["issue_region"].map(region_ids).to_numpy(),
+                "object": np.fromiter(
+                    (
+                        object_ids.setdefault(d, len(object_ids))
+                        for d in chunk["data_id"]
+                    ),
+                    dtype=np.int64,
+                    count=len(chunk),
+                ),
+                "size": chunk["size"].to_numpy(),
+            }
+            for name, dtype in COLUMNS.items():
+                columns[name].astype(dtype).tofile(files[name])
+    finally:
+        for f in files.values():
+            f.close()
+    return list(region_ids), len(object_ids)
+
+
+class PolicyReplay:
+    """Replays the encoded trace through one placement and one transfer policy.
+
+    Object state is a bitmask of the regions holding a copy. Policies only see the client
+    region and the set of copies, so their decisions are memoized on (region, bitmask).
+    Transfers are tallied per (src, dst) pair and priced once at the end.
+    """
+
+    def __init__(
+        self,
+        placement: str,
+        transfer: str,
+        regions: List[str],
+        init_regions: List[str],
+    ) -> None:
+        profiles = load_profiles()
+        self.regions = regions
+        self.n = len(regions)
+        self.profile_ids = np.array([profiles.region_index[r] for r in regions])
+        self.placement = get_placement_policy(placement, init_regions)
+        self.transfer = get_transfer_policy(transfer)
+        self.pull_on_read = placement == "copy_on_read"
+
+        self.local_ids = {region: i for i, region in enumerate(regions)}
+        self._placements: Dict[int, int] = {}
+        self._sources: Dict[Tuple[int, int], int] = {}
+        self._mask_regions: Dict[int, Tuple[int, ...]] = {}
+
+    def placement_mask(self, region: int) -> int:
+        mask = self._placements.get(region)
+        if mask is None:
+            request = StartUploadRequest(
+                bucket="",
+                key="",
+                client_from_region=self.regions[region],
+                is_multipart=False,
+            )
+            mask = 0
+            for tag in self.placement.place(request):
+                mask |= 1 << self.local_ids[tag]
+            self._placements[region] = mask
+        return mask
+
+    def source(self, region: int, mask: int) -> int:
+        """Region to read from, or -1 when the transfer policy cannot serve the read."""
+        key = (region, mask)
+        source = self._sources.get(key)
+        if source is None:
+            locators = [
+                SimpleNamespace(location_tag=self.regions[r])
+                for r in self.mask_regions(mask)
+            ]
+            request = LocateObjectRequest(
+                bucket="", key="", client_from_region=self.regions[region]
+            )
+            try:
+                chosen = self.transfer.get(request, locators)
+                source = self.local_ids[chosen.location_tag]
+            except Exception:
+                source = -1
+            self._sources[key] = source
+        return source
+
+    def mask_regions(self, mask: int) -> Tuple[int, ...]:
+        regions = self._mask_regions.get(mask)
+        if regions is None:
+            regions = tuple(r for r in range(self.n) if mask >> r & 1)
+            self._mask_regions[mask] = regions
+        return regions
+
+    def run(
+        self, trace_dir: str, trace_region_ids: List[int], num_objects: int
+    ) -> Dict:
+        """Replay the trace encoded in `trace_dir`, whose region i is
+        `self.regions[trace_region_ids[i]]`."""
+        columns = {
+            name: (
+                np.memmap(os.path.join(trace_dir, name), dtype=dtype, mode="r")
+                if os.path.getsize(os.path.join(trace_dir, name)) > 0
+                else np.empty(0, dtype=dtype)
+            )
+            for name, dtype in COLUMNS.items()
+        }
+        region_map = np.array(trace_region_ids, dtype=np.int64)
+        n = self.n
+        masks = [0] * num_objects
+        sizes = [0] * num_objects
+        # Transferred bytes per src * n + dst, puts and gets per region
+        transferred = [0] * (n * n)
+        puts = [0] * n
+        gets = [0] * n
+        # Sum of size * (removal time - placement time) per region, in byte-seconds. Kept
+        # as Python ints so adding and removing large products stays exact
+        stored = [0] * n
+        reads = writes = failed_reads = 0
+        latency_hist = np.zeros(len(LATENCY_BINS) - 1, dtype=np.int64)
+        latency_sum = 0.0
+        last_timestamp = 0
+
+        total = len(columns["timestamp"])
+        for start in range(0, total, CHUNK_ROWS):
+            chunk = {
+                name: columns[name][start : start + CHUNK_ROWS] for name in COLUMNS
+            }
+            chunk["region"] = region_map[chunk["region"]]
+            rows = zip(*(chunk[name].tolist() for name in COLUMNS))
+            read_pairs: List[int] = []
+            read_sizes: List[int] = []
+            for timestamp, is_write, region, obj, size in rows:
+                if is_write:
+                    writes += 1
+                    for r in self.mask_regions(masks[obj]):
+                        stored[r] += sizes[obj] * timestamp
+                    mask = self.placement_mask(region)
+                    for r in self.mask_regions(mask):
+                        stored[r] -= size * timestamp
+                        puts[r] += 1
+                        transferred[region * n + r] += size
+                    masks[obj] = mask
+                    sizes[obj] = size
+                    continue
+
+                reads += 1
+                mask = masks[obj]
+                source = self.source(region, mask) if mask else -1
+                if source < 0:
+                    failed_reads += 1
+                    continue
+                size = sizes[obj]
+                gets[source] += 1
+                pair = source * n + region
+                transferred[pair] += size
+                read_pairs.append(pair)
+                read_sizes.append(size)
+                if self.pull_on_read and source != region:
+                    masks[obj] = mask | 1 << region
+                    stored[region] -= size * timestamp
+                    puts[region] += 1
+
+            if read_pairs:
+                seconds = self._transfer_seconds(
+                    np.array(read_pairs), np.array(read_sizes, dtype=np.float64)
+                )
+                seconds = seconds[np.isfinite(seconds)]
+                latency_hist += np.histogram(seconds, bins=LATENCY_BINS)[0]
+                latency_sum += float(seconds.sum())
+            last_timestamp = int(
+                columns["timestamp"][min(start + CHUNK_ROWS, total) - 1]
+            )
+
+        # Copies still held at the end of the trace are stored until its last operation
+        for obj, mask in enumerate(masks):
+            for r in self.mask_regions(mask):
+                stored[r] += sizes[obj] * last_timestamp
+
+        return self._summary(
+            reads,
+            writes,
+            failed_reads,
+            np.array(transferred, dtype=np.float64).reshape(n, n),
+            np.array(puts),
+            np.array(gets),
+            np.array(stored, dtype=np.float64),
+            latency_hist,
+            latency_sum,
+        )
+
+    def _transfer_seconds(self, pairs: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+        """Estimated transfer time from the profiled link throughput (gbps)."""
+        profiles = load_profiles()
+        src = self.profile_ids[pairs // self.n]
+        dst = self.profile_ids[pairs % self.n]
+        return sizes * 8 / (profiles.throughput[src, dst] * 1e9)
+
+    def _summary(
+        self,
+        reads,
+        writes,
+        failed_reads,
+        transferred,
+        puts,
+        gets,
+        stored,
+        latency_hist,
+        latency_sum,
+    ) -> Dict:
+        profiles = load_profiles()
+        ids = self.profile_ids
+        egress_price = np.nan_to_num(profiles.cost[np.ix_(ids, ids)])
+        np.fill_diagonal(egress_price, 0)
+
+        egress_cost = float((transferred / GB * egress_price).sum())
+        storage_cost = float(
+            (stored / GB / SECONDS_PER_MONTH * profiles.price_storage[ids]).sum()
+        )
+        request_cost = float(
+            (puts * profiles.price_put[ids]).sum()
+            + (gets * profiles.price_get[ids]).sum()
+        )
+        served = int(latency_hist.sum())
+        return {
+            "reads": reads,
+            "writes": writes,
+            "failed_reads": failed_reads,
+            "egress_cost": egress_cost,
+            "storage_cost": storage_cost,
+            "request_cost": request_cost,
+            "total_cost": egress_cost + storage_cost + request_cost,
+            "mean_read_latency_s": latency_sum / served if served else float("nan"),
+            "p50_read_latency_s": _percentile(latency_hist, 0.50),
+            "p99_read_latency_s": _percentile(latency_hist, 0.99),
+        }
+
+
+def _percentile(hist: np.ndarray, q: float) -> float:
+    """Upper edge of the histogram bucket holding the q-th quantile."""
+    total = hist.sum()
+    if total == 0:
+        return float("nan")
+    bucket = int(np.searchsorted(np.cumsum(hist), q * total))
+    return float(LATENCY_BINS[bucket + 1])
+
+
+def simulate(
+    placement: str,
+    transfer: str,
+    regions: List[str],
+    trace_dir: str,
+    trace_region_ids: List[int],
+    num_objects: int,
+) -> Dict:
+    start = time.perf_counter()
+    result = {"placement": placement, "transfer": transfer}
+    try:
+        replay = PolicyReplay(placement, transfer, regions, regions)
+        result.update(replay.run(trace_dir, trace_region_ids, num_objects))
+    except Exception as e:
+        # e.g. a single-region policy whose region is not part of the simulation
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["sim_seconds"] = time.perf_counter() - start
+    return result
+
+
+def main(
+    trace: str = typer.Argument(
+        ..., help="Trace CSV, optionally compressed, or Parquet"
+    ),
+    placements: str = typer.Option(
+        ",".join(PLACEMENT_POLICIES), help="Comma-separated placement policies"
+    ),
+    transfers: str = typer.Option(
+        ",".join(TRANSFER_POLICIES), help="Comma-separated transfer policies"
+    ),
+    init_regions: Optional[str] = typer.Option(
+        None,
+        help="Comma-separated regions with a bucket, in addition to the trace's regions; "
+        "defaults to the server's INIT_REGIONS",
+    ),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Simulation processes"),
+    output: Optional[str] = typer.Option(
+        None, help="Also write the summary to this CSV"
+    ),
+):
+    region_index = load_profiles().region_index
+    if init_regions is None:
+        init_regions = os.getenv("INIT_REGIONS", ",".join(DEFAULT_INIT_REGIONS))
+
+    with tempfile.TemporaryDirectory(prefix="skystore-sim-") as trace_dir:
+        start = time.perf_counter()
+        trace_regions, num_objects = encode_trace(trace, trace_dir)
+        print(f"Encoded trace in {time.perf_counter() - start:.1f}s")
+
+        # Buckets exist in the init regions and wherever the trace issues requests
+        regions = list(
+            dict.fromkeys(
+                resolve_region(r, region_index)
+                for r in init_regions.split(",") + trace_regions
+            )
+        )
+        trace_region_ids = [
+            regions.index(resolve_region(r, region_index)) for r in trace_regions
+        ]
+
+        grid = list(product(placements.split(","), transfers.split(",")))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    simulate,
+                    placement,
+                    transfer,
+                    regions,
+                    trace_dir,
+                    trace_region_ids,
+                    num_objects,
+                )
+                for placement, transfer in grid
+            ]
+            results = [future.result() for future in futures]
+
+    summary = pd.DataFrame(results).set_index(["placement", "transfer"])
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(summary.to_string(float_format=lambda v: f"{v:.6g}"))
+    if output:
+        summary.to_csv(output)
+
+
+if __name__ == "__main__":
+    typer.run(main)
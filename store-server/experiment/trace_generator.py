@@ -0,0 +1,375 @@
+"""
+Synthetic workload trace generator.
+
+Writes traces in the `experiment/trace/*.csv` format (`timestamp,op,issue_region,data_id,size`)
+for the simulator and for replay against a server:
+
+    python -m experiment.trace_generator trace.csv.gz --ops 100000000 --days 7
+    python -m experiment.trace_generator trace.parquet --regions aws:us-east-1=2,aws:eu-west-1
+
+The workload model:
+- Every region issues requests along a diurnal curve peaking in its local afternoon, scaled
+  by the region's weight (`region=weight`).
+- Objects are picked by Zipfian popularity. With probability `affinity` a region picks from
+  the objects homed in it, otherwise from all objects. Every `drift_hours`, each object's home
+  moves on to the next region, staggered across objects.
+- An object's size is fixed. Sizes are lognormal, except for a `multipart_fraction` of the
+  objects, whose sizes are log-uniform between `multipart_min` and `multipart_max`.
+- Operations are writes with probability `write_ratio`. The first access to an object is
+  always a write, so readers never miss.
+
+Rows are generated and written in time-ordered chunks, so memory is bounded by the chunk size
+plus one byte per object, independent of the number of rows. Output is CSV, gzip-compressed
+CSV for a `.gz` path, or Parquet for a `.parquet` path (requires pyarrow).
+"""
+
+from math import gcd
+from typing import Dict, Iterator, Optional, Tuple
+import gzip
+import time
+
+import numpy as np
+import pandas as pd
+import typer
+from pydantic import BaseModel, Field
+
+from operations.utils.conf import DEFAULT_INIT_REGIONS
+
+CHUNK_ROWS = 1_000_000
+# Request rates are piecewise constant over buckets of this length
+BUCKET_SECONDS = 60
+MB = 2**20
+GB = 2**30
+COLUMNS = ["timestamp", "op", "issue_region", "data_id", "size"]
+
+# Rough UTC offsets by region name, first match wins
+UTC_OFFSETS = [
+    ("ap-northeast", 9),
+    ("asia-northeast", 9),
+    ("korea", 9),
+    ("japan", 9),
+    ("ap-southeast-2", 10),
+    ("australia", 10),
+    ("ap-southeast", 8),
+    ("asia-southeast", 8),
+    ("ap-east", 8),
+    ("asia-east", 8),
+    ("eastasia", 8),
+    ("ap-south", 5.5),
+    ("asia-south", 5.5),
+    ("india", 5.5),
+    ("uae", 4),
+    ("me-", 3),
+    ("qatar", 3),
+    ("af-", 2),
+    ("africa", 2),
+    ("sa-", -3),
+    ("southamerica", -3),
+    ("brazil", -3),
+    ("ca-", -5),
+    ("canada", -5),
+    ("northamerica", -5),
+    ("us-west", -8),
+    ("westus", -8),
+    ("us-central", -6),
+    ("centralus", -6),
+    ("us-east", -5),
+    ("eastus", -5),
+    ("uk", 0),
+    ("eu", 1),
+    ("norway", 1),
+    ("sweden", 1),
+    ("germany", 1),
+    ("switzerland", 1),
+    ("france", 1),
+]
+
+
+class TraceSpec(BaseModel):
+    regions: Dict[str, float] = Field(
+        default_factory=lambda: {region: 1.0 for region in DEFAULT_INIT_REGIONS}
+    )
+    ops: int = 1_000_000
+    # Rounded down to a multiple of the number of regions
+    objects: int = 100_000
+    start: str = "2023-10-12 00:00:00"
+    days: float = 1.0
+    seed: int = 0
+
+    zipf_alpha: float = 0.9
+    write_ratio: float = 0.1
+    affinity: float = 0.8
+    drift_hours: float = 24.0
+
+    diurnal_amplitude: float = 0.5
+    peak_hour: float = 14.0
+
+    size_median: int = 256 * 1024
+    size_sigma: float = 1.5
+    multipart_fraction: float = 0.02
+    multipart_min: int = 8 * MB
+    multipart_max: int = 5 * GB
+
+
+def utc_offset(region: str) -> float:
+    name = region.split(":", 1)[-1]
+    for keyword, offset in UTC_OFFSETS:
+        if keyword in name:
+            return offset
+    return 0
+
+
+def _mix64(x: np.ndarray, salt: int) -> np.ndarray:
+    """splitmix64 finalizer: a fixed pseudo-random uint64 for every input."""
+    x = x.astype(np.uint64) + np.uint64((0x9E3779B97F4A7C15 * (salt + 1)) % 2**64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _unit(x: np.ndarray, salt: int) -> np.ndarray:
+    """Fixed uniform [0, 1) value for every input."""
+    return (_mix64(x, salt) >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+class _Permutation:
+    """Affine bijection of [0, n), so that popularity ranks are spread over the ids."""
+
+    def __init__(self, n: int, salt: int) -> None:
+        self.n = n
+        self.a = 0x9E3779B1 % n or 1
+        while gcd(self.a, n) != 1:
+            self.a += 1
+        self.c = ((salt + 1) * 0x632BE5AB) % n
+
+    def __call__(self, k: np.ndarray) -> np.ndarray:
+        return (k * self.a + self.c) % self.n
+
+
+def zipf_ranks(u: np.ndarray, n: int, alpha: float) -> np.ndarray:
+    """Ranks in [0, n) with P(rank k) ~ (k + 1)^-alpha, by inverting the continuous CDF."""
+    if abs(alpha - 1) < 1e-9:
+        x = np.power(n + 1.0, u)
+    else:
+        e = 1 - alpha
+        x = np.power(((n + 1.0) ** e - 1) * u + 1, 1 / e)
+    return np.minimum(x.astype(np.int64) - 1, n - 1)
+
+
+class TraceGenerator:
+    def __init__(self, spec: TraceSpec) -> None:
+        self.spec = spec
+        self.regions = list(spec.regions)
+        self.num_regions = len(self.regions)
+        self.objects_per_region = spec.objects // self.num_regions
+        if self.objects_per_region == 0:
+            raise ValueError("Need at least one object per region")
+        self.num_objects = self.objects_per_region * self.num_regions
+
+        self.rng = np.random.default_rng(spec.seed)
+        self.start = np.datetime64(pd.Timestamp(spec.start).to_datetime64(), "s")
+        self.local_order = _Permutation(self.objects_per_region, spec.seed)
+        self.global_order = _Permutation(self.num_objects, spec.seed + 1)
+        self.written = np.zeros(self.num_objects, dtype=np.bool_)
+
+    def _bucket_counts(self) -> np.ndarray:
+        """Requests per (time bucket, region), following each region's diurnal curve."""
+        spec = self.spec
+        num_buckets = max(1, int(np.ceil(spec.days * 86400 / BUCKET_SECONDS)))
+        hours = (np.arange(num_buckets) + 0.5) * BUCKET_SECONDS / 3600
+        offsets = np.array([utc_offset(r) for r in self.regions])
+        start_hour = (self.start - self.start.astype("datetime64[D]")).astype(
+            int
+        ) / 3600
+        local_hour = start_hour + hours[:, None] + offsets[None, :]
+        load = 1 + spec.diurnal_amplitude * np.cos(
+            2 * np.pi * (local_hour - spec.peak_hour) / 24
+        )
+        load *= np.array(list(spec.regions.values()))[None, :]
+        counts = self.rng.multinomial(spec.ops, (load / load.sum()).ravel())
+        return counts.reshape(num_buckets, self.num_regions)
+
+    def _objects(self, seconds: np.ndarray, regions: np.ndarray) -> np.ndarray:
+        spec = self.spec
+        n = len(seconds)
+        u = self.rng.random(n)
+        local = self.rng.random(n) < spec.affinity
+        objects = self.global_order(
+            zipf_ranks(u[~local], self.num_objects, spec.zipf_alpha)
+        )
+        result = np.empty(n, dtype=np.int64)
+        result[~local] = objects
+
+        # Object j * R + h is homed in region (h + shift) % R, where the shift advances by
+        # one every drift period with a per-group phase, so homes move in a staggered way
+        group = self.local_order(
+            zipf_ranks(u[local], self.objects_per_region, spec.zipf_alpha)
+        )
+        shift = 0
+        if spec.drift_hours > 0:
+            shift = np.floor(
+                seconds[local] / (spec.drift_hours * 3600) + _unit(group, 1)
+            ).astype(np.int64)
+        home = (regions[local] - shift) % self.num_regions
+        result[local] = group * self.num_regions + home
+        return result
+
+    def _sizes(self, objects: np.ndarray) -> np.ndarray:
+        spec = self.spec
+        u1, u2, u3 = (_unit(objects, salt) for salt in (2, 3, 4))
+        # Box-Muller
+        z = np.sqrt(-2 * np.log1p(-u1)) * np.cos(2 * np.pi * u2)
+        sizes = spec.size_median * np.exp(spec.size_sigma * z)
+        multipart = u3 < spec.multipart_fraction
+        low, high = np.log(spec.multipart_min), np.log(spec.multipart_max)
+        sizes[multipart] = np.exp(low + u1[multipart] * (high - low))
+        return np.maximum(sizes, 1).astype(np.int64)
+
+    def _chunk(self, counts: np.ndarray, first_bucket: int) -> pd.DataFrame:
+        buckets, regions = np.nonzero(counts)
+        repeats = counts[buckets, regions]
+        buckets = np.repeat(buckets + first_bucket, repeats)
+        regions = np.repeat(regions, repeats)
+        seconds = buckets * BUCKET_SECONDS + self.rng.integers(
+            0, BUCKET_SECONDS, len(buckets)
+        )
+        order = np.argsort(seconds, kind="stable")
+        seconds, regions = seconds[order], regions[order]
+
+        objects = self._objects(seconds, regions)
+        is_write = self.rng.random(len(objects)) < self.spec.write_ratio
+        unique, first = np.unique(objects, return_index=True)
+        is_write[first[~self.written[unique]]] = True
+        self.written[unique] = True
+
+        return pd.DataFrame(
+            {
+                "timestamp": self.start + seconds.astype("timedelta64[s]"),
+                "op": np.where(is_write, "write", "read"),
+                "issue_region": np.array(self.regions, dtype=object)[regions],
+                "data_id": objects,
+                "size": self._sizes(objects),
+            }
+        )
+
+    def chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """Time-ordered chunks of about `chunk_rows` rows, made of whole time buckets."""
+        counts = self._bucket_counts()
+        per_bucket = counts.sum(axis=1)
+        start = 0
+        while start < len(counts):
+            end = start + 1
+            rows = per_bucket[start]
+            while end < len(counts) and rows + per_bucket[end] <= chunk_rows:
+                rows += per_bucket[end]
+                end += 1
+            if rows:
+                yield self._chunk(counts[start:end], start)
+            start = end
+
+
+def format_csv(chunk: pd.DataFrame) -> str:
+    """CSV rows of a chunk; about twice as fast as `DataFrame.to_csv`."""
+    seconds, index = np.unique(chunk["timestamp"].to_numpy(), return_inverse=True)
+    stamps = pd.DatetimeIndex(seconds).strftime("%Y-%m-%d %H:%M:%S").to_numpy()
+    return "".join(
+        map(
+            "{},{},{},{},{}\n".format,
+            stamps[index].tolist(),
+            chunk["op"].tolist(),
+            chunk["issue_region"].tolist(),
+            chunk["data_id"].tolist(),
+            chunk["size"].tolist(),
+        )
+    )
+
+
+def write_trace(
+    spec: TraceSpec, path: str, chunk_rows: int = CHUNK_ROWS
+) -> Tuple[int, int]:
+    """Generate the trace into `path`. Returns the number of rows and of objects."""
+    generator = TraceGenerator(spec)
+    rows = 0
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise typer.BadParameter("Parquet output requires pyarrow")
+
+        writer = None
+        try:
+            for chunk in generator.chunks(chunk_rows):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        opener = gzip.open if path.endswith(".gz") else open
+        kwargs = {"compresslevel": 1} if path.endswith(".gz") else {}
+        with opener(path, "wt", newline="", **kwargs) as f:
+            f.write(",".join(COLUMNS) + "\n")
+            for chunk in generator.chunks(chunk_rows):
+                f.write(format_csv(chunk))
+                rows += len(chunk)
+    return rows, generator.num_objects
+
+
+def parse_regions(regions: str) -> Dict[str, float]:
+    """`region[=weight],...` into region weights."""
+    weights = {}
+    for item in regions.split(","):
+        region, _, weight = item.partition("=")
+        weights[region] = float(weight or 1)
+    return weights
+
+
+def main(
+    output: str = typer.Argument(..., help="Output .csv, .csv.gz or .parquet"),
+    regions: Optional[str] = typer.Option(
+        None,
+        help="Comma-separated issuing regions with optional load weights "
+        "(`region=weight`); defaults to the server's default init regions",
+    ),
+    ops: int = typer.Option(TraceSpec().ops, help="Number of requests"),
+    objects: int = typer.Option(TraceSpec().objects, help="Number of distinct objects"),
+    start: str = typer.Option(TraceSpec().start, help="Timestamp of the first bucket"),
+    days: float = typer.Option(TraceSpec().days, help="Trace duration"),
+    zipf_alpha: float = typer.Option(TraceSpec().zipf_alpha),
+    write_ratio: float = typer.Option(TraceSpec().write_ratio),
+    affinity: float = typer.Option(
+        TraceSpec().affinity,
+        help="Probability that a request targets an object homed in its region",
+    ),
+    drift_hours: float = typer.Option(
+        TraceSpec().drift_hours,
+        help="Period after which an object's home region moves on; 0 disables drift",
+    ),
+    diurnal_amplitude: float = typer.Option(TraceSpec().diurnal_amplitude),
+    peak_hour: float = typer.Option(TraceSpec().peak_hour, help="Local peak hour"),
+    size_median: int = typer.Option(TraceSpec().size_median),
+    size_sigma: float = typer.Option(TraceSpec().size_sigma),
+    multipart_fraction: float = typer.Option(TraceSpec().multipart_fraction),
+    multipart_min: int = typer.Option(TraceSpec().multipart_min),
+    multipart_max: int = typer.Option(TraceSpec().multipart_max),
+    seed: int = typer.Option(TraceSpec().seed),
+):
+    spec_args = {k: v for k, v in locals().items() if k not in ("output", "regions")}
+    if regions is not None:
+        spec_args["regions"] = parse_regions(regions)
+    spec = TraceSpec(**spec_args)
+
+    start_time = time.perf_counter()
+    rows, num_objects = write_trace(spec, output)
+    print(
+        f"Wrote {rows} requests on {num_objects} objects from {len(spec.regions)} "
+        f"regions to {output} in {time.perf_counter() - start_time:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
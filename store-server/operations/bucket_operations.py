@@ -25,8 +25,10 @@ from operations.utils.conf import (
 )
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, status
-from operations.utils.db import get_session, logger
-from typing import List
+from operations.utils.cache import invalidate_bucket
+from operations.utils.db import get_read_session, get_session, logger
+from operations.utils.group_commit import commit_write
+from typing import List, Union
 import os
 
 router = APIRouter()
@@ -98,6 +100,7 @@ async def register_buckets(
             db.add(physical_bucket_locator)
 
     await db.commit()
+    invalidate_bucket(request.bucket)
 
     return Response(
         status_code=200,
@@ -154,6 +157,7 @@ async def start_create_bucket(
 
     db.add_all(bucket_locators)
     await db.commit()
+    invalidate_bucket(request.bucket)
 
     logger.debug(f"start_create_bucket: {request} -> {bucket_locators}")
 
@@ -171,18 +175,21 @@ async def start_create_bucket(
     )
 
 
-@router.patch("/complete_create_bucket")
-async def complete_create_bucket(
-    request: CreateBucketIsCompleted, db: Session = Depends(get_session)
-):
-    stmt = select(DBPhysicalBucketLocator).where(
-        DBPhysicalBucketLocator.id == request.id
+async def _apply_bucket_creation(
+    db: Session, request: CreateBucketIsCompleted
+) -> Union[Response, str]:
+    """Mark the physical bucket ready, and the logical bucket with it for the primary.
+    Returns the logical bucket's name, or an error response if the locator does not exist.
+    """
+    stmt = (
+        select(DBPhysicalBucketLocator)
+        .options(joinedload(DBPhysicalBucketLocator.logical_bucket))
+        .where(DBPhysicalBucketLocator.id == request.id)
     )
     physical_locator = await db.scalar(stmt)
     if physical_locator is None:
         logger.error(f"physical locator not found: {request}")
         return Response(status_code=404, content="Physical Bucket Not Found")
-    await db.refresh(physical_locator, ["logical_bucket"])
 
     logger.debug(f"complete_create_bucket: {request} -> {physical_locator}")
 
@@ -193,8 +200,19 @@ async def complete_create_bucket(
         physical_locator.logical_bucket.creation_date = request.creation_date.replace(
             tzinfo=None
         )
+    return physical_locator.logical_bucket.bucket
 
-    await db.commit()
+
+@router.patch("/complete_create_bucket")
+async def complete_create_bucket(
+    request: CreateBucketIsCompleted, db: Session = Depends(get_session)
+):
+    bucket = await commit_write(
+        db, lambda session: _apply_bucket_creation(session, request)
+    )
+    if isinstance(bucket, Response):
+        return bucket
+    invalidate_bucket(bucket)
 
 
 @router.post("/start_delete_bucket")
@@ -248,6 +266,7 @@ async def start_delete_bucket(
     except Exception as e:
         logger.error(f"Error occurred while committing changes: {e}")
         return Response(status_code=500, content="Error committing changes")
+    invalidate_bucket(request.bucket)
 
     logger.debug(f"start_delete_bucket: {request} -> {logical_bucket}")
 
@@ -293,6 +312,7 @@ async def complete_delete_bucket(
     except Exception as e:
         logger.error(f"Error occurred while committing changes: {e}")
         return Response(status_code=500, content="Error committing changes")
+    invalidate_bucket(physical_locator.logical_bucket.bucket)
 
 
 @router.post(
@@ -303,7 +323,7 @@ async def complete_delete_bucket(
     },
 )
 async def locate_bucket(
-    request: LocateBucketRequest, db: Session = Depends(get_session)
+    request: LocateBucketRequest, db: Session = Depends(get_read_session)
 ) -> LocateBucketResponse:
     """Given the bucket name, return one or zero physical bucket locators."""
     stmt = (
@@ -345,7 +365,7 @@ async def locate_bucket(
 
 
 @router.post("/list_buckets")
-async def list_buckets(db: Session = Depends(get_session)) -> List[BucketResponse]:
+async def list_buckets(db: Session = Depends(get_read_session)) -> List[BucketResponse]:
     stmt = select(DBLogicalBucket).where(DBLogicalBucket.status == Status.ready)
     buckets = (await db.scalars(stmt)).all()
 
@@ -361,7 +381,9 @@ async def list_buckets(db: Session = Depends(get_session)) -> List[BucketRespons
 
 
 @router.post("/head_bucket")
-async def head_bucket(request: HeadBucketRequest, db: Session = Depends(get_session)):
+async def head_bucket(
+    request: HeadBucketRequest, db: Session = Depends(get_read_session)
+):
     stmt = select(DBLogicalBucket).where(
         DBLogicalBucket.bucket == request.bucket, DBLogicalBucket.status == Status.ready
     )
@@ -386,7 +408,7 @@ async def head_bucket(request: HeadBucketRequest, db: Session = Depends(get_sess
     },
 )
 async def locate_bucket_status(
-    request: LocateBucketRequest, db: Session = Depends(get_session)
+    request: LocateBucketRequest, db: Session = Depends(get_read_session)
 ) -> BucketStatus:
     """Given the bucket name, return physical bucket status. Currently only used for testing metadata cleanup"""
     stmt = (
@@ -7,6 +7,8 @@ from operations.schemas.object_schemas import (
     ObjectResponse,
     LocateObjectRequest,
     LocateObjectResponse,
+    LocateObjectsRequest,
+    LocateObjectsResponse,
     DeleteObjectsRequest,
     DeleteObjectsResponse,
     DeleteObjectsIsCompleted,
@@ -16,30 +18,75 @@ from operations.schemas.object_schemas import (
     StartWarmupResponse,
     StartUploadResponse,
     PatchUploadIsCompleted,
+    PatchUploadsIsCompleted,
     PatchUploadMultipartUploadId,
     PatchUploadMultipartUploadPart,
+    PatchUploadMultipartUploadParts,
     ContinueUploadRequest,
     ContinueUploadResponse,
     ContinueUploadPhysicalPart,
     ListObjectRequest,
+    ListObjectsV2Response,
     HeadObjectRequest,
     HeadObjectResponse,
     ListPartsRequest,
+    ListPartsResponse,
     LogicalPartResponse,
     MultipartResponse,
 )
-from operations.schemas.bucket_schemas import DBLogicalBucket
+from operations.schemas.bucket_schemas import DBLogicalBucket, DBPhysicalBucketLocator
 from sqlalchemy.orm import selectinload, joinedload, Session
 from itertools import zip_longest
-from sqlalchemy import select
-from operations.utils.conf import Status
+from sqlalchemy import delete, select, update
+from operations.utils.conf import PhysicalLocation, Status
 from fastapi import APIRouter, Response, Depends, status
-from operations.utils.db import get_session, logger
-from typing import List
+from operations.utils.db import get_read_session, get_session, logger, upsert
+from operations.utils.group_commit import commit_write
+from operations.utils.single_flight import head_flights, locate_flights
+from operations.utils.cache import (
+    bucket_topology_cache,
+    head_cache,
+    invalidate_object,
+    locate_cache,
+    negative_cache,
+)
+from operations.utils.key_filter import key_filter
+from operations.utils.pagination import (
+    MAX_PAGE_SIZE,
+    decode_continuation_token,
+    encode_continuation_token,
+    prefix_upper_bound,
+)
+from typing import (
+    Awaitable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from datetime import datetime
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# Bound parameters per statement: SQLite before 3.32 allows at most 999
+MAX_BOUND_PARAMETERS = 999
+# Values per IN list, leaving room for the other parameters of its statement
+IN_LIST_CHUNK = MAX_BOUND_PARAMETERS - 49
+
+
+def _chunks(values: Iterable, size: int = IN_LIST_CHUNK) -> Iterator[List]:
+    """Split `values` into lists of at most `size`, e.g. for IN lists."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
 
 @router.post("/start_delete_objects")
 async def start_delete_objects(
@@ -53,73 +100,92 @@ async def start_delete_objects(
             content="Mismatched lengths for ids and multipart_upload_ids",
         )
 
-    locator_dict = {}
-    for key, multipart_upload_id in zip_longest(
-        request.keys, request.multipart_upload_ids or []
-    ):
-        if multipart_upload_id:
-            stmt = (
-                select(DBLogicalObject)
-                .options(joinedload(DBLogicalObject.physical_object_locators))
-                .where(DBLogicalObject.bucket == request.bucket)
-                .where(DBLogicalObject.key == key)
-                .where(
-                    DBLogicalObject.status == Status.ready
-                    or DBLogicalObject.status == Status.pending
-                )
-                .where(DBLogicalObject.multipart_upload_id == multipart_upload_id)
-            )
-        else:
-            stmt = (
-                select(DBLogicalObject)
-                .options(joinedload(DBLogicalObject.physical_object_locators))
-                .where(DBLogicalObject.bucket == request.bucket)
-                .where(DBLogicalObject.key == key)
-                .where(DBLogicalObject.status == Status.ready)
-            )
-        logical_obj = await db.scalar(stmt)
+    targets = list(
+        dict.fromkeys(zip_longest(request.keys, request.multipart_upload_ids or []))
+    )
+
+    # Load every targeted logical object together with its locators, one statement per
+    # chunk of keys. Plain deletes target ready objects, multipart aborts target pending
+    # uploads, so candidates are keyed by (key, upload id) for pending objects and by
+    # (key, None) for ready ones.
+    candidates = {}
+    for keys in _chunks({key for key, _ in targets}):
+        stmt = (
+            select(DBLogicalObject)
+            .options(joinedload(DBLogicalObject.physical_object_locators))
+            .where(DBLogicalObject.bucket == request.bucket)
+            .where(DBLogicalObject.key.in_(keys))
+            .where(DBLogicalObject.status.in_([Status.ready, Status.pending]))
+        )
+        for obj in (await db.scalars(stmt)).unique():
+            if obj.status == Status.ready:
+                candidates.setdefault((obj.key, None), obj)
+            elif obj.multipart_upload_id:
+                candidates.setdefault((obj.key, obj.multipart_upload_id), obj)
+
+    logical_objs = {}
+    for key, multipart_upload_id in targets:
+        logical_obj = candidates.get((key, multipart_upload_id or None))
         if logical_obj is None:
-            return Response(status_code=404, content="Object not found")
+            return Response(status_code=404, content=f"Object not found: {key}")
 
-        locators = []
-        for physical_locator in logical_obj.physical_object_locators:
-            if physical_locator.status not in Status.ready and not multipart_upload_id:
-                logger.error(
-                    f"Cannot delete physical object. Current status is {physical_locator.status}"
-                )
-                return Response(
-                    status_code=409,
-                    content="Cannot delete physical object in current state",
-                )
+        if not multipart_upload_id:
+            for physical_locator in logical_obj.physical_object_locators:
+                if physical_locator.status != Status.ready:
+                    logger.error(
+                        f"Cannot delete physical object {key}. Current status is {physical_locator.status}"
+                    )
+                    return Response(
+                        status_code=409,
+                        content=f"Cannot delete physical object in current state: {key}",
+                    )
 
-            physical_locator.status = Status.pending_deletion
-            physical_locator.lock_acquired_ts = datetime.utcnow()
-            locators.append(
-                LocateObjectResponse(
-                    id=physical_locator.id,
-                    tag=physical_locator.location_tag,
-                    cloud=physical_locator.cloud,
-                    bucket=physical_locator.bucket,
-                    region=physical_locator.region,
-                    key=physical_locator.key,
-                    size=physical_locator.logical_object.size,
-                    last_modified=physical_locator.logical_object.last_modified,
-                    etag=physical_locator.logical_object.etag,
-                    multipart_upload_id=physical_locator.multipart_upload_id,
-                )
+        logical_objs[key] = logical_obj
+
+    locator_dict = {
+        key: [
+            LocateObjectResponse(
+                id=physical_locator.id,
+                tag=physical_locator.location_tag,
+                cloud=physical_locator.cloud,
+                bucket=physical_locator.bucket,
+                region=physical_locator.region,
+                key=physical_locator.key,
+                size=logical_obj.size,
+                last_modified=logical_obj.last_modified,
+                etag=logical_obj.etag,
+                multipart_upload_id=physical_locator.multipart_upload_id,
             )
+            for physical_locator in logical_obj.physical_object_locators
+        ]
+        for key, logical_obj in logical_objs.items()
+    }
 
-        logical_obj.status = Status.pending_deletion
+    lock_acquired_ts = datetime.utcnow()
+    for logical_obj_ids in _chunks(obj.id for obj in logical_objs.values()):
+        await db.execute(
+            update(DBPhysicalObjectLocator)
+            .where(DBPhysicalObjectLocator.logical_object_id.in_(logical_obj_ids))
+            .values(status=Status.pending_deletion, lock_acquired_ts=lock_acquired_ts)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            update(DBLogicalObject)
+            .where(DBLogicalObject.id.in_(logical_obj_ids))
+            .values(status=Status.pending_deletion)
+            .execution_options(synchronize_session=False)
+        )
 
-        try:
-            await db.commit()
-        except Exception as e:
-            logger.error(f"Error occurred while committing changes: {e}")
-            return Response(status_code=500, content="Error committing changes")
+    try:
+        await db.commit()
+    except Exception as e:
+        logger.error(f"Error occurred while committing changes: {e}")
+        return Response(status_code=500, content="Error committing changes")
 
-        logger.debug(f"start_delete_object: {request} -> {logical_obj}")
+    for key in logical_objs:
+        invalidate_object(request.bucket, key)
 
-        locator_dict[key] = locators
+    logger.debug(f"start_delete_objects: {request} -> {locator_dict}")
 
     return DeleteObjectsResponse(locators=locator_dict)
 
@@ -137,49 +203,137 @@ async def complete_delete_objects(
             content="Mismatched lengths for ids and multipart_upload_ids",
         )
 
-    for id, multipart_upload_id in zip_longest(
-        request.ids, request.multipart_upload_ids or []
-    ):
-        physical_locator_stmt = (
-            select(DBPhysicalObjectLocator)
-            .where(DBPhysicalObjectLocator.id == id)
-            .where(
-                DBPhysicalObjectLocator.multipart_upload_id == multipart_upload_id
-                if multipart_upload_id
-                else True
-            )
+    expected_multipart_upload_ids = dict(
+        zip_longest(request.ids, request.multipart_upload_ids or [])
+    )
+
+    rows = {}
+    for ids in _chunks(expected_multipart_upload_ids):
+        stmt = (
+            select(DBPhysicalObjectLocator, DBLogicalObject.bucket, DBLogicalObject.key)
+            .join(DBLogicalObject)
+            .where(DBPhysicalObjectLocator.id.in_(ids))
+        )
+        rows.update(
+            (locator.id, (locator, bucket, key))
+            for locator, bucket, key in await db.execute(stmt)
         )
 
-        physical_locator = await db.scalar(physical_locator_stmt)
+    for id, multipart_upload_id in expected_multipart_upload_ids.items():
+        row = rows.get(id)
+        if row is None or (
+            multipart_upload_id and row[0].multipart_upload_id != multipart_upload_id
+        ):
+            logger.error(f"physical locator not found: {id}, {request}")
+            return Response(status_code=404, content=f"Physical Object Not Found: {id}")
 
-        if physical_locator is None:
-            logger.error(f"physical locator not found: {request}")
-            return Response(status_code=404, content="Physical Object Not Found")
+        if row[0].status != Status.pending_deletion:
+            return Response(
+                status_code=409,
+                content=f"Physical object is not marked for deletion: {id}",
+            )
 
-        await db.refresh(physical_locator, ["logical_object"])
+    logger.debug(f"complete_delete_objects: {request} -> {list(rows.values())}")
 
-        logger.debug(f"complete_delete_object: {request} -> {physical_locator}")
+    for locator_ids in _chunks(rows):
+        await db.execute(
+            delete(DBPhysicalMultipartUploadPart)
+            .where(
+                DBPhysicalMultipartUploadPart.physical_object_locator_id.in_(
+                    locator_ids
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(DBPhysicalObjectLocator)
+            .where(DBPhysicalObjectLocator.id.in_(locator_ids))
+            .execution_options(synchronize_session=False)
+        )
 
-        if physical_locator.status != Status.pending_deletion:
-            return Response(
-                status_code=409, content="Physical object is not marked for deletion"
+    # Remove logical objects that no longer have any physical locator
+    deleted_logical_objs = 0
+    for logical_obj_ids in _chunks(
+        {locator.logical_object_id for locator, _, _ in rows.values()}
+    ):
+        orphaned_logical_obj_ids = (
+            select(DBLogicalObject.id)
+            .where(DBLogicalObject.id.in_(logical_obj_ids))
+            .where(
+                ~select(DBPhysicalObjectLocator.id)
+                .where(DBPhysicalObjectLocator.logical_object_id == DBLogicalObject.id)
+                .exists()
             )
+        )
+        await db.execute(
+            delete(DBLogicalMultipartUploadPart)
+            .where(
+                DBLogicalMultipartUploadPart.logical_object_id.in_(
+                    orphaned_logical_obj_ids
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(
+            delete(DBLogicalObject)
+            .where(DBLogicalObject.id.in_(orphaned_logical_obj_ids))
+            .execution_options(synchronize_session=False)
+        )
+        deleted_logical_objs += result.rowcount
+
+    try:
+        await db.commit()
+    except Exception as e:
+        logger.error(f"Error occurred while committing changes: {e}")
+        return Response(status_code=500, content="Error committing changes")
+
+    for _, bucket, key in rows.values():
+        invalidate_object(bucket, key)
+    if key_filter is not None and deleted_logical_objs:
+        # Requests delete from one bucket; any other only gets its filter rebuilt sooner
+        for bucket in {bucket for _, bucket, _ in rows.values()}:
+            key_filter.removed(bucket, deleted_logical_objs)
+
+
+def _known_missing(bucket: str, key: str, negative_key: Tuple) -> bool:
+    """Whether the key filter or the negative cache answer the lookup without a query."""
+    if key_filter is not None and not key_filter.may_contain(bucket, key):
+        return True
+    return negative_cache.get(negative_key) is not None
+
+
+async def _counting_false_positives(
+    bucket: str, key: str, db: Session, lookup: Awaitable[Optional[T]]
+) -> Optional[T]:
+    """Run `lookup`, counting a key filter false positive if it finds nothing and no
+    logical object has the key at all. Keys of pending uploads or deletions are rightly
+    in the filter. Runs only in the single-flight leader, so each query counts once."""
+    response = await lookup
+    if response is None and key_filter is not None and key_filter.ready:
+        stmt = (
+            select(DBLogicalObject.id)
+            .where(DBLogicalObject.bucket == bucket)
+            .where(DBLogicalObject.key == key)
+            .limit(1)
+        )
+        if await db.scalar(stmt) is None:
+            key_filter.record_false_positive()
+    return response
 
-        await db.delete(physical_locator)
 
-        remaining_physical_locators_stmt = select(DBPhysicalObjectLocator).where(
-            DBPhysicalObjectLocator.logical_object_id
-            == physical_locator.logical_object.id
-        )
-        remaining_physical_locators = await db.execute(remaining_physical_locators_stmt)
-        if not remaining_physical_locators.all():
-            await db.delete(physical_locator.logical_object)
+def choose_locator(
+    locators: List[DBPhysicalObjectLocator], client_from_region: str
+) -> Tuple[Optional[DBPhysicalObjectLocator], str]:
+    """Pick the locator in the client's region, falling back to the primary."""
+    for locator in locators:
+        if locator.location_tag == client_from_region:
+            return locator, "exact match"
 
-        try:
-            await db.commit()
-        except Exception as e:
-            logger.error(f"Error occurred while committing changes: {e}")
-            return Response(status_code=500, content="Error committing changes")
+    # find the primary locator
+    return (
+        next((locator for locator in locators if locator.is_primary), None),
+        "fallback to primary",
+    )
 
 
 @router.post(
@@ -190,46 +344,65 @@ async def complete_delete_objects(
     },
 )
 async def locate_object(
-    request: LocateObjectRequest, db: Session = Depends(get_session)
+    request: LocateObjectRequest, db: Session = Depends(get_read_session)
 ) -> LocateObjectResponse:
     """Given the logical object information, return one or zero physical object locators."""
+    cache_key = (request.bucket, request.key, request.client_from_region)
+    cached = locate_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    negative_key = (request.bucket, request.key, "locate", request.client_from_region)
+    if _known_missing(request.bucket, request.key, negative_key):
+        return Response(status_code=404, content="Object Not Found")
+    cache_epoch = locate_cache.epoch
+    negative_epoch = negative_cache.epoch
+
+    # Concurrent lookups of the same hot key share one query. Keyed by the cache epoch, so
+    # a lookup started before a write committed is not shared with requests after it.
+    response = await locate_flights.do(
+        (cache_key, cache_epoch),
+        lambda: _counting_false_positives(
+            request.bucket, request.key, db, _locate_object(request, db)
+        ),
+    )
+    if response is None:
+        negative_cache.put(negative_key, True, negative_epoch)
+        return Response(status_code=404, content="Object Not Found")
+    locate_cache.put(cache_key, response, cache_epoch)
+    return response
+
+
+async def _locate_object(
+    request: LocateObjectRequest, db: Session
+) -> Optional[LocateObjectResponse]:
     stmt = (
-        select(DBPhysicalObjectLocator)
+        select(DBPhysicalObjectLocator, DBLogicalObject)
         .join(DBLogicalObject)
         .where(DBLogicalObject.bucket == request.bucket)
         .where(DBLogicalObject.key == request.key)
         .where(DBLogicalObject.status == Status.ready)
         .where(DBPhysicalObjectLocator.status == Status.ready)
     )
-    locators = (await db.scalars(stmt)).all()
-
-    if len(locators) == 0:
-        return Response(status_code=404, content="Object Not Found")
+    rows = (await db.execute(stmt)).all()
 
-    chosen_locator = None
-    reason = ""
+    if len(rows) == 0:
+        return None
+    locators = [locator for locator, _ in rows]
+    logical_object = rows[0][1]
 
     # if request.get_primary:
     #     chosen_locator = next(locator for locator in locators if locator.is_primary)
     #     reason = "exact match (primary)"
     # else:
-    for locator in locators:
-        if locator.location_tag == request.client_from_region:
-            chosen_locator = locator
-            reason = "exact match"
-            break
-
+    chosen_locator, reason = choose_locator(locators, request.client_from_region)
     if chosen_locator is None:
-        # find the primary locator
-        chosen_locator = next(locator for locator in locators if locator.is_primary)
-        reason = "fallback to primary"
+        logger.error(f"locate_object: no ready primary locator, {request}")
+        return None
 
     logger.debug(
         f"locate_object: chosen locator with strategy {reason} out of {len(locators)}, {request} -> {chosen_locator}"
     )
 
-    await db.refresh(chosen_locator, ["logical_object"])
-
     return LocateObjectResponse(
         id=chosen_locator.id,
         tag=chosen_locator.location_tag,
@@ -237,11 +410,108 @@ async def locate_object(
         bucket=chosen_locator.bucket,
         region=chosen_locator.region,
         key=chosen_locator.key,
-        size=chosen_locator.logical_object.size,
-        last_modified=chosen_locator.logical_object.last_modified,
-        etag=chosen_locator.logical_object.etag,
+        size=logical_object.size,
+        last_modified=logical_object.last_modified,
+        etag=logical_object.etag,
+    )
+
+
+@router.post("/locate_objects")
+async def locate_objects(
+    request: LocateObjectsRequest, db: Session = Depends(get_read_session)
+) -> LocateObjectsResponse:
+    """Batched locate_object: resolve the keys with one query per chunk of them. Missing
+    keys map to None."""
+    results: Dict[str, Optional[LocateObjectResponse]] = {}
+    cache_epoch = locate_cache.epoch
+    missing_keys = []
+    for key in dict.fromkeys(request.keys):
+        cached = locate_cache.get((request.bucket, key, request.client_from_region))
+        if cached is not None:
+            results[key] = cached
+        else:
+            results[key] = None
+            missing_keys.append(key)
+
+    if missing_keys:
+        locators_by_key: Dict[str, List[DBPhysicalObjectLocator]] = {}
+        logical_objects: Dict[str, DBLogicalObject] = {}
+        for keys in _chunks(missing_keys):
+            stmt = (
+                select(DBPhysicalObjectLocator, DBLogicalObject)
+                .join(DBLogicalObject)
+                .where(DBLogicalObject.bucket == request.bucket)
+                .where(DBLogicalObject.key.in_(keys))
+                .where(DBLogicalObject.status == Status.ready)
+                .where(DBPhysicalObjectLocator.status == Status.ready)
+            )
+            for locator, logical_object in (await db.execute(stmt)).all():
+                locators_by_key.setdefault(logical_object.key, []).append(locator)
+                logical_objects[logical_object.key] = logical_object
+
+        for key, locators in locators_by_key.items():
+            chosen_locator, _ = choose_locator(locators, request.client_from_region)
+            if chosen_locator is None:
+                continue
+
+            logical_object = logical_objects[key]
+            results[key] = LocateObjectResponse(
+                id=chosen_locator.id,
+                tag=chosen_locator.location_tag,
+                cloud=chosen_locator.cloud,
+                bucket=chosen_locator.bucket,
+                region=chosen_locator.region,
+                key=chosen_locator.key,
+                size=logical_object.size,
+                last_modified=logical_object.last_modified,
+                etag=logical_object.etag,
+            )
+            locate_cache.put(
+                (request.bucket, key, request.client_from_region),
+                results[key],
+                cache_epoch,
+            )
+
+    logger.debug(
+        f"locate_objects: {request} -> {sum(r is not None for r in results.values())} found"
     )
 
+    return LocateObjectsResponse(locators=results)
+
+
+async def _bucket_topology(
+    bucket: str, db: Session
+) -> Optional[Dict[str, PhysicalLocation]]:
+    """The logical bucket's physical bucket locations by region tag, or None if it has
+    none. Served from the topology cache, which the bucket operations invalidate."""
+    cache_key = (bucket,)
+    topology = bucket_topology_cache.get(cache_key)
+    if topology is not None:
+        return topology
+
+    epoch = bucket_topology_cache.epoch
+    stmt = (
+        select(DBPhysicalBucketLocator)
+        .join(DBLogicalBucket)
+        .where(DBLogicalBucket.bucket == bucket)
+    )
+    topology = {
+        locator.location_tag: PhysicalLocation(
+            name=locator.location_tag,
+            cloud=locator.cloud,
+            region=locator.region,
+            bucket=locator.bucket,
+            prefix=locator.prefix,
+            is_primary=locator.is_primary,
+            need_warmup=locator.need_warmup,
+        )
+        for locator in await db.scalars(stmt)
+    }
+    if not topology:
+        return None
+    bucket_topology_cache.put(cache_key, topology, epoch)
+    return topology
+
 
 @router.post("/start_warmup")
 async def start_warmup(
@@ -268,27 +538,14 @@ async def start_warmup(
         return Response(status_code=500, content="Internal Server Error")
 
     # TODO: at what granularity do we want to do this? per bucket? per object?
-    logical_bucket = (
-        await db.execute(
-            select(DBLogicalBucket)
-            .options(selectinload(DBLogicalBucket.physical_bucket_locators))
-            .where(DBLogicalBucket.bucket == request.bucket)
-        )
-    ).scalar_one_or_none()
+    topology = await _bucket_topology(request.bucket, db) or {}
 
     # Transfer to warmup regions
     secondary_locators = []
     for region_tag in [
         region for region in request.warmup_regions if region != primary_locator.region
     ]:
-        physical_bucket_locator = next(
-            (
-                pbl
-                for pbl in logical_bucket.physical_bucket_locators
-                if pbl.location_tag == region_tag
-            ),
-            None,
-        )
+        physical_bucket_locator = topology.get(region_tag)
         if not physical_bucket_locator:
             logger.error(
                 f"No physical bucket locator found for warmup region: {region_tag}"
@@ -314,6 +571,7 @@ async def start_warmup(
         locator.status = Status.pending
 
     await db.commit()
+    invalidate_object(request.bucket, request.key)
     return StartWarmupResponse(
         src_locator=LocateObjectResponse(
             id=primary_locator.id,
@@ -343,14 +601,16 @@ async def start_upload(
 ) -> StartUploadResponse:
     # TODO: policy check
 
+    # Existing copies and their logical object in one query
     existing_objects_stmt = (
-        select(DBPhysicalObjectLocator)
+        select(DBPhysicalObjectLocator, DBLogicalObject)
         .join(DBLogicalObject)
         .where(DBLogicalObject.bucket == request.bucket)
         .where(DBLogicalObject.key == request.key)
         .where(DBLogicalObject.status == Status.ready)
     )
-    existing_objects = (await db.scalars(existing_objects_stmt)).all()
+    existing_rows = (await db.execute(existing_objects_stmt)).all()
+    existing_objects = [locator for locator, _ in existing_rows]
     # Parse results for the object_already_exists check
     object_already_exists = any(
         locator.location_tag == request.client_from_region
@@ -363,6 +623,10 @@ async def start_upload(
     existing_tags = set(locator.location_tag for locator in existing_objects)
     primary_exists = any(locator.is_primary for locator in existing_objects)
 
+    topology = await _bucket_topology(request.bucket, db)
+    if topology is None:
+        return Response(status_code=404, content="Bucket Not Found")
+
     if (request.copy_src_bucket is not None) and (request.copy_src_key is not None):
         copy_src_stmt = (
             select(DBPhysicalObjectLocator)
@@ -391,17 +655,7 @@ async def start_upload(
         )
         db.add(logical_object)
     else:
-        await db.refresh(existing_objects[0], ["logical_object"])
-        logical_object = existing_objects[0].logical_object
-
-    logical_bucket = (
-        await db.execute(
-            select(DBLogicalBucket)
-            .options(selectinload(DBLogicalBucket.physical_bucket_locators))
-            .where(DBLogicalBucket.bucket == request.bucket)
-        )
-    ).scalar_one_or_none()
-    physical_bucket_locators = logical_bucket.physical_bucket_locators
+        logical_object = existing_rows[0][1]
 
     primary_write_region = None
 
@@ -424,14 +678,12 @@ async def start_upload(
         if request.policy == "push":
             # Except this case, always set the first-write region of the OBJECT to be primary
             upload_to_region_tags = [
-                locator.location_tag
-                for locator in physical_bucket_locators
-                if locator.is_primary or locator.need_warmup
+                tag
+                for tag, location in topology.items()
+                if location.is_primary or location.need_warmup
             ]
             primary_write_region = [
-                locator.location_tag
-                for locator in physical_bucket_locators
-                if locator.is_primary
+                tag for tag, location in topology.items() if location.is_primary
             ]
             assert (
                 len(primary_write_region) == 1
@@ -475,10 +727,7 @@ async def start_upload(
         if region_tag in existing_tags:
             continue
 
-        physical_bucket_locator = next(
-            (pbl for pbl in physical_bucket_locators if pbl.location_tag == region_tag),
-            None,
-        )
+        physical_bucket_locator = topology.get(region_tag)
         if physical_bucket_locator is None:
             logger.error(
                 f"No physical bucket locator found for region tag: {region_tag}"
@@ -506,6 +755,9 @@ async def start_upload(
 
     db.add_all(locators)
     await db.commit()
+    # Only once committed: a filter rebuild reading the table before then would miss it
+    if key_filter is not None:
+        key_filter.add(request.bucket, request.key)
 
     logger.debug(f"start_upload: {request} -> {locators}")
 
@@ -527,36 +779,77 @@ async def start_upload(
     )
 
 
-@router.patch("/complete_upload")
-async def complete_upload(
-    request: PatchUploadIsCompleted, db: Session = Depends(get_session)
-):
+async def _apply_completions(
+    db: Session, requests: List[PatchUploadIsCompleted]
+) -> Union[Response, Set[Tuple[str, str]]]:
+    """Mark the physical locators ready, and their logical objects ready with the final
+    size, etag and last_modified where the policy says so. Returns the (bucket, key) of
+    the objects changed, or an error response, without changing anything, if a locator
+    does not exist."""
     stmt = (
         select(DBPhysicalObjectLocator)
         .join(DBLogicalObject)
         .options(joinedload(DBPhysicalObjectLocator.logical_object))
-        .where(DBPhysicalObjectLocator.id == request.id)
+        .where(DBPhysicalObjectLocator.id.in_({request.id for request in requests}))
     )
-    physical_locator = await db.scalar(stmt)
-    if physical_locator is None:
-        logger.error(f"physical locator not found: {request}")
-        return Response(status_code=404, content="Not Found")
+    physical_locators = {locator.id: locator for locator in await db.scalars(stmt)}
+
+    for request in requests:
+        if request.id not in physical_locators:
+            logger.error(f"physical locator not found: {request}")
+            return Response(status_code=404, content="Not Found")
+
+    for request in requests:
+        physical_locator = physical_locators[request.id]
+        logger.debug(f"complete_upload: {request} -> {physical_locator}")
+
+        physical_locator.status = Status.ready
+        physical_locator.lock_acquired_ts = None
+
+        if (
+            request.policy == "push" and physical_locator.is_primary
+        ) or request.policy == "write_local":  # TODO: might need to change the if conditions for different policies
+            logical_object = physical_locator.logical_object
+            logical_object.status = Status.ready
+            logical_object.size = request.size
+            logical_object.etag = request.etag
+            logical_object.last_modified = request.last_modified.replace(tzinfo=None)
+
+    return {
+        (locator.logical_object.bucket, locator.logical_object.key)
+        for locator in physical_locators.values()
+    }
+
+
+async def _complete_uploads(
+    db: Session, requests: List[PatchUploadIsCompleted]
+) -> Optional[Response]:
+    objects = await commit_write(
+        db, lambda session: _apply_completions(session, requests)
+    )
+    if isinstance(objects, Response):
+        return objects
+    for bucket, key in objects:
+        invalidate_object(bucket, key)
+        if key_filter is not None:
+            key_filter.add(bucket, key)
+    return None
 
-    logger.debug(f"complete_upload: {request} -> {physical_locator}")
 
-    physical_locator.status = Status.ready
-    physical_locator.lock_acquired_ts = None
+@router.patch("/complete_upload")
+async def complete_upload(
+    request: PatchUploadIsCompleted, db: Session = Depends(get_session)
+):
+    return await _complete_uploads(db, [request])
+
 
-    if (
-        request.policy == "push" and physical_locator.is_primary
-    ) or request.policy == "write_local":  # TODO: might need to change the if conditions for different policies
-        # await db.refresh(physical_locator, ["logical_object"])
-        logical_object = physical_locator.logical_object
-        logical_object.status = Status.ready
-        logical_object.size = request.size
-        logical_object.etag = request.etag
-        logical_object.last_modified = request.last_modified.replace(tzinfo=None)
-    await db.commit()
+@router.patch("/complete_uploads")
+async def complete_uploads(
+    request: PatchUploadsIsCompleted, db: Session = Depends(get_session)
+):
+    """Complete many uploaded copies in one transaction, e.g. every locator start_upload
+    returned for a small object once the proxy has written all of them."""
+    return await _complete_uploads(db, request.uploads)
 
 
 @router.patch("/set_multipart_id")
@@ -581,70 +874,83 @@ async def set_multipart_id(
     await db.commit()
 
 
+async def _record_parts(
+    db: Session, parts: List[PatchUploadMultipartUploadPart]
+) -> Optional[Response]:
+    """Upsert parts on their physical locators, mirroring the parts of primary locators
+    onto the logical object. Returns an error response if a locator does not exist."""
+    locators = {}
+    for ids in _chunks({part.id for part in parts}):
+        stmt = (
+            select(
+                DBPhysicalObjectLocator.id,
+                DBPhysicalObjectLocator.logical_object_id,
+                DBPhysicalObjectLocator.is_primary,
+            )
+            .join(DBLogicalObject)
+            .where(DBPhysicalObjectLocator.id.in_(ids))
+        )
+        locators.update((locator.id, locator) for locator in await db.execute(stmt))
+
+    # Keyed by (owner, part_number): a part reported twice keeps its last report
+    physical_parts: Dict[Tuple[int, int], Dict] = {}
+    logical_parts: Dict[Tuple[int, int], Dict] = {}
+    for part in parts:
+        locator = locators.get(part.id)
+        if locator is None:
+            logger.error(f"physical locator not found: {part}")
+            return Response(status_code=404, content=f"Not Found: {part.id}")
+
+        values = dict(part_number=part.part_number, etag=part.etag, size=part.size)
+        physical_parts[part.id, part.part_number] = dict(
+            physical_object_locator_id=part.id, **values
+        )
+        if locator.is_primary:
+            logical_parts[locator.logical_object_id, part.part_number] = dict(
+                logical_object_id=locator.logical_object_id, **values
+            )
+
+    # One keyed upsert per chunk instead of loading every part recorded so far
+    for model, owner, rows in (
+        (
+            DBPhysicalMultipartUploadPart,
+            "physical_object_locator_id",
+            list(physical_parts.values()),
+        ),
+        (
+            DBLogicalMultipartUploadPart,
+            "logical_object_id",
+            list(logical_parts.values()),
+        ),
+    ):
+        if not rows:
+            continue
+        # Each row binds one parameter per column
+        chunk = MAX_BOUND_PARAMETERS // len(rows[0])
+        for start in range(0, len(rows), chunk):
+            await db.execute(
+                upsert(model, [owner, "part_number"], rows[start : start + chunk])
+            )
+    return None
+
+
 @router.patch("/append_part")
 async def append_part(
     request: PatchUploadMultipartUploadPart, db: Session = Depends(get_session)
 ):
-    stmt = (
-        select(DBPhysicalObjectLocator)
-        .join(DBLogicalObject)
-        .where(DBPhysicalObjectLocator.id == request.id)
-    )
-    physical_locator = await db.scalar(stmt)
-    if physical_locator is None:
-        logger.error(f"physical locator not found: {request}")
-        return Response(status_code=404, content="Not Found")
-    await db.refresh(physical_locator, ["logical_object"])
+    logger.debug(f"append_part: {request}")
 
-    logger.debug(f"append_part: {request} -> {physical_locator}")
+    return await commit_write(db, lambda session: _record_parts(session, [request]))
 
-    await db.refresh(physical_locator, ["multipart_upload_parts"])
-
-    existing_physical_part = next(
-        (
-            part
-            for part in physical_locator.multipart_upload_parts
-            if part.part_number == request.part_number
-        ),
-        None,
-    )
 
-    if existing_physical_part:
-        existing_physical_part.etag = request.etag
-        existing_physical_part.size = request.size
-    else:
-        physical_locator.multipart_upload_parts.append(
-            DBPhysicalMultipartUploadPart(
-                part_number=request.part_number,
-                etag=request.etag,
-                size=request.size,
-            )
-        )
-
-    if physical_locator.is_primary:
-        await db.refresh(physical_locator.logical_object, ["multipart_upload_parts"])
-        existing_logical_part = next(
-            (
-                part
-                for part in physical_locator.logical_object.multipart_upload_parts
-                if part.part_number == request.part_number
-            ),
-            None,
-        )
-
-        if existing_logical_part:
-            existing_logical_part.etag = request.etag
-            existing_logical_part.size = request.size
-        else:
-            physical_locator.logical_object.multipart_upload_parts.append(
-                DBLogicalMultipartUploadPart(
-                    part_number=request.part_number,
-                    etag=request.etag,
-                    size=request.size,
-                )
-            )
+@router.patch("/append_parts")
+async def append_parts(
+    request: PatchUploadMultipartUploadParts, db: Session = Depends(get_session)
+):
+    """Record many completed parts, across any locators, in one transaction."""
+    logger.debug(f"append_parts: {len(request.parts)} parts")
 
-    await db.commit()
+    return await commit_write(db, lambda session: _record_parts(session, request.parts))
 
 
 @router.post("/continue_upload")
@@ -659,6 +965,11 @@ async def continue_upload(
         .where(DBLogicalObject.status == Status.pending)
         .where(DBLogicalObject.multipart_upload_id == request.multipart_upload_id)
     )
+    if request.do_list_parts:
+        # One query loads the parts of every locator
+        stmt = stmt.options(
+            selectinload(DBPhysicalObjectLocator.multipart_upload_parts)
+        )
     locators = (await db.scalars(stmt)).all()
     if len(locators) == 0:
         return Response(status_code=404, content="Not Found")
@@ -689,10 +1000,6 @@ async def continue_upload(
             copy_src_buckets.append(src_map[locator.location_tag].bucket)
             copy_src_keys.append(src_map[locator.location_tag].key)
 
-    if request.do_list_parts:
-        for locator in locators:
-            await db.refresh(locator, ["multipart_upload_parts"])
-
     logger.debug(f"continue_upload: {request} -> {locators}")
 
     return [
@@ -724,57 +1031,142 @@ async def continue_upload(
     ]
 
 
+def _key_range(stmt, prefix: Optional[str], after: Optional[str] = None):
+    """Restrict `stmt` to keys starting with `prefix` and sorting after `after`, written as a
+    range so it is served from the (bucket, key) index instead of a LIKE scan."""
+    if prefix:
+        stmt = stmt.where(DBLogicalObject.key >= prefix)
+        upper_bound = prefix_upper_bound(prefix)
+        if upper_bound is not None:
+            stmt = stmt.where(DBLogicalObject.key < upper_bound)
+    if after is not None:
+        stmt = stmt.where(DBLogicalObject.key > after)
+    return stmt
+
+
+async def _list_objects_page(
+    request: ListObjectRequest, db: Session, limit: Optional[int]
+) -> Optional[List[ObjectResponse]]:
+    """Up to `limit` ready objects in key order, or None if the bucket does not exist.
+    Raises ValueError for an invalid continuation token."""
+    after = request.start_after
+    if request.continuation_token is not None:
+        after = decode_continuation_token(request.continuation_token)
+
+    stmt = select(DBLogicalBucket.id).where(
+        DBLogicalBucket.bucket == request.bucket, DBLogicalBucket.status == Status.ready
+    )
+    if await db.scalar(stmt) is None:
+        return None
+
+    # Only the columns ObjectResponse needs, in index order, so each page costs the same
+    # regardless of how many keys the bucket holds
+    stmt = select(
+        DBLogicalObject.bucket,
+        DBLogicalObject.key,
+        DBLogicalObject.size,
+        DBLogicalObject.etag,
+        DBLogicalObject.last_modified,
+    ).where(
+        DBLogicalObject.bucket == request.bucket,
+        DBLogicalObject.status == Status.ready,
+    )
+    stmt = _key_range(stmt, request.prefix, after).order_by(DBLogicalObject.key)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    return [
+        ObjectResponse(
+            bucket=row.bucket,
+            key=row.key,
+            size=row.size,
+            etag=row.etag,
+            last_modified=row.last_modified,
+        )
+        for row in await db.execute(stmt)
+    ]
+
+
 @router.post("/list_objects")
 async def list_objects(
-    request: ListObjectRequest, db: Session = Depends(get_session)
+    request: ListObjectRequest, db: Session = Depends(get_read_session)
 ) -> List[ObjectResponse]:
-    stmt = select(DBLogicalBucket).where(
-        DBLogicalBucket.bucket == request.bucket, DBLogicalBucket.status == Status.ready
-    )
-    logical_bucket = await db.scalar(stmt)
-    if logical_bucket is None:
+    try:
+        objects = await _list_objects_page(request, db, request.max_keys)
+    except ValueError as e:
+        return Response(status_code=400, content=str(e))
+    if objects is None:
         return Response(status_code=404, content="Bucket Not Found")
 
-    stmt = select(DBLogicalObject).where(
-        DBLogicalObject.bucket == logical_bucket.bucket,
-        DBLogicalObject.status == Status.ready,
-    )
-    if request.prefix is not None:
-        stmt = stmt.where(DBLogicalObject.key.startswith(request.prefix))
-    if request.start_after is not None:
-        stmt = stmt.where(DBLogicalObject.key > request.start_after)
+    logger.debug(f"list_objects: {request} -> {objects}")
 
-    # Sort keys before return
-    stmt = stmt.order_by(DBLogicalObject.key)
+    return objects
 
-    # Limit the number of returned objects if specified
-    if request.max_keys is not None:
-        stmt = stmt.limit(request.max_keys)
 
-    objects = await db.execute(stmt)
-    objects_all = objects.scalars().all()
+@router.post("/list_objects_v2")
+async def list_objects_v2(
+    request: ListObjectRequest, db: Session = Depends(get_read_session)
+) -> ListObjectsV2Response:
+    """Paginated listing: at most max_keys (capped at MAX_PAGE_SIZE) objects per call, and
+    a continuation token for the next page when the listing is truncated."""
+    limit = MAX_PAGE_SIZE
+    if request.max_keys is not None:
+        limit = min(max(request.max_keys, 0), MAX_PAGE_SIZE)
+
+    try:
+        # Fetch one extra row to learn whether another page follows
+        objects = await _list_objects_page(request, db, limit + 1)
+    except ValueError as e:
+        return Response(status_code=400, content=str(e))
+    if objects is None:
+        return Response(status_code=404, content="Bucket Not Found")
 
-    if not objects_all:
-        return []
+    # An empty page (max_keys=0) is never truncated: there is no key to continue after
+    is_truncated = len(objects) > limit > 0
+    objects = objects[:limit]
+    next_continuation_token = None
+    if is_truncated:
+        next_continuation_token = encode_continuation_token(objects[-1].key)
 
-    logger.debug(f"list_objects: {request} -> {objects_all}")
+    logger.debug(f"list_objects_v2: {request} -> {objects}")
 
-    return [
-        ObjectResponse(
-            bucket=obj.bucket,
-            key=obj.key,
-            size=obj.size,
-            etag=obj.etag,
-            last_modified=obj.last_modified,
-        )
-        for obj in objects_all
-    ]
+    return ListObjectsV2Response(
+        objects=objects,
+        is_truncated=is_truncated,
+        next_continuation_token=next_continuation_token,
+    )
 
 
 @router.post("/head_object")
 async def head_object(
-    request: HeadObjectRequest, db: Session = Depends(get_session)
+    request: HeadObjectRequest, db: Session = Depends(get_read_session)
 ) -> HeadObjectResponse:
+    cache_key = (request.bucket, request.key)
+    cached = head_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    negative_key = (request.bucket, request.key, "head")
+    if _known_missing(request.bucket, request.key, negative_key):
+        return Response(status_code=404, content="Not Found")
+    cache_epoch = head_cache.epoch
+    negative_epoch = negative_cache.epoch
+
+    response = await head_flights.do(
+        (cache_key, cache_epoch),
+        lambda: _counting_false_positives(
+            request.bucket, request.key, db, _head_object(request, db)
+        ),
+    )
+    if response is None:
+        negative_cache.put(negative_key, True, negative_epoch)
+        return Response(status_code=404, content="Not Found")
+    head_cache.put(cache_key, response, cache_epoch)
+    return response
+
+
+async def _head_object(
+    request: HeadObjectRequest, db: Session
+) -> Optional[HeadObjectResponse]:
     stmt = (
         select(DBLogicalObject)
         .where(DBLogicalObject.bucket == request.bucket)
@@ -784,7 +1176,7 @@ async def head_object(
     obj = await db.scalar(stmt)
 
     if obj is None:
-        return Response(status_code=404, content="Not Found")
+        return None
 
     logger.debug(f"head_object: {request} -> {obj}")
 
@@ -799,15 +1191,14 @@ async def head_object(
 
 @router.post("/list_multipart_uploads")
 async def list_multipart_uploads(
-    request: ListObjectRequest, db: Session = Depends(get_session)
+    request: ListObjectRequest, db: Session = Depends(get_read_session)
 ) -> List[MultipartResponse]:
     stmt = (
         select(DBLogicalObject)
         .where(DBLogicalObject.bucket == request.bucket)
-        .where(DBLogicalObject.key.startswith(request.prefix))
         .where(DBLogicalObject.status == Status.pending)
     )
-    objects = (await db.scalars(stmt)).all()
+    objects = (await db.scalars(_key_range(stmt, request.prefix))).all()
 
     logger.debug(f"list_multipart_uploads: {request} -> {objects}")
 
@@ -821,40 +1212,95 @@ async def list_multipart_uploads(
     ]
 
 
-@router.post("/list_parts")
-async def list_parts(
-    request: ListPartsRequest, db: Session = Depends(get_session)
-) -> List[LogicalPartResponse]:
+async def _list_parts_page(
+    request: ListPartsRequest, db: Session, limit: Optional[int]
+) -> Optional[List[LogicalPartResponse]]:
+    """Up to `limit` parts of the upload in part number order, or None if the upload
+    does not exist."""
     stmt = (
-        select(DBLogicalObject)
+        select(DBLogicalObject.id)
         .where(DBLogicalObject.bucket == request.bucket)
         .where(DBLogicalObject.key == request.key)
         .where(DBLogicalObject.status == Status.pending)
         .where(DBLogicalObject.multipart_upload_id == request.upload_id)
     )
-    objects = (await db.scalars(stmt)).all()
-    if len(objects) == 0:
-        return Response(status_code=404, content="Object Multipart Not Found")
-
-    assert len(objects) == 1, "should only have one object"
-    await db.refresh(objects[0], ["multipart_upload_parts"])
+    object_ids = (await db.scalars(stmt)).all()
+    if len(object_ids) == 0:
+        return None
+    assert len(object_ids) == 1, "should only have one object"
 
-    logger.debug(
-        f"list_parts: {request} -> {objects[0], objects[0].multipart_upload_parts}"
+    # Ranged on the (logical_object_id, part_number) index, so a page of a large upload
+    # only reads the rows it returns
+    stmt = (
+        select(
+            DBLogicalMultipartUploadPart.part_number,
+            DBLogicalMultipartUploadPart.etag,
+            DBLogicalMultipartUploadPart.size,
+        )
+        .where(DBLogicalMultipartUploadPart.logical_object_id == object_ids[0])
+        .order_by(DBLogicalMultipartUploadPart.part_number)
     )
+    if request.part_number is not None:
+        stmt = stmt.where(
+            DBLogicalMultipartUploadPart.part_number == request.part_number
+        )
+    if request.part_number_marker is not None:
+        stmt = stmt.where(
+            DBLogicalMultipartUploadPart.part_number > request.part_number_marker
+        )
+    if limit is not None:
+        stmt = stmt.limit(limit)
 
     return [
-        LogicalPartResponse(
-            part_number=part.part_number,
-            etag=part.etag,
-            size=part.size,
-        )
-        for obj in objects
-        for part in obj.multipart_upload_parts
-        if request.part_number is None or part.part_number == request.part_number
+        LogicalPartResponse(part_number=row.part_number, etag=row.etag, size=row.size)
+        for row in await db.execute(stmt)
     ]
 
 
+@router.post("/list_parts")
+async def list_parts(
+    request: ListPartsRequest, db: Session = Depends(get_read_session)
+) -> List[LogicalPartResponse]:
+    parts = await _list_parts_page(request, db, request.max_parts)
+    if parts is None:
+        return Response(status_code=404, content="Object Multipart Not Found")
+
+    logger.debug(f"list_parts: {request} -> {parts}")
+
+    return parts
+
+
+@router.post("/list_parts_v2")
+async def list_parts_v2(
+    request: ListPartsRequest, db: Session = Depends(get_read_session)
+) -> ListPartsResponse:
+    """Paginated ListParts: at most max_parts (capped at MAX_PAGE_SIZE) parts per call, and
+    the marker for the next page when the listing is truncated."""
+    limit = MAX_PAGE_SIZE
+    if request.max_parts is not None:
+        limit = min(max(request.max_parts, 0), MAX_PAGE_SIZE)
+
+    # Fetch one extra row to learn whether another page follows
+    parts = await _list_parts_page(request, db, limit + 1)
+    if parts is None:
+        return Response(status_code=404, content="Object Multipart Not Found")
+
+    # An empty page (max_parts=0) is never truncated: there is no part to continue after
+    is_truncated = len(parts) > limit > 0
+    parts = parts[:limit]
+    next_part_number_marker = None
+    if is_truncated:
+        next_part_number_marker = parts[-1].part_number
+
+    logger.debug(f"list_parts_v2: {request} -> {parts}")
+
+    return ListPartsResponse(
+        parts=parts,
+        is_truncated=is_truncated,
+        next_part_number_marker=next_part_number_marker,
+    )
+
+
 @router.post(
     "/locate_object_status",
     responses={
@@ -863,7 +1309,7 @@ async def list_parts(
     },
 )
 async def locate_object_status(
-    request: LocateObjectRequest, db: Session = Depends(get_session)
+    request: LocateObjectRequest, db: Session = Depends(get_read_session)
 ) -> ObjectStatus:
     """Given the logical object information, return the status of the object.
     Currently only used for testing metadata cleanup."""
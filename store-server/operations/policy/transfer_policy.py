@@ -1,25 +1,141 @@
 from ..schemas.object_schemas import LocateObjectRequest, DBPhysicalObjectLocator
-from operations.policy.utils.helper import make_nx_graph
+from operations.policy.utils.profile_matrix import load_profile_graph, load_profiles
 from typing import List
+import numpy as np
+
+
+def _local_index(region: str, physical_locators: List[DBPhysicalObjectLocator]) -> int:
+    """Position of the first locator in `region`, or -1."""
+    for i, locator in enumerate(physical_locators):
+        if locator.location_tag == region:
+            return i
+    return -1
 
 
 class TransferPolicy:
     def __init__(self) -> None:
-        self.stat_graph = make_nx_graph()
-        pass
+        # Built once per process from the compiled profiles and shared by all policies
+        self.stat_graph = load_profile_graph()
+        self.profiles = load_profiles()
 
     def get(
         self, req: LocateObjectRequest, physical_locators: List[DBPhysicalObjectLocator]
     ) -> DBPhysicalObjectLocator:
         pass
 
+    def get_many(
+        self,
+        client_from_regions: List[str],
+        physical_locators: List[List[DBPhysicalObjectLocator]],
+    ) -> List[DBPhysicalObjectLocator]:
+        """
+        Args:
+            client_from_regions: List[str]: region of each client
+            physical_locators: List[List[DBPhysicalObjectLocator]]: locators to choose from for each client
+        Returns:
+            List[DBPhysicalObjectLocator]: the locator each client should fetch from
+        """
+        return [
+            self.get(
+                LocateObjectRequest(bucket="", key="", client_from_region=region),
+                locators,
+            )
+            for region, locators in zip(client_from_regions, physical_locators)
+        ]
+
     def name(self) -> str:
         pass
 
 
-class CheapestTransfer(TransferPolicy):
-    def __init__(self) -> None:
+class MatrixTransfer(TransferPolicy):
+    """
+    Picks the locator whose (client region, locator region) entry in a profile matrix is
+    the smallest (or largest), preferring a locator in the client's own region. Pairs
+    without a measurement are never preferred over measured ones.
+    """
+
+    def __init__(self, metric: str, maximize: bool) -> None:
         super().__init__()
+        matrix = np.asarray(getattr(self.profiles, metric), dtype=np.float64)
+        # Negate when maximizing so both directions reduce to an argmin
+        matrix = -matrix if maximize else matrix
+        self.scores = np.where(np.isnan(matrix), np.inf, matrix)
+
+    def get(
+        self, req: LocateObjectRequest, physical_locators: List[DBPhysicalObjectLocator]
+    ) -> DBPhysicalObjectLocator:
+        client_from_region = req.client_from_region
+
+        local = _local_index(client_from_region, physical_locators)
+        if local >= 0:
+            return physical_locators[local]
+
+        index = self.profiles.region_index
+        scores = self.scores[index[client_from_region]]
+        locator_ids = [index[locator.location_tag] for locator in physical_locators]
+        return physical_locators[int(scores[locator_ids].argmin())]
+
+    def get_many(
+        self,
+        client_from_regions: List[str],
+        physical_locators: List[List[DBPhysicalObjectLocator]],
+    ) -> List[DBPhysicalObjectLocator]:
+        if not client_from_regions:
+            return []
+
+        # Map every region to an id; regions missing from the profiles get ids past the
+        # matrix so they can still match the client's own region
+        index = dict(self.profiles.region_index)
+        num_profiled = len(index)
+        lengths = np.fromiter(map(len, physical_locators), dtype=np.intp)
+        locator_tags = [loc.location_tag for locs in physical_locators for loc in locs]
+        flat_ids = np.array(
+            [index.setdefault(tag, len(index)) for tag in locator_tags], dtype=np.intp
+        )
+        client_ids = np.array(
+            [index.setdefault(region, len(index)) for region in client_from_regions],
+            dtype=np.intp,
+        )
+
+        # Pad the locator sets into a (clients, max locators) matrix of region ids
+        width = lengths.max()
+        present = np.arange(width) < lengths[:, None]
+        locator_ids = np.full((len(lengths), width), -1, dtype=np.intp)
+        locator_ids[present] = flat_ids
+
+        profiled = (locator_ids >= 0) & (locator_ids < num_profiled)
+        clipped_client_ids = np.minimum(client_ids, num_profiled - 1)
+        scores = self.scores[
+            clipped_client_ids[:, None], np.where(profiled, locator_ids, 0)
+        ]
+        scores[~profiled] = np.inf
+        # A local copy always wins, as in `get`
+        local = locator_ids == client_ids[:, None]
+        scores[local] = -np.inf
+
+        # Without a local copy every region must be profiled, as in `get`
+        unknown = ~local.any(axis=1) & (
+            (client_ids >= num_profiled) | (present & ~profiled).any(axis=1)
+        )
+        if unknown.any():
+            row = int(np.flatnonzero(unknown)[0])
+            missing = [client_from_regions[row]] + [
+                loc.location_tag for loc in physical_locators[row]
+            ]
+            raise KeyError(
+                next(r for r in missing if r not in self.profiles.region_index)
+            )
+
+        choices = np.argmin(scores, axis=1)
+        return [
+            locators[choice] for locators, choice in zip(physical_locators, choices)
+        ]
+
+
+class CheapestTransfer(MatrixTransfer):
+    def __init__(self) -> None:
+        # find the cheapest region to get from client_from_region
+        super().__init__("cost", maximize=False)
 
     def get(
         self, req: LocateObjectRequest, physical_locators: List[DBPhysicalObjectLocator]
@@ -31,28 +147,16 @@ class CheapestTransfer(TransferPolicy):
         Returns:
             DBPhysicalObjectLocator: the cheapest physical locator to fetch from
         """
-
-        client_from_region = req.client_from_region
-
-        for locator in physical_locators:
-            if client_from_region == locator.location_tag:
-                return locator
-
-        # find the cheapest region to get from client_from_region
-        return min(
-            physical_locators,
-            key=lambda loc: self.stat_graph[client_from_region][loc.location_tag][
-                "cost"
-            ],
-        )
+        return super().get(req, physical_locators)
 
     def name(self) -> str:
         return "cheapest"
 
 
-class ClosestTransfer(TransferPolicy):
+class ClosestTransfer(MatrixTransfer):
     def __init__(self) -> None:
-        super().__init__()
+        # find the highest-throughput region to get from client_from_region
+        super().__init__("throughput", maximize=True)
 
     def get(
         self, req: LocateObjectRequest, physical_locators: List[DBPhysicalObjectLocator]
@@ -64,20 +168,7 @@ class ClosestTransfer(TransferPolicy):
         Returns:
             DBPhysicalObjectLocator: the closest physical locator to fetch from
         """
-
-        client_from_region = req.client_from_region
-
-        for locator in physical_locators:
-            if client_from_region == locator.location_tag:
-                return locator
-
-        # find the cheapest region to get from client_from_region
-        return max(
-            physical_locators,
-            key=lambda loc: self.stat_graph[client_from_region][loc.location_tag][
-                "throughput"
-            ],
-        )
+        return super().get(req, physical_locators)
 
     def name(self) -> str:
         return "closest"
@@ -1,7 +1,6 @@
 import pandas as pd
 import networkx as nx
 import os
-import ast
 from operations.policy.utils.definitions import (
     aws_instance_throughput_limit,
     gcp_instance_throughput_limit,
@@ -32,6 +31,21 @@ def load_profile(file_name: str):
     return pd.read_csv(f"src/profiles/{file_name}")
 
 
+def _edge_attributes(cost, throughput, latency):
+    attributes = {"cost": None if pd.isna(cost) else cost, "throughput": throughput}
+    if not pd.isna(latency):
+        attributes["latency"] = latency
+    return attributes
+
+
+def _ingress_limit(region: str) -> float:
+    if region.startswith("aws"):
+        return aws_instance_throughput_limit[1]
+    if region.startswith("gcp"):
+        return gcp_instance_throughput_limit[1]
+    return azure_instance_throughput_limit[1]
+
+
 def make_nx_graph(
     cost_path=None,
     throughput_path=None,
@@ -54,86 +68,109 @@ def make_nx_graph(
         cost = pd.read_csv(cost_path)
 
     if throughput_path is None:
-        throughput = pd.read_csv(os.path.join(path, "profiles", "throughput.csv"))
-    else:
-        throughput = pd.read_csv(throughput_path)
+        throughput_path = os.path.join(path, "profiles", "throughput.csv")
+    # Only the pair and throughput columns are used; skip parsing the log paths
+    throughput = pd.read_csv(
+        throughput_path, usecols=["src_region", "dst_region", "throughput_sent"]
+    )
 
     if latency_path is None:
-        latency = pd.read_csv(os.path.join(path, "profiles", "latency.csv"))
-    else:
-        latency = pd.read_csv(latency_path)
+        latency_path = os.path.join(path, "profiles", "latency.csv")
+    # Latency for the smallest (first) object size
+    latency = pd.read_csv(latency_path, usecols=[0])
 
     if storage_cost_path is None:
         storage = pd.read_csv(os.path.join(path, "profiles", "storage.csv"))
     else:
         storage = pd.read_csv(storage_cost_path)
 
-    G = nx.DiGraph()
-    for _, row in throughput.iterrows():
-        G.add_edge(
-            row["src_region"],
-            row["dst_region"],
-            cost=None,
-            throughput=num_vms * row["throughput_sent"] / 1e9,
-        )
-
-    for _, row in latency.iterrows():
-        row = row[0]
-        row_dict = ast.literal_eval(row)
-        src = row_dict["src_region"]
-        dst = row_dict["dst_bucket_region"]
-        if not G.has_edge(src, dst):
-            continue
+    # One link per measured pair; later measurements of the same pair win
+    links = pd.DataFrame(
+        {
+            "src": throughput["src_region"],
+            "dst": throughput["dst_region"],
+            "throughput": num_vms * throughput["throughput_sent"] / 1e9,
+        }
+    ).drop_duplicates(["src", "dst"], keep="last")
+
+    # Latency rows are stringified dicts; extract the fields for all rows at once
+    latency_rows = latency.iloc[:, 0]
+    latency = pd.DataFrame(
+        {
+            "src": latency_rows.str.extract(r"'src_region': '([^']*)'")[0],
+            "dst": latency_rows.str.extract(r"'dst_bucket_region': '([^']*)'")[0],
+            "latency": pd.to_numeric(
+                latency_rows.str.extract(r"'download_latency': ([^,}]*)")[0]
+            ),
+        }
+    ).drop_duplicates(["src", "dst"], keep="last")
+    links = links.merge(latency, on=["src", "dst"], how="left")
+
+    cost = cost.rename(columns={"dest": "dst"})[["src", "dst", "cost"]]
+    cost = cost.drop_duplicates(["src", "dst"], keep="last")
+    links = links.merge(cost, on=["src", "dst"], how="left")
 
-        G[src][dst]["latency"] = row_dict["download_latency"]
-
-    for _, row in cost.iterrows():
-        if row["src"] in G and row["dest"] in G[row["src"]]:
-            G[row["src"]][row["dest"]]["cost"] = row["cost"]
+    G = nx.DiGraph()
+    # Nodes in order of first appearance in the throughput grid
+    G.add_nodes_from(
+        pd.unique(throughput[["src_region", "dst_region"]].to_numpy().ravel())
+    )
+    G.add_edges_from(
+        (src, dst, _edge_attributes(egress_cost, tput, lat))
+        for src, dst, tput, lat, egress_cost in links[
+            ["src", "dst", "throughput", "latency", "cost"]
+        ].itertuples(index=False)
+    )
 
     # some pairs not in the cost grid
-    no_cost_pairs = []
-    for edge in G.edges.data():
-        src, dst = edge[0], edge[1]
-        if edge[-1]["cost"] is None:
-            no_cost_pairs.append((src, dst))
+    no_cost = links[links["cost"].isna()]
+    no_cost_pairs = list(zip(no_cost["src"], no_cost["dst"]))
     print("Unable to get egress costs for: ", no_cost_pairs)
 
-    no_storage_cost = set()
-    for _, row in storage.iterrows():
-        region = row["Vendor"] + ":" + row["Region"]
-
-        if region in G:
-            if row["Group"] == "storage" and (
-                row["Tier"] == "General Purpose" or row["Tier"] == "Hot"
-            ):
-                G.nodes[region]["priceStorage"] = row["PricePerUnit"]
-        else:
-            no_storage_cost.add(region)
+    storage_regions = storage["Vendor"] + ":" + storage["Region"]
+    in_graph = storage_regions.isin(list(G.nodes))
+    no_storage_cost = set(storage_regions[~in_graph])
     print("Unable to get storage cost for: ", no_storage_cost)
+    is_hot_storage = (
+        in_graph
+        & (storage["Group"] == "storage")
+        & storage["Tier"].isin(["General Purpose", "Hot"])
+    )
+    price_storage = (
+        storage.loc[is_hot_storage, "PricePerUnit"]
+        .groupby(storage_regions[is_hot_storage])
+        .last()
+    )
 
     # TODO: add attributes priceGet, pricePut, and priceStorage to each node
-    for node in G.nodes:
-        G.nodes[node]["priceGet"] = 4.4e-07
-        G.nodes[node]["pricePut"] = 5.5e-06
-        if "priceStorage" not in G.nodes[node]:
-            G.nodes[node]["priceStorage"] = 0.023
+    G.add_nodes_from(
+        (
+            node,
+            {
+                "priceGet": 4.4e-07,
+                "pricePut": 5.5e-06,
+                "priceStorage": price_storage.get(node, 0.023),
+            },
+        )
+        for node in list(G.nodes)
+    )
 
     # NOTE: add default throughput and latency to self-edges
-    for node in G.nodes:
-        if not G.has_edge(node, node):
-            ingress_limit = (
-                aws_instance_throughput_limit[1]
-                if node.startswith("aws")
-                else (
-                    gcp_instance_throughput_limit[1]
-                    if node.startswith("gcp")
-                    else azure_instance_throughput_limit[1]
-                )
-            )
-            G.add_edge(
-                node, node, cost=0, throughput=num_vms * ingress_limit, latency=40
+    G.add_edges_from(
+        [
+            (
+                node,
+                node,
+                {
+                    "cost": 0,
+                    "throughput": num_vms * _ingress_limit(node),
+                    "latency": 40,
+                },
             )
+            for node in G.nodes
+            if not G.has_edge(node, node)
+        ]
+    )
 
     # aws_nodes = [node for node in G.nodes if node.startswith("aws")]
     # just keep aws nodes and edges
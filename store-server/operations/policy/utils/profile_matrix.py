@@ -0,0 +1,207 @@
+"""
+Network and storage profiles compiled into dense per-region arrays.
+
+`make_nx_graph` parses the CSV profiles under `profiles/`, which takes most of a second.
+`python -m operations.policy.utils.profile_matrix` (`just compile-profiles`) compiles the
+same data once into a single binary artifact that every process memory-maps:
+
+    magic (8 bytes) | header length (8 bytes, little endian) | JSON header | arrays
+
+The JSON header lists the regions, whose position is their integer id, and the dtype,
+shape and offset of each array. Arrays start on 64-byte boundaries.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import struct
+import time
+
+import networkx as nx
+import numpy as np
+
+logger = logging.getLogger("skystore")
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+PROFILE_SOURCES = ["cost.csv", "throughput.csv", "latency.csv", "storage.csv"]
+PROFILE_ARTIFACT = os.environ.get(
+    "SKYSTORE_PROFILE_ARTIFACT", os.path.join(PROFILE_DIR, "compiled_profiles.bin")
+)
+
+_MAGIC = b"SKYPROF1"
+_ALIGNMENT = 64
+
+
+class RegionProfiles:
+    """
+    Dense profiles indexed by region id.
+
+    Pair arrays are indexed [src, dst]. NaN marks a pair without measurements, and a pair
+    is a link in the graph iff its throughput is known.
+        cost: egress $/GB
+        throughput: max tput achievable by a single VM (gbps)
+        latency: download latency of a 10 MB object (s)
+    Region arrays hold priceStorage ($/GB/month), priceGet and pricePut ($/request).
+    """
+
+    PAIR_ARRAYS = ["cost", "throughput", "latency"]
+    REGION_ARRAYS = ["price_storage", "price_get", "price_put"]
+
+    def __init__(self, regions: List[str], arrays: Dict[str, np.ndarray]) -> None:
+        self.regions = regions
+        self.region_index = {region: i for i, region in enumerate(regions)}
+        self.cost = arrays["cost"]
+        self.throughput = arrays["throughput"]
+        self.latency = arrays["latency"]
+        self.price_storage = arrays["price_storage"]
+        self.price_get = arrays["price_get"]
+        self.price_put = arrays["price_put"]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            name: getattr(self, name) for name in self.PAIR_ARRAYS + self.REGION_ARRAYS
+        }
+
+    @classmethod
+    def from_graph(cls, G: nx.DiGraph) -> "RegionProfiles":
+        regions = list(G.nodes)
+        index = {region: i for i, region in enumerate(regions)}
+        n = len(regions)
+        arrays = {name: np.full((n, n), np.nan) for name in cls.PAIR_ARRAYS}
+        for src, dst, data in G.edges(data=True):
+            for name in cls.PAIR_ARRAYS:
+                value = data.get(name)
+                if value is not None:
+                    arrays[name][index[src], index[dst]] = value
+        for name, attr in zip(
+            cls.REGION_ARRAYS, ["priceStorage", "priceGet", "pricePut"]
+        ):
+            arrays[name] = np.array([G.nodes[region][attr] for region in regions])
+        return cls(regions, arrays)
+
+    def to_graph(self, num_vms: int = 1) -> nx.DiGraph:
+        """The graph `make_nx_graph` would build from the same profiles."""
+        G = nx.DiGraph()
+        G.add_nodes_from(
+            (
+                region,
+                {
+                    "priceGet": float(self.price_get[i]),
+                    "pricePut": float(self.price_put[i]),
+                    "priceStorage": float(self.price_storage[i]),
+                },
+            )
+            for i, region in enumerate(self.regions)
+        )
+
+        edges = []
+        for src, dst in zip(*np.nonzero(~np.isnan(self.throughput))):
+            cost = self.cost[src, dst]
+            latency = self.latency[src, dst]
+            data = {
+                "cost": None if np.isnan(cost) else float(cost),
+                "throughput": num_vms * float(self.throughput[src, dst]),
+            }
+            if not np.isnan(latency):
+                data["latency"] = float(latency)
+            edges.append((self.regions[src], self.regions[dst], data))
+        G.add_edges_from(edges)
+        return G
+
+    def save(self, path: str) -> None:
+        layout = {}
+        offset = 0
+        for name, array in self.arrays().items():
+            offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+            layout[name] = {
+                "dtype": "<f8",
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+            offset += array.size * 8
+        header = json.dumps({"regions": self.regions, "arrays": layout}).encode()
+
+        data_start = -(-(16 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, array in self.arrays().items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(array, dtype="<f8").tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RegionProfiles":
+        """Memory-map a compiled artifact; the arrays are read-only views of the file."""
+        with open(path, "rb") as f:
+            magic, header_len = f.read(8), struct.unpack("<Q", f.read(8))[0]
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a compiled profile artifact")
+            header = json.loads(f.read(header_len))
+
+        data_start = -(-(16 + header_len) // _ALIGNMENT) * _ALIGNMENT
+        mapped = np.memmap(path, dtype=np.uint8, mode="r")
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            start = data_start + spec["offset"]
+            count = int(np.prod(spec["shape"]))
+            arrays[name] = (
+                mapped[start : start + count * 8]
+                .view(spec["dtype"])
+                .reshape(spec["shape"])
+            )
+        return cls(header["regions"], arrays)
+
+
+def _artifact_is_current(path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    artifact_mtime = os.path.getmtime(path)
+    return all(
+        os.path.getmtime(os.path.join(PROFILE_DIR, source)) <= artifact_mtime
+        for source in PROFILE_SOURCES
+    )
+
+
+def compile_profiles(path: Optional[str] = None) -> RegionProfiles:
+    """Parse the CSV profiles and write them to the binary artifact at `path`."""
+    from operations.policy.utils.helper import make_nx_graph
+
+    profiles = RegionProfiles.from_graph(make_nx_graph())
+    profiles.save(path or PROFILE_ARTIFACT)
+    return profiles
+
+
+@lru_cache(maxsize=None)
+def load_profiles() -> RegionProfiles:
+    """Profiles for this process, loaded once and shared by every policy instance."""
+    start = time.perf_counter()
+    if _artifact_is_current(PROFILE_ARTIFACT):
+        profiles = RegionProfiles.load(PROFILE_ARTIFACT)
+    else:
+        from operations.policy.utils.helper import make_nx_graph
+
+        logger.warning(
+            f"{PROFILE_ARTIFACT} is missing or older than the CSV profiles, parsing the "
+            "CSVs instead; run `just compile-profiles` to build it"
+        )
+        profiles = RegionProfiles.from_graph(make_nx_graph())
+    logger.info(f"Loaded region profiles in {time.perf_counter() - start:.3f}s")
+    return profiles
+
+
+@lru_cache(maxsize=None)
+def load_profile_graph(num_vms: int = 1) -> nx.DiGraph:
+    """Shared read-only graph view of `load_profiles()`."""
+    return load_profiles().to_graph(num_vms)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    compiled = compile_profiles()
+    print(
+        f"Compiled {len(compiled.regions)} regions into {PROFILE_ARTIFACT} "
+        f"in {time.perf_counter() - start:.3f}s"
+    )
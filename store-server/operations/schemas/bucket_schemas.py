@@ -6,6 +6,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
 )
@@ -16,6 +17,8 @@ from operations.utils.conf import Base, Status, Configuration
 
 class DBLogicalBucket(Base):
     __tablename__ = "logical_buckets"
+    # Bucket names are unique; logical_objects.bucket references this column
+    __table_args__ = (Index("ux_logical_buckets_bucket", "bucket", unique=True),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     bucket = Column(String)
@@ -36,6 +39,18 @@ class DBLogicalBucket(Base):
 
 class DBPhysicalBucketLocator(Base):
     __tablename__ = "physical_bucket_locators"
+    __table_args__ = (
+        Index(
+            "ix_physical_bucket_locators_logical_bucket_id_location_tag",
+            "logical_bucket_id",
+            "location_tag",
+        ),
+        Index(
+            "ix_physical_bucket_locators_lock_acquired_ts_status",
+            "lock_acquired_ts",
+            "status",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -62,7 +77,13 @@ class DBPhysicalBucketLocator(Base):
 
     # Add explicit relationship to DBPhysicalObjectLocator
     physical_object_locators = relationship(
-        "DBPhysicalObjectLocator", back_populates="physical_bucket"
+        "DBPhysicalObjectLocator",
+        back_populates="physical_bucket",
+        primaryjoin=(
+            "and_(DBPhysicalBucketLocator.bucket==foreign(DBPhysicalObjectLocator.bucket), "
+            "DBPhysicalBucketLocator.location_tag==foreign(DBPhysicalObjectLocator.location_tag))"
+        ),
+        viewonly=True,
     )
 
 
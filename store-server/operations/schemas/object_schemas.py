@@ -5,6 +5,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
 )
@@ -17,6 +18,12 @@ from typing import Dict, List, Literal, Optional
 
 class DBLogicalObject(Base):
     __tablename__ = "logical_objects"
+    __table_args__ = (
+        # locate_object / head_object / start_upload / continue_upload / list_objects
+        Index("ix_logical_objects_bucket_key_status", "bucket", "key", "status"),
+        # rm_lock_on_timeout scans for pending objects
+        Index("ix_logical_objects_status", "status"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -36,6 +43,8 @@ class DBLogicalObject(Base):
         "DBLogicalMultipartUploadPart",
         back_populates="logical_object",
         cascade="all, delete, delete-orphan",
+        # Upserts rewrite rows in place, so storage order is not upload order
+        order_by="DBLogicalMultipartUploadPart.part_number",
     )
 
     # Add relationship to physical object
@@ -46,6 +55,18 @@ class DBLogicalObject(Base):
 
 class DBPhysicalObjectLocator(Base):
     __tablename__ = "physical_object_locators"
+    __table_args__ = (
+        Index(
+            "ix_physical_object_locators_logical_object_id_location_tag",
+            "logical_object_id",
+            "location_tag",
+        ),
+        Index(
+            "ix_physical_object_locators_lock_acquired_ts_status",
+            "lock_acquired_ts",
+            "status",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -53,17 +74,18 @@ class DBPhysicalObjectLocator(Base):
     cloud = Column(String)
     region = Column(String)
 
-    bucket = Column(
-        String, ForeignKey("physical_bucket_locators.bucket")
-    )  # added ForeignKey
+    # Physical bucket names are shared across logical buckets, so this cannot be a real
+    # foreign key; the relationship joins on (bucket, location_tag) instead.
+    bucket = Column(String)
 
     physical_bucket = relationship(
         "DBPhysicalBucketLocator",
         back_populates="physical_object_locators",
         primaryjoin=(
-            "and_(DBPhysicalObjectLocator.bucket==DBPhysicalBucketLocator.bucket, "
-            "DBPhysicalObjectLocator.location_tag==DBPhysicalBucketLocator.location_tag)"
+            "and_(foreign(DBPhysicalObjectLocator.bucket)==DBPhysicalBucketLocator.bucket, "
+            "foreign(DBPhysicalObjectLocator.location_tag)==DBPhysicalBucketLocator.location_tag)"
         ),
+        viewonly=True,
     )
 
     key = Column(String)
@@ -76,6 +98,8 @@ class DBPhysicalObjectLocator(Base):
         "DBPhysicalMultipartUploadPart",
         back_populates="physical_object_locator",
         cascade="all, delete, delete-orphan",
+        # Upserts rewrite rows in place, so storage order is not upload order
+        order_by="DBPhysicalMultipartUploadPart.part_number",
     )
 
     # Add relationship to logical object
@@ -108,8 +132,27 @@ class LocateObjectResponse(BaseModel):
     multipart_upload_id: Optional[str] = None
 
 
+class LocateObjectsRequest(BaseModel):
+    bucket: str
+    keys: List[str]
+    client_from_region: str
+
+
+class LocateObjectsResponse(BaseModel):
+    # key -> chosen locator, or None if the object is not found
+    locators: Dict[str, Optional[LocateObjectResponse]]
+
+
 class DBLogicalMultipartUploadPart(Base):
     __tablename__ = "logical_multipart_upload_parts"
+    __table_args__ = (
+        Index(
+            "ix_logical_multipart_upload_parts_logical_object_id_part_number",
+            "logical_object_id",
+            "part_number",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     logical_object_id = Column(
@@ -126,6 +169,14 @@ class DBLogicalMultipartUploadPart(Base):
 
 class DBPhysicalMultipartUploadPart(Base):
     __tablename__ = "physical_multipart_upload_parts"
+    __table_args__ = (
+        Index(
+            "ix_physical_multipart_upload_parts_locator_id_part_number",
+            "physical_object_locator_id",
+            "part_number",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     physical_object_locator_id = Column(
@@ -179,6 +230,11 @@ class PatchUploadIsCompleted(BaseModel):
     policy: Optional[str] = "push"
 
 
+class PatchUploadsIsCompleted(BaseModel):
+    # Completes every copy of an upload, or several uploads, in one call and transaction
+    uploads: List[PatchUploadIsCompleted]
+
+
 class PatchUploadMultipartUploadId(BaseModel):
     # This is called when the CreateMultipartUpload operation finishes
     id: int
@@ -193,6 +249,11 @@ class PatchUploadMultipartUploadPart(BaseModel):
     size: NonNegativeInt = Field(..., minimum=0, format="int64")
 
 
+class PatchUploadMultipartUploadParts(BaseModel):
+    # Completed UploadPart operations, flushed by the proxy in batches
+    parts: List[PatchUploadMultipartUploadPart]
+
+
 class ContinueUploadRequest(LocateObjectRequest):
     multipart_upload_id: str
 
@@ -221,6 +282,8 @@ class ListObjectRequest(BaseModel):
     prefix: Optional[str] = None
     start_after: Optional[str] = None
     max_keys: Optional[int] = None
+    # Returned as next_continuation_token by /list_objects_v2; takes precedence over start_after
+    continuation_token: Optional[str] = None
 
 
 class ObjectResponse(BaseModel):
@@ -231,6 +294,12 @@ class ObjectResponse(BaseModel):
     last_modified: datetime
 
 
+class ListObjectsV2Response(BaseModel):
+    objects: List[ObjectResponse]
+    is_truncated: bool
+    next_continuation_token: Optional[str] = None
+
+
 class ObjectStatus(BaseModel):
     status: Status
 
@@ -260,6 +329,10 @@ class ListPartsRequest(BaseModel):
     upload_id: str
 
     part_number: Optional[int] = None
+    # S3 part-number-marker / max-parts: list parts numbered above the marker, at most
+    # max_parts of them
+    part_number_marker: Optional[int] = None
+    max_parts: Optional[int] = None
 
 
 class LogicalPartResponse(BaseModel):
@@ -269,6 +342,13 @@ class LogicalPartResponse(BaseModel):
     size: NonNegativeInt = Field(..., minimum=0, format="int64")
 
 
+class ListPartsResponse(BaseModel):
+    parts: List[LogicalPartResponse]
+    is_truncated: bool
+    # Pass as part_number_marker to fetch the next page
+    next_part_number_marker: Optional[int] = None
+
+
 class HealthcheckResponse(BaseModel):
     status: Literal["OK"]
 
@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+import os
+import time
+
+from operations.utils.lease import WORKERS
+from operations.utils.metrics import callback
+
+
+class ObjectMetadataCache:
+    """Bounded LRU cache with a per-entry TTL for object metadata lookups.
+
+    Keys are tuples whose first two elements are (bucket, key), so all entries for an
+    object can be dropped at once when a write changes it. Per-bucket entries are keyed
+    (bucket,) and dropped with `invalidate(bucket)`. A maxsize of 0 disables caching.
+
+    Writers invalidate after they commit. Readers capture `epoch` before querying and pass
+    it to `put`, so a result read before a concurrent invalidation is never cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._by_object: Dict[Tuple, Set[Tuple]] = {}
+        self.epoch = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, cache_key: Tuple) -> Optional[Any]:
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._remove(cache_key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(cache_key)
+        self.hits += 1
+        return value
+
+    def put(self, cache_key: Tuple, value: Any, epoch: int) -> None:
+        if self.maxsize <= 0 or epoch != self.epoch:
+            return
+
+        self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(cache_key)
+        self._by_object.setdefault(cache_key[:2], set()).add(cache_key)
+
+        while len(self._entries) > self.maxsize:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate(self, bucket: str, key: Optional[str] = None) -> None:
+        """Drop every cached entry for the object, or the bucket's entry without a key."""
+        self.epoch += 1
+        group = (bucket,) if key is None else (bucket, key)
+        for cache_key in self._by_object.pop(group, ()):
+            self._entries.pop(cache_key, None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self.epoch += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_object.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, cache_key: Tuple) -> None:
+        self._entries.pop(cache_key, None)
+        object_keys = self._by_object.get(cache_key[:2])
+        if object_keys is not None:
+            object_keys.discard(cache_key)
+            if not object_keys:
+                del self._by_object[cache_key[:2]]
+
+
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "100000"))
+METADATA_CACHE_TTL_SECONDS = float(os.getenv("METADATA_CACHE_TTL_SECONDS", "30"))
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "2"))
+if WORKERS > 1:
+    # A write handled by one worker cannot invalidate the caches of the others
+    METADATA_CACHE_SIZE = 0
+
+# (bucket, key, client_from_region) -> LocateObjectResponse
+locate_cache = ObjectMetadataCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL_SECONDS)
+# (bucket, key) -> HeadObjectResponse
+head_cache = ObjectMetadataCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL_SECONDS)
+# (bucket, key, lookup, ...) -> True for lookups that found no object. Short-lived, so
+# probes for missing keys skip the database while the object cannot appear unnoticed.
+negative_cache = ObjectMetadataCache(METADATA_CACHE_SIZE, NEGATIVE_CACHE_TTL_SECONDS)
+# (bucket,) -> {region tag: PhysicalLocation} for the bucket's physical bucket locators.
+# Only the bucket operations change these, and they invalidate the entry when they do.
+bucket_topology_cache = ObjectMetadataCache(
+    METADATA_CACHE_SIZE, METADATA_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_object(bucket: str, key: str) -> None:
+    locate_cache.invalidate(bucket, key)
+    head_cache.invalidate(bucket, key)
+    negative_cache.invalidate(bucket, key)
+
+
+def clear_object_caches() -> None:
+    locate_cache.clear()
+    head_cache.clear()
+    negative_cache.clear()
+
+
+def invalidate_bucket(bucket: str) -> None:
+    bucket_topology_cache.invalidate(bucket)
+
+
+def _cache_stat(name: str):
+    def read() -> Dict:
+        return {
+            ("locate",): locate_cache.stats()[name],
+            ("head",): head_cache.stats()[name],
+            ("negative",): negative_cache.stats()[name],
+            ("bucket_topology",): bucket_topology_cache.stats()[name],
+        }
+
+    return read
+
+
+def _hit_ratio() -> Dict:
+    ratios = {}
+    for label, cache in (
+        ("locate", locate_cache),
+        ("head", head_cache),
+        ("negative", negative_cache),
+        ("bucket_topology", bucket_topology_cache),
+    ):
+        lookups = cache.hits + cache.misses
+        ratios[(label,)] = cache.hits / lookups if lookups else 0.0
+    return ratios
+
+
+for _name, _type in [
+    ("hits", "counter"),
+    ("misses", "counter"),
+    ("evictions", "counter"),
+    ("invalidations", "counter"),
+    ("size", "gauge"),
+]:
+    callback(
+        f"skystore_cache_{_name}" + ("_total" if _type == "counter" else ""),
+        f"Metadata cache {_name}",
+        _type,
+        _cache_stat(_name),
+        ("cache",),
+    )
+callback(
+    "skystore_cache_hit_ratio",
+    "Metadata cache hits per lookup since startup",
+    "gauge",
+    _hit_ratio,
+    ("cache",),
+)
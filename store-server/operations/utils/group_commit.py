@@ -0,0 +1,150 @@
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+import asyncio
+import contextvars
+import os
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from operations.utils.db import (
+    DB_URL,
+    async_session,
+    logger,
+    use_sqlite_performance_profile,
+)
+from operations.utils.metrics import counter, histogram
+
+T = TypeVar("T")
+WriteFn = Callable[[AsyncSession], Awaitable[T]]
+
+# Group commit: queue the writes of concurrent requests and apply them together in one
+# transaction, so a burst of small writes pays for one commit (one fsync on SQLite)
+GROUP_COMMIT = os.getenv("SKYSTORE_GROUP_COMMIT", "false").lower() in ("1", "true")
+# Longest a write waits for others to join its batch
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("SKYSTORE_GROUP_COMMIT_MAX_DELAY_MS", "2"))
+# A batch is committed as soon as it holds this many writes
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("SKYSTORE_GROUP_COMMIT_MAX_BATCH", "64"))
+
+batch_size = histogram(
+    "skystore_group_commit_batch_size",
+    "Writes applied per group commit transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+batch_seconds = histogram(
+    "skystore_group_commit_seconds",
+    "Time to apply and commit a group commit batch",
+)
+queue_wait_seconds = histogram(
+    "skystore_group_commit_queue_wait_seconds",
+    "Time a write waited in the queue before its batch started",
+)
+failed_batches = counter(
+    "skystore_group_commit_failed_batches_total",
+    "Group commit batches whose commit failed, failing every write in them",
+)
+
+
+class GroupCommitter:
+    """Applies queued writes in shared transactions.
+
+    Each write runs in its own savepoint, so a write that raises is rolled back and fails
+    alone while the rest of its batch commits. Callers are acknowledged only once their
+    batch has committed. Batches are committed one at a time.
+    """
+
+    def __init__(self, session_maker, max_delay: float, max_batch: int) -> None:
+        self.session_maker = session_maker
+        self.max_delay = max_delay
+        self.max_batch = max(max_batch, 1)
+        self._queue: List[Tuple[WriteFn, asyncio.Future, float]] = []
+        self._full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, write: WriteFn[T]) -> T:
+        """Queue `write` and return its result once its batch commits."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((write, future, time.perf_counter()))
+        if self._worker is None or self._worker.done():
+            self._full = asyncio.Event()
+            # A fresh context, so the batch's SQL is not billed to whichever request
+            # happened to start the worker
+            self._worker = asyncio.create_task(
+                self._run(), context=contextvars.Context()
+            )
+        if len(self._queue) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _run(self) -> None:
+        while self._queue:
+            if len(self._queue) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._queue[: self.max_batch]
+            del self._queue[: self.max_batch]
+            if len(self._queue) < self.max_batch:
+                self._full.clear()
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[WriteFn, asyncio.Future, float]]):
+        start = time.perf_counter()
+        results = []
+        try:
+            async with self.session_maker() as db:
+                for write, _, queued_at in batch:
+                    queue_wait_seconds.observe(start - queued_at)
+                    try:
+                        async with db.begin_nested():
+                            results.append((True, await write(db)))
+                    except Exception as e:
+                        results.append((False, e))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} writes failed: {e}")
+            failed_batches.inc()
+            results = [(False, e)] * len(batch)
+        batch_size.observe(len(batch))
+        batch_seconds.observe(time.perf_counter() - start)
+
+        for (_, future, _), (ok, result) in zip(batch, results):
+            # The caller may have gone away, e.g. a client disconnect cancelled it
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+
+if (
+    GROUP_COMMIT
+    and DB_URL.get_backend_name() == "sqlite"
+    and not use_sqlite_performance_profile
+):
+    # Without a single serialized writer connection, a batch holding the write lock
+    # deadlocks with requests that read and then write on their own connections
+    logger.warning(
+        "Group commit needs SKYSTORE_SQLITE_PROFILE=performance on SQLite, disabling it"
+    )
+    GROUP_COMMIT = False
+
+group_committer = (
+    GroupCommitter(
+        async_session, GROUP_COMMIT_MAX_DELAY_MS / 1000, GROUP_COMMIT_MAX_BATCH
+    )
+    if GROUP_COMMIT
+    else None
+)
+
+
+async def commit_write(db: AsyncSession, write: WriteFn[T]) -> T:
+    """Apply `write` and commit it: in the request's session, or batched with concurrent
+    writes when group commit is enabled. Writes validate before changing anything and
+    return an error response instead of raising, so a rejected write changes nothing."""
+    if group_committer is not None:
+        return await group_committer.submit(write)
+    result = await write(db)
+    await db.commit()
+    return result
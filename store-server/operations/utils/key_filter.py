@@ -0,0 +1,273 @@
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import math
+import os
+import time
+
+from sqlalchemy import func, select
+
+from operations.schemas.object_schemas import DBLogicalObject
+from operations.utils.db import async_read_session, logger
+from operations.utils.lease import WORKERS
+from operations.utils.metrics import callback
+
+# Per-bucket Bloom filters of existing keys, so lookups of keys that were never written
+# are answered with a 404 without a query
+KEY_FILTER = os.getenv("SKYSTORE_KEY_FILTER", "false").lower() in ("1", "true")
+# Target false-positive rate of each bucket's filter
+KEY_FILTER_ERROR_RATE = float(os.getenv("SKYSTORE_KEY_FILTER_ERROR_RATE", "0.01"))
+# Keys a bucket's first filter is sized for when the bucket is empty or new
+KEY_FILTER_MIN_CAPACITY = 1024
+# Bloom filters cannot forget keys; a bucket's filter is rebuilt once this share of its
+# keys has been deleted
+KEY_FILTER_REBUILD_FRACTION = 0.25
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter sized for `capacity` items at `error_rate`."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(
+            math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8
+        )
+        self.num_hashes = max(round(self.num_bits / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, h1: int, h2: int):
+        # Double hashing: k positions from two independent 64-bit hashes
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, h1: int, h2: int) -> None:
+        for position in self._positions(h1, h2):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def contains(self, h1: int, h2: int) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(h1, h2)
+        )
+
+
+class ScalableBloomFilter:
+    """A chain of Bloom filters that grows as keys are added.
+
+    Each filter in the chain holds twice as many keys at half the error rate of the one
+    before it, so the combined false-positive rate stays below `error_rate`.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(capacity, error_rate / 2)]
+
+    @staticmethod
+    def _hashes(key: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(
+            digest[8:], "little"
+        )
+
+    def add(self, key: str) -> None:
+        h1, h2 = self._hashes(key)
+        if any(f.contains(h1, h2) for f in self.filters):
+            return
+        last = self.filters[-1]
+        if last.count >= last.capacity:
+            last = BloomFilter(
+                last.capacity * 2, self.error_rate / 2 ** (len(self.filters) + 1)
+            )
+            self.filters.append(last)
+        last.add(h1, h2)
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = self._hashes(key)
+        return any(f.contains(h1, h2) for f in self.filters)
+
+    @property
+    def count(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(f.bits) for f in self.filters)
+
+
+class KeyFilter:
+    """Per-bucket Bloom filters over the keys of every logical object, whatever its status.
+
+    Keys are added once the transaction creating their logical object commits, since the
+    lock-timeout sweeper can mark a pending object ready without any request, and again
+    when an upload completes. A key missing from its bucket's filter was never created, so
+    lookups for it can 404 without a query. Deleted keys stay in the filter as false
+    positives until the bucket's filter is rebuilt from the database.
+
+    Filters only see writes made by this process, so they require a single worker.
+    """
+
+    def __init__(self, error_rate: float = KEY_FILTER_ERROR_RATE) -> None:
+        self.error_rate = error_rate
+        self._buckets: Dict[str, ScalableBloomFilter] = {}
+        self._removed: Dict[str, int] = {}
+        # Keys added while a rebuild scans the database, replayed into the new filters
+        self._added_during_rebuild: Optional[List[Tuple[str, str]]] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Until the first build every key may exist
+        self.ready = False
+
+        self.rejected = 0
+        self.false_positives = 0
+
+    def may_contain(self, bucket: str, key: str) -> bool:
+        """False if the key was definitely never created in the bucket."""
+        if not self.ready:
+            return True
+        keys = self._buckets.get(bucket)
+        if keys is not None and key in keys:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_false_positive(self) -> None:
+        """Count a query the filter let through for a key that has no logical object."""
+        if self.ready:
+            self.false_positives += 1
+
+    def add(self, bucket: str, key: str) -> None:
+        if bucket not in self._buckets:
+            self._buckets[bucket] = ScalableBloomFilter(
+                KEY_FILTER_MIN_CAPACITY, self.error_rate
+            )
+        self._buckets[bucket].add(key)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append((bucket, key))
+
+    def removed(self, bucket: str, count: int) -> None:
+        """Note that `count` keys were deleted from the bucket, rebuilding its filter in the
+        background once enough of them are stale."""
+        self._removed[bucket] = self._removed.get(bucket, 0) + count
+        keys = self._buckets.get(bucket)
+        stale = self._removed[bucket]
+        if (
+            keys is not None
+            and stale >= keys.count * KEY_FILTER_REBUILD_FRACTION
+            and self._added_during_rebuild is None
+        ):
+            task = asyncio.create_task(self.rebuild(bucket))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def rebuild(self, bucket: Optional[str] = None) -> None:
+        """Rebuild the filter of `bucket`, or of every bucket, from the database."""
+        if self._added_during_rebuild is not None:
+            return
+        start = time.perf_counter()
+        self._added_during_rebuild = []
+        try:
+            buckets = await self._load(bucket)
+        except Exception as e:
+            logger.error(f"Rebuilding the key filter failed: {e}")
+            return
+        finally:
+            added, self._added_during_rebuild = self._added_during_rebuild, None
+
+        for added_bucket, key in added:
+            if bucket is None or added_bucket == bucket:
+                buckets.setdefault(
+                    added_bucket,
+                    ScalableBloomFilter(KEY_FILTER_MIN_CAPACITY, self.error_rate),
+                ).add(key)
+        if bucket is None:
+            self._buckets = buckets
+            self._removed.clear()
+            self.ready = True
+        else:
+            self._buckets.pop(bucket, None)
+            self._buckets.update(buckets)
+            self._removed.pop(bucket, None)
+
+        logger.info(
+            f"Built the key filter for {sum(f.count for f in buckets.values())} keys "
+            f"in {len(buckets)} buckets in {time.perf_counter() - start:.3f}s"
+        )
+
+    async def _load(self, bucket: Optional[str]) -> Dict[str, ScalableBloomFilter]:
+        counts_stmt = select(DBLogicalObject.bucket, func.count()).group_by(
+            DBLogicalObject.bucket
+        )
+        keys_stmt = select(DBLogicalObject.bucket, DBLogicalObject.key)
+        if bucket is not None:
+            counts_stmt = counts_stmt.where(DBLogicalObject.bucket == bucket)
+            keys_stmt = keys_stmt.where(DBLogicalObject.bucket == bucket)
+
+        async with async_read_session() as db:
+            # Size each filter for its bucket up front, so it is one filter and not a chain
+            buckets = {
+                name: ScalableBloomFilter(
+                    max(int(count * 1.25), KEY_FILTER_MIN_CAPACITY), self.error_rate
+                )
+                for name, count in await db.execute(counts_stmt)
+            }
+            result = await db.stream(keys_stmt.execution_options(yield_per=10000))
+            async for name, key in result:
+                keys = buckets.get(name)
+                if keys is None:
+                    # The bucket gained its first keys between the two queries
+                    keys = buckets[name] = ScalableBloomFilter(
+                        KEY_FILTER_MIN_CAPACITY, self.error_rate
+                    )
+                keys.add(key)
+        return buckets
+
+    def stats(self) -> Dict[str, float]:
+        lookups_without_object = self.rejected + self.false_positives
+        return {
+            "bytes": sum(f.nbytes for f in self._buckets.values()),
+            "keys": sum(f.count for f in self._buckets.values()),
+            "buckets": len(self._buckets),
+            "rejected": self.rejected,
+            "false_positives": self.false_positives,
+            # Share of lookups for missing objects that the filter could not rule out
+            "false_positive_ratio": (
+                self.false_positives / lookups_without_object
+                if lookups_without_object
+                else 0.0
+            ),
+        }
+
+
+if KEY_FILTER and WORKERS > 1:
+    # Keys created by other workers would be missing from this worker's filters
+    logger.warning("The key filter needs a single worker, disabling it")
+    KEY_FILTER = False
+
+key_filter = KeyFilter() if KEY_FILTER else None
+
+
+def _key_filter_stat(name: str):
+    return lambda: {(): key_filter.stats()[name]} if key_filter is not None else {}
+
+
+for _name, _type, _help in [
+    ("bytes", "gauge", "Memory used by the key filters"),
+    ("keys", "gauge", "Keys in the key filters"),
+    ("rejected", "counter", "Lookups answered as missing by the key filter"),
+    (
+        "false_positives",
+        "counter",
+        "Queries the key filter let through for keys without an object",
+    ),
+    (
+        "false_positive_ratio",
+        "gauge",
+        "Share of lookups for missing objects the key filter let through",
+    ),
+]:
+    callback(
+        f"skystore_key_filter_{_name}" + ("_total" if _type == "counter" else ""),
+        _help,
+        _type,
+        _key_filter_stat(_name),
+    )
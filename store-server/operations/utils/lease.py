@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import os
+import socket
+import uuid
+
+from sqlalchemy import Column, DateTime, String, delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from operations.utils.conf import Base
+from operations.utils.db import engine, logger
+
+# Worker processes serving the API. With more than one, per-process state (the metadata
+# caches) is disabled and background maintenance runs in the worker holding its lease.
+WORKERS = int(os.getenv("SKYSTORE_WORKERS", "1"))
+
+# Identifies this process as a lease holder
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class DBLease(Base):
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class Lease:
+    """A named lease row in the metadata database, held by at most one process at a time.
+
+    The holder keeps it by calling `acquire` again before `ttl` runs out. Once it lapses,
+    e.g. because the holder died, the next process to call `acquire` takes it over.
+    """
+
+    def __init__(self, name: str, ttl: timedelta, holder: str = WORKER_ID) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder
+        self.held = False
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; returns whether this process holds it."""
+        now = datetime.utcnow()
+        values = dict(holder=self.holder, expires_at=now + self.ttl)
+        async with engine.begin() as db:
+            renewed = await db.execute(
+                update(DBLease)
+                .where(
+                    DBLease.name == self.name,
+                    or_(DBLease.holder == self.holder, DBLease.expires_at < now),
+                )
+                .values(**values)
+            )
+        held = renewed.rowcount > 0
+        if not held:
+            try:
+                async with engine.begin() as db:
+                    await db.execute(insert(DBLease).values(name=self.name, **values))
+                held = True
+            except IntegrityError:
+                # Another process holds the lease, or created it first
+                held = False
+
+        if held != self.held:
+            action = "Acquired" if held else "Lost"
+            logger.info(f"{action} the {self.name} lease as {self.holder}")
+        self.held = held
+        return held
+
+    async def release(self) -> None:
+        """Give up the lease so another process can take it over without waiting."""
+        if not self.held:
+            return
+        async with engine.begin() as db:
+            await db.execute(
+                delete(DBLease).where(
+                    DBLease.name == self.name, DBLease.holder == self.holder
+                )
+            )
+        self.held = False
@@ -0,0 +1,450 @@
+"""
+Prometheus metrics, rendered in the text exposition format by `/metrics`.
+
+Metrics are kept per process. Modules create their metrics at import time with `counter`,
+`gauge`, `histogram` or, for values they already track, `callback`, which is evaluated
+when the metrics are rendered.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+import math
+import os
+import re
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger("skystore")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Debug mode: report each request's SQL statement count, repeated statements and SQL time
+# in x-skystore-sql-* response headers, and log statements repeated at least
+# SKYSTORE_SQL_REPEAT_WARN_COUNT times within one request
+SQL_DEBUG = os.getenv("SKYSTORE_SQL_DEBUG", "false").lower() in ("1", "true")
+SQL_REPEAT_WARN_COUNT = int(os.getenv("SKYSTORE_SQL_REPEAT_WARN_COUNT", "3"))
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], LabelValues, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labelnames, labelvalues, value in self.samples():
+            lines.append(
+                f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *labelvalues: str) -> None:
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        return [
+            (self.name, self.labelnames, labels, value)
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        self.values[labelvalues] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        entry = self.values.get(labelvalues)
+        if entry is None:
+            entry = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        samples = []
+        labelnames = self.labelnames + ("le",)
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        labelnames,
+                        labels + (_format_value(bound),),
+                        cumulative,
+                    )
+                )
+            samples.append((f"{self.name}_sum", self.labelnames, labels, total))
+            samples.append((f"{self.name}_count", self.labelnames, labels, count))
+        return samples
+
+
+class Callback(Metric):
+    """A counter or gauge whose samples are read from `fn` when rendered."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        type: str,
+        fn: Callable[[], Dict[LabelValues, float]],
+        labelnames: Tuple[str, ...] = (),
+    ):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def samples(self):
+        return [
+            (self.name, self.labelnames, labels, value)
+            for labels, value in self.fn().items()
+        ]
+
+
+REGISTRY: Dict[str, Metric] = {}
+
+
+def _register(metric: Metric) -> Metric:
+    if metric.name in REGISTRY:
+        raise ValueError(f"Metric {metric.name} is already registered")
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return _register(Gauge(name, help, labelnames))
+
+
+def histogram(
+    name: str,
+    help: str,
+    labelnames: Tuple[str, ...] = (),
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+def callback(
+    name: str,
+    help: str,
+    type: str,
+    fn: Callable[[], Dict[LabelValues, float]],
+    labelnames: Tuple[str, ...] = (),
+) -> Callback:
+    return _register(Callback(name, help, type, fn, labelnames))
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP requests
+
+http_requests = histogram(
+    "skystore_http_request_duration_seconds",
+    "Time to serve a request, by route template and status",
+    ("method", "route", "status"),
+)
+http_in_flight = gauge(
+    "skystore_http_requests_in_flight",
+    "Requests being served",
+    ("method", "route"),
+)
+request_sql_statements = histogram(
+    "skystore_http_request_sql_statements",
+    "SQL statements executed per request",
+    ("method", "route"),
+    buckets=STATEMENT_COUNT_BUCKETS,
+)
+request_sql_seconds = histogram(
+    "skystore_http_request_sql_seconds",
+    "Time spent executing SQL per request",
+    ("method", "route"),
+)
+
+
+request_sql_repeated = counter(
+    "skystore_http_request_sql_repeated_statements_total",
+    "Executions of a statement shape already executed in the same request",
+    ("method", "route"),
+)
+
+# A bound parameter: SQLite's ?, or Postgres' $n with the ::TYPE cast asyncpg adds, e.g.
+# $1::VARCHAR or $2::TIMESTAMP WITHOUT TIME ZONE
+_PLACEHOLDER = (
+    r"(?:\?|\$\d+)(?:::\w+(?:\([\d, ]+\))?(?: WITH(?:OUT)? TIME ZONE)?(?:\[\])*)?"
+)
+_PLACEHOLDER_LIST = re.compile(rf"{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with whitespace and placeholder lists collapsed, so executions that
+    differ only in their parameters or IN-list lengths share a shape."""
+    return _PLACEHOLDER_LIST.sub("?, ...", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestStats:
+    """Database work done on behalf of the current request."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # statement shape -> executions
+        self.shapes: Dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.statements += 1
+        self.sql_seconds += elapsed
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def repeated(self, min_count: int = 2) -> Dict[str, int]:
+        """Shapes executed at least `min_count` times, the signature of N+1 queries."""
+        return {shape: n for shape, n in self.shapes.items() if n >= min_count}
+
+    @property
+    def repeated_statements(self) -> int:
+        return sum(n - 1 for n in self.shapes.values())
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "skystore_current_request", default=None
+)
+
+
+@contextmanager
+def capture_statements() -> Iterator[RequestStats]:
+    """Collect the statements executed inside the block, e.g. to hold a handler to a
+    statement budget in tests. Statements inside the block are not counted for the
+    enclosing request."""
+    stats = RequestStats()
+    token = current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        current_request.reset(token)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    # Unmatched paths are not used as labels so that clients cannot grow the label set
+    return path if path is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and SQL work per route."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._routes: Optional[Dict[str, str]] = None
+
+    def _in_flight_route(self, scope) -> str:
+        # Routing has not happened yet; every route in this server is a static path
+        if self._routes is None:
+            app = scope["app"]
+            paths = set(app.openapi()["paths"])
+            paths.update(route.path for route in app.routes if hasattr(route, "path"))
+            self._routes = {path: path for path in paths}
+        return self._routes.get(scope["path"], "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        in_flight_route = self._in_flight_route(scope)
+        http_in_flight.inc(1, method, in_flight_route)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SQL_DEBUG:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-skystore-sql-statements", str(stats.statements).encode()),
+                        (
+                            b"x-skystore-sql-repeated",
+                            str(stats.repeated_statements).encode(),
+                        ),
+                        (
+                            b"x-skystore-sql-ms",
+                            f"{stats.sql_seconds * 1e3:.3f}".encode(),
+                        ),
+                    ]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            current_request.reset(token)
+            http_in_flight.inc(-1, method, in_flight_route)
+            route = _route_label(scope)
+            http_requests.observe(duration, method, route, str(status))
+            request_sql_statements.observe(stats.statements, method, route)
+            request_sql_seconds.observe(stats.sql_seconds, method, route)
+            if stats.repeated_statements:
+                request_sql_repeated.inc(stats.repeated_statements, method, route)
+                if SQL_DEBUG:
+                    for shape, count in stats.repeated(SQL_REPEAT_WARN_COUNT).items():
+                        logger.warning(
+                            f"{method} {route} executed the same statement {count} "
+                            f"times, possible N+1 query: {shape}"
+                        )
+
+
+# Database
+
+sql_statements = counter(
+    "skystore_db_statements_total", "SQL statements executed", ("engine",)
+)
+sql_seconds = counter(
+    "skystore_db_statement_seconds_total",
+    "Time spent executing SQL statements",
+    ("engine",),
+)
+pool_checkout_seconds = histogram(
+    "skystore_db_pool_checkout_seconds",
+    "Time to check a connection out of the pool, including waiting for one",
+    ("engine",),
+)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count statements and time them, globally and for the current request."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("skystore_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["skystore_query_start"].pop()
+        sql_statements.inc(1, name)
+        sql_seconds.inc(elapsed, name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("skystore_query_start"):
+            conn.info["skystore_query_start"].pop()
+
+
+class TimedCheckoutPool:
+    """Pool mixin observing how long `connect()` takes, i.e. checkout wait plus connect.
+
+    Mixed into the engine's pool class; `metrics_engine_name` is set by the subclass."""
+
+    metrics_engine_name = "default"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            pool_checkout_seconds.observe(
+                time.perf_counter() - start, self.metrics_engine_name
+            )
+
+
+def timed_pool_class(pool_class, name: str):
+    return type(
+        f"Timed{pool_class.__name__}",
+        (TimedCheckoutPool, pool_class),
+        {"metrics_engine_name": name},
+    )
@@ -0,0 +1,187 @@
+from datetime import datetime
+import asyncio
+from typing import Callable, List, Tuple
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    select,
+    func,
+    text,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from operations.utils.conf import Base
+from operations.utils.db import engine, logger
+from operations.utils.lease import DBLease
+
+# Import the schemas so that every table is registered on Base.metadata
+from operations.schemas.object_schemas import DBLogicalObject
+from operations.schemas.bucket_schemas import DBLogicalBucket  # noqa: F401
+
+
+class DBSchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String)
+    applied_at = Column(DateTime)
+
+
+def _index(name: str, table: str, *columns: str, unique: bool = False) -> Index:
+    """An index on a stand-in table outside Base.metadata. Migrations spell out the indexes
+    they create, so changing a model's indexes never changes a migration that shipped.
+    """
+    stand_in = Table(table, MetaData(), *(Column(column) for column in columns))
+    return Index(name, *(stand_in.c[column] for column in columns), unique=unique)
+
+
+def _add_access_path_indexes(conn: Connection) -> None:
+    for index in (
+        _index(
+            "ix_logical_buckets_bucket_status", "logical_buckets", "bucket", "status"
+        ),
+        _index(
+            "ix_physical_bucket_locators_logical_bucket_id_location_tag",
+            "physical_bucket_locators",
+            "logical_bucket_id",
+            "location_tag",
+        ),
+        _index(
+            "ix_physical_bucket_locators_lock_acquired_ts_status",
+            "physical_bucket_locators",
+            "lock_acquired_ts",
+            "status",
+        ),
+        _index(
+            "ix_logical_objects_bucket_key_status",
+            "logical_objects",
+            "bucket",
+            "key",
+            "status",
+        ),
+        _index("ix_logical_objects_status", "logical_objects", "status"),
+        _index(
+            "ix_physical_object_locators_logical_object_id_location_tag",
+            "physical_object_locators",
+            "logical_object_id",
+            "location_tag",
+        ),
+        _index(
+            "ix_physical_object_locators_lock_acquired_ts_status",
+            "physical_object_locators",
+            "lock_acquired_ts",
+            "status",
+        ),
+        _index(
+            "ix_logical_multipart_upload_parts_logical_object_id_part_number",
+            "logical_multipart_upload_parts",
+            "logical_object_id",
+            "part_number",
+        ),
+        _index(
+            "ix_physical_multipart_upload_parts_locator_id_part_number",
+            "physical_multipart_upload_parts",
+            "physical_object_locator_id",
+            "part_number",
+        ),
+    ):
+        index.create(conn, checkfirst=True)
+
+
+def _unique_logical_bucket_names(conn: Connection) -> None:
+    # Postgres requires a unique index on the target of logical_objects.bucket
+    conn.execute(text("DROP INDEX IF EXISTS ix_logical_buckets_bucket_status"))
+    _index(
+        "ux_logical_buckets_bucket", "logical_buckets", "bucket", unique=True
+    ).create(conn, checkfirst=True)
+
+
+def _add_leases(conn: Connection) -> None:
+    DBLease.__table__.create(conn, checkfirst=True)
+
+
+def _unique_multipart_part_numbers(conn: Connection) -> None:
+    # append_part upserts on (object or locator, part_number); keep the latest row of any
+    # duplicates concurrent appends left behind
+    for index_name, table, owner in (
+        (
+            "ix_logical_multipart_upload_parts_logical_object_id_part_number",
+            "logical_multipart_upload_parts",
+            "logical_object_id",
+        ),
+        (
+            "ix_physical_multipart_upload_parts_locator_id_part_number",
+            "physical_multipart_upload_parts",
+            "physical_object_locator_id",
+        ),
+    ):
+        conn.execute(
+            text(
+                f"DELETE FROM {table} WHERE id NOT IN "
+                f"(SELECT MAX(id) FROM {table} GROUP BY {owner}, part_number)"
+            )
+        )
+        conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        _index(index_name, table, owner, "part_number", unique=True).create(conn)
+
+
+# Ordered list of (version, description, upgrade). Append new migrations at the end and
+# never edit or reorder the ones that have shipped.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add access path indexes", _add_access_path_indexes),
+    (2, "make logical bucket names unique", _unique_logical_bucket_names),
+    (3, "add background task leases", _add_leases),
+    (4, "make multipart part numbers unique", _unique_multipart_part_numbers),
+]
+
+
+def _record(conn: Connection, version: int, description: str) -> None:
+    conn.execute(
+        DBSchemaMigration.__table__.insert().values(
+            version=version, description=description, applied_at=datetime.utcnow()
+        )
+    )
+
+
+def _migrate(conn: Connection) -> None:
+    is_new_database = not inspect(conn).has_table(DBLogicalObject.__tablename__)
+    DBSchemaMigration.__table__.create(conn, checkfirst=True)
+
+    if is_new_database:
+        # A fresh database gets the current schema directly and is stamped with every migration.
+        Base.metadata.create_all(conn)
+        for version, description, _ in MIGRATIONS:
+            _record(conn, version, description)
+        logger.info(f"Created metadata schema at version {MIGRATIONS[-1][0]}")
+        return
+
+    # Databases created before versioning was introduced have no rows and start at version 0.
+    current_version = conn.scalar(select(func.max(DBSchemaMigration.version))) or 0
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current_version:
+            continue
+        logger.info(f"Applying schema migration {version}: {description}")
+        upgrade(conn)
+        _record(conn, version, description)
+
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    """Bring the metadata database up to the latest schema version."""
+    await conn.run_sync(_migrate)
+
+
+async def _main() -> None:
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    # Multi-worker deployments migrate once up front instead of racing in every worker
+    asyncio.run(_main())
@@ -0,0 +1,42 @@
+import base64
+import json
+from typing import Optional
+
+# Largest page served by the paginated listing endpoints, as in S3
+MAX_PAGE_SIZE = 1000
+
+_MAX_CODE_POINT = 0x10FFFF
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with `prefix`, so that
+    `startswith(prefix)` becomes the index-friendly range `prefix <= key < bound`.
+
+    Keys are compared by code point (UTF-8 byte order), which is SQLite's default and
+    Postgres' "C" collation. Returns None when no upper bound is needed.
+    """
+    stripped = prefix.rstrip(chr(_MAX_CODE_POINT))
+    if not stripped:
+        return None
+    last = ord(stripped[-1]) + 1
+    # Skip the surrogate range, which cannot be encoded as UTF-8
+    if 0xD800 <= last <= 0xDFFF:
+        last = 0xE000
+    return stripped[:-1] + chr(last)
+
+
+def encode_continuation_token(last_key: str) -> str:
+    """Opaque token that resumes a listing after `last_key`."""
+    payload = json.dumps({"after": last_key}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_continuation_token(token: str) -> str:
+    """Key to resume after. Raises ValueError for tokens not issued by this server."""
+    try:
+        after = json.loads(base64.urlsafe_b64decode(token.encode()))["after"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid continuation token") from e
+    if not isinstance(after, str):
+        raise ValueError("Invalid continuation token")
+    return after
@@ -0,0 +1,74 @@
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+import os
+
+from operations.utils.metrics import counter
+
+T = TypeVar("T")
+
+# Concurrent identical lookups share one query instead of each running their own
+SINGLE_FLIGHT = os.getenv("SKYSTORE_SINGLE_FLIGHT", "true").lower() in ("1", "true")
+
+coalesced_requests = counter(
+    "skystore_single_flight_coalesced_total",
+    "Lookups answered by joining an identical lookup already in flight",
+    ("lookup",),
+)
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls with the same key.
+
+    The first caller for a key runs the lookup; callers arriving while it is in flight wait
+    for it and receive the same result, or the same exception. If the first caller is
+    cancelled, e.g. because its client disconnected, the next waiter runs the lookup itself.
+
+    Keys must change whenever a write could change the result, e.g. by including a cache
+    epoch, so a request arriving after a write never joins a lookup that started before it.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, lookup: Callable[[], Awaitable[T]]) -> T:
+        while SINGLE_FLIGHT:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            try:
+                # Shielded so a waiter's cancellation does not cancel the shared lookup
+                result = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # The caller running the lookup went away; take over
+                continue
+            coalesced_requests.inc(1, self.name)
+            return result
+
+        if not SINGLE_FLIGHT:
+            return await lookup()
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await lookup()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so a lookup nobody joined is not
+            # reported as an unretrieved exception
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+
+locate_flights = SingleFlight("locate")
+head_flights = SingleFlight("head")
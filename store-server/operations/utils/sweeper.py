@@ -0,0 +1,158 @@
+from datetime import datetime
+from typing import Dict, Optional
+import os
+import time
+
+from sqlalchemy import and_, exists, select, update
+
+from operations.schemas.bucket_schemas import DBLogicalBucket, DBPhysicalBucketLocator
+from operations.schemas.object_schemas import DBLogicalObject, DBPhysicalObjectLocator
+from operations.utils.cache import clear_object_caches
+from operations.utils.conf import Status
+from operations.utils.db import engine, logger
+from operations.utils.metrics import callback, histogram
+
+# Rows updated per transaction, so a large backlog never holds the write lock for long
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "1000"))
+
+
+class SweepStats:
+    """Rows touched and time spent by the lock-timeout sweeper."""
+
+    def __init__(self) -> None:
+        self.sweeps = 0
+        self.batches = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration_seconds = 0.0
+        self.total_duration_seconds = 0.0
+        self.last_rows: Dict[str, int] = {}
+        self.total_rows: Dict[str, int] = {}
+
+    def record(self, started_at: datetime, duration: float, rows: Dict[str, int]):
+        sweep_duration.observe(duration)
+        self.sweeps += 1
+        self.last_started_at = started_at
+        self.last_duration_seconds = duration
+        self.total_duration_seconds += duration
+        self.last_rows = dict(rows)
+        for name, count in rows.items():
+            self.total_rows[name] = self.total_rows.get(name, 0) + count
+
+    def stats(self) -> Dict:
+        return {
+            "sweeps": self.sweeps,
+            "batches": self.batches,
+            "last_started_at": self.last_started_at,
+            "last_duration_seconds": self.last_duration_seconds,
+            "total_duration_seconds": self.total_duration_seconds,
+            "last_rows": dict(self.last_rows),
+            "total_rows": dict(self.total_rows),
+        }
+
+
+sweep_duration = histogram(
+    "skystore_sweeper_duration_seconds", "Duration of lock-timeout sweeps"
+)
+sweep_stats = SweepStats()
+
+callback(
+    "skystore_sweeper_batches_total",
+    "Update batches run by the lock-timeout sweeper",
+    "counter",
+    lambda: {(): sweep_stats.batches},
+)
+callback(
+    "skystore_sweeper_rows_total",
+    "Rows changed by the lock-timeout sweeper",
+    "counter",
+    lambda: {(table,): rows for table, rows in sweep_stats.total_rows.items()},
+    ("table",),
+)
+callback(
+    "skystore_sweeper_last_rows",
+    "Rows changed by the last lock-timeout sweep",
+    "gauge",
+    lambda: {(table,): rows for table, rows in sweep_stats.last_rows.items()},
+    ("table",),
+)
+callback(
+    "skystore_sweeper_last_duration_seconds",
+    "Duration of the last lock-timeout sweep",
+    "gauge",
+    lambda: {(): sweep_stats.last_duration_seconds},
+)
+
+
+async def _update_in_batches(model, where, values, batch_size: int) -> int:
+    """Apply `values` to rows matching `where`, at most `batch_size` rows per transaction."""
+    batch_ids = select(model.id).where(where).limit(batch_size)
+    stmt = update(model).where(model.id.in_(batch_ids)).values(**values)
+
+    touched = 0
+    while True:
+        async with engine.begin() as db:
+            rowcount = (await db.execute(stmt)).rowcount
+        sweep_stats.batches += 1
+        touched += rowcount
+        # Updated rows stop matching `where`, so a short batch means the backlog is drained
+        if rowcount < batch_size:
+            return touched
+
+
+async def sweep_timed_out_locks(
+    cutoff_time: datetime, batch_size: int = SWEEP_BATCH_SIZE
+) -> Dict[str, int]:
+    """Release locks acquired at or before `cutoff_time` and mark logical objects and
+    buckets whose physical locators are all ready as ready."""
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+    rows = {}
+
+    unlock = dict(status=Status.ready, lock_acquired_ts=None)
+    rows["physical_object_locators"] = await _update_in_batches(
+        DBPhysicalObjectLocator,
+        DBPhysicalObjectLocator.lock_acquired_ts <= cutoff_time,
+        unlock,
+        batch_size,
+    )
+    rows["physical_bucket_locators"] = await _update_in_batches(
+        DBPhysicalBucketLocator,
+        DBPhysicalBucketLocator.lock_acquired_ts <= cutoff_time,
+        unlock,
+        batch_size,
+    )
+
+    rows["logical_objects"] = await _update_in_batches(
+        DBLogicalObject,
+        and_(
+            DBLogicalObject.status == Status.pending,
+            ~exists().where(
+                DBPhysicalObjectLocator.logical_object_id == DBLogicalObject.id,
+                DBPhysicalObjectLocator.status != Status.ready,
+            ),
+        ),
+        dict(status=Status.ready),
+        batch_size,
+    )
+    rows["logical_buckets"] = await _update_in_batches(
+        DBLogicalBucket,
+        and_(
+            DBLogicalBucket.status == Status.pending,
+            ~exists().where(
+                DBPhysicalBucketLocator.logical_bucket_id == DBLogicalBucket.id,
+                DBPhysicalBucketLocator.status != Status.ready,
+            ),
+        ),
+        dict(status=Status.ready),
+        batch_size,
+    )
+
+    if rows["physical_object_locators"] or rows["logical_objects"]:
+        # Timed-out locks flip locators to ready, which can change the locate_object answer
+        clear_object_caches()
+
+    duration = time.perf_counter() - start
+    sweep_stats.record(started_at, duration, rows)
+    if any(rows.values()):
+        logger.info(f"Lock timeout sweep took {duration:.3f}s: {rows}")
+    return rows
@@ -1,6 +1,48 @@
+from datetime import datetime, timedelta
+import asyncio
+import httpx
 import pytest
+from fastapi import FastAPI
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from starlette.testclient import TestClient
 from app import app, rm_lock_on_timeout
+from benchmark.load import SCENARIOS, LoadTest
+from operations.bucket_operations import init_region_tags
+from operations.utils.cache import bucket_topology_cache, locate_cache
+from operations.utils.conf import Base, Status
+from operations import object_operations
+from operations.object_operations import locate_object
+from operations.schemas.object_schemas import (
+    DBLogicalObject,
+    DBPhysicalObjectLocator,
+    LocateObjectRequest,
+)
+from operations.utils import metrics
+from operations.utils import group_commit, key_filter
+from operations.utils.db import (
+    SQLITE_BUSY_TIMEOUT_MS,
+    async_read_session,
+    async_session,
+    create_engine_from_env,
+    engine,
+    get_read_session,
+    use_explicit_transactions,
+)
+from operations.utils.group_commit import GroupCommitter
+from operations.utils.key_filter import KeyFilter, ScalableBloomFilter
+from operations.utils.lease import DBLease, Lease
+from operations.utils.single_flight import SingleFlight, coalesced_requests
+from operations.utils.metrics import (
+    MetricsMiddleware,
+    capture_statements,
+    statement_shape,
+)
+from operations.utils.migrations import MIGRATIONS, run_migrations
+from operations.utils.sweeper import sweep_stats, sweep_timed_out_locks
 
 
 @pytest.fixture
@@ -92,6 +134,160 @@ def test_delete_object(client):
     assert resp.json() == []
 
 
+def test_delete_objects_batch(client):
+    """Deleting many keys is all-or-nothing and removes the logical objects once all copies are gone."""
+    resp = client.post(
+        "/start_create_bucket",
+        json={
+            "bucket": "my-delete-objects-bucket",
+            "client_from_region": "aws:us-west-1",
+            "warmup_regions": ["gcp:us-west1"],
+        },
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    keys = [f"my-key-{i}" for i in range(5)]
+    for key in keys:
+        resp = client.post(
+            "/start_upload",
+            json={
+                "bucket": "my-delete-objects-bucket",
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+                "is_multipart": False,
+                "policy": "push",
+            },
+        )
+        resp.raise_for_status()
+        for locator in resp.json()["locators"]:
+            client.patch(
+                "/complete_upload",
+                json={
+                    "id": locator["id"],
+                    "size": 100,
+                    "etag": "123",
+                    "last_modified": "2020-01-01T00:00:00",
+                },
+            ).raise_for_status()
+
+    # One missing key fails the whole request without marking anything
+    resp = client.post(
+        "/start_delete_objects",
+        json={"bucket": "my-delete-objects-bucket", "keys": keys + ["missing-key"]},
+    )
+    assert resp.status_code == 404
+    assert "missing-key" in resp.text
+
+    resp = client.post(
+        "/start_delete_objects",
+        json={"bucket": "my-delete-objects-bucket", "keys": keys},
+    )
+    resp.raise_for_status()
+    locators = resp.json()["locators"]
+    assert set(locators) == set(keys)
+    assert all(len(physical_objects) == 2 for physical_objects in locators.values())
+
+    ids = [obj["id"] for objs in locators.values() for obj in objs]
+    client.patch("/complete_delete_objects", json={"ids": ids}).raise_for_status()
+
+    for key in keys:
+        resp = client.post(
+            "/locate_object_status",
+            json={
+                "bucket": "my-delete-objects-bucket",
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+            },
+        )
+        assert resp.status_code == 404
+
+    # The locators are gone, so completing again is a 404
+    resp = client.patch("/complete_delete_objects", json={"ids": ids[:1]})
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_delete_objects_beyond_parameter_limit(client):
+    """Batches with more keys than SQLite binds in one statement are deleted in chunks."""
+    resp = client.post(
+        "/start_create_bucket",
+        json={
+            "bucket": "my-large-delete-bucket",
+            "client_from_region": "aws:us-west-1",
+        },
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+        if physical_bucket["tag"] == "aws:us-west-1":
+            primary = physical_bucket
+
+    # Bulk insert the objects, uploading 1200 keys through the API would be slow
+    keys = [f"my-key-{i}" for i in range(1200)]
+    async with engine.begin() as conn:
+        ids = (
+            await conn.execute(
+                insert(DBLogicalObject).returning(
+                    DBLogicalObject.id, sort_by_parameter_order=True
+                ),
+                [
+                    dict(
+                        bucket="my-large-delete-bucket",
+                        key=key,
+                        size=100,
+                        last_modified=datetime(2020, 1, 1),
+                        etag="123",
+                        status=Status.ready,
+                    )
+                    for key in keys
+                ],
+            )
+        ).scalars()
+        await conn.execute(
+            insert(DBPhysicalObjectLocator),
+            [
+                dict(
+                    logical_object_id=id,
+                    location_tag=primary["tag"],
+                    cloud=primary["cloud"],
+                    region=primary["region"],
+                    bucket=primary["bucket"],
+                    key=key,
+                    status=Status.ready,
+                    is_primary=True,
+                )
+                for id, key in zip(ids, keys)
+            ],
+        )
+
+    resp = client.post(
+        "/start_delete_objects",
+        json={"bucket": "my-large-delete-bucket", "keys": keys},
+    )
+    resp.raise_for_status()
+    locators = resp.json()["locators"]
+    assert set(locators) == set(keys)
+
+    ids = [obj["id"] for objs in locators.values() for obj in objs]
+    client.patch("/complete_delete_objects", json={"ids": ids}).raise_for_status()
+
+    async with async_session() as db:
+        remaining = await db.scalar(
+            select(func.count())
+            .select_from(DBLogicalObject)
+            .where(DBLogicalObject.bucket == "my-large-delete-bucket")
+        )
+    assert remaining == 0
+
+
 def test_create_bucket(client):
     """Test that the `create_bucket` endpoint works."""
     resp = client.post(
@@ -732,6 +928,99 @@ def test_list_objects(client):
     ]
 
 
+def test_list_objects_v2(client):
+    """Pages follow continuation tokens, and prefixes match case-sensitively by range."""
+    resp = client.post(
+        "/start_create_bucket",
+        json={"bucket": "my-list-v2-bucket", "client_from_region": "aws:us-west-1"},
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    keys = ["a/1", "a/2", "a/3", "a/4", "a/5", "a0", "A/1", "b/1"]
+    for key in keys:
+        resp = client.post(
+            "/start_upload",
+            json={
+                "bucket": "my-list-v2-bucket",
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+                "is_multipart": False,
+                "policy": "push",
+            },
+        )
+        resp.raise_for_status()
+        for locator in resp.json()["locators"]:
+            client.patch(
+                "/complete_upload",
+                json={
+                    "id": locator["id"],
+                    "size": 100,
+                    "etag": "123",
+                    "last_modified": "2020-01-01T00:00:00",
+                },
+            ).raise_for_status()
+
+    listed = []
+    request = {"bucket": "my-list-v2-bucket", "prefix": "a/", "max_keys": 2}
+    while True:
+        resp = client.post("/list_objects_v2", json=request)
+        resp.raise_for_status()
+        page = resp.json()
+        assert len(page["objects"]) <= 2
+        listed += [obj["key"] for obj in page["objects"]]
+        if not page["is_truncated"]:
+            assert page["next_continuation_token"] is None
+            break
+        request["continuation_token"] = page["next_continuation_token"]
+    assert listed == ["a/1", "a/2", "a/3", "a/4", "a/5"]
+
+    # Without max_keys the whole bucket fits in one page, in key order
+    resp = client.post("/list_objects_v2", json={"bucket": "my-list-v2-bucket"})
+    assert [obj["key"] for obj in resp.json()["objects"]] == sorted(keys)
+    assert resp.json()["is_truncated"] is False
+
+    # An empty page is not truncated, so a paging client stops
+    resp = client.post(
+        "/list_objects_v2", json={"bucket": "my-list-v2-bucket", "max_keys": 0}
+    )
+    assert resp.json() == {
+        "objects": [],
+        "is_truncated": False,
+        "next_continuation_token": None,
+    }
+
+    # The existing endpoint accepts the same tokens
+    request = {"bucket": "my-list-v2-bucket", "prefix": "a/", "max_keys": 3}
+    token = client.post("/list_objects_v2", json=request).json()[
+        "next_continuation_token"
+    ]
+    resp = client.post(
+        "/list_objects",
+        json={
+            "bucket": "my-list-v2-bucket",
+            "prefix": "a/",
+            "continuation_token": token,
+        },
+    )
+    assert [obj["key"] for obj in resp.json()] == ["a/4", "a/5"]
+
+    resp = client.post(
+        "/list_objects",
+        json={"bucket": "my-list-v2-bucket", "continuation_token": "not-a-token"},
+    )
+    assert resp.status_code == 400
+
+    resp = client.post(
+        "/list_multipart_uploads", json={"bucket": "my-list-v2-bucket", "prefix": "a/"}
+    )
+    assert resp.json() == []
+
+
 def test_multipart_flow(client):
     """Test the a workflow for multipart upload works."""
 
@@ -847,6 +1136,28 @@ def test_multipart_flow(client):
         }
     ]
 
+    # A retried UploadPart replaces the part instead of adding a second one
+    for locator in resp_data:
+        client.patch(
+            "/append_part",
+            json={
+                "id": locator["id"],
+                "part_number": 1,
+                "etag": "456",
+                "size": 200,
+            },
+        ).raise_for_status()
+    resp = client.post(
+        "/list_parts",
+        json={
+            "bucket": "my-multipart-bucket",
+            "key": "my-key-multipart",
+            "upload_id": multipart_upload_id,
+        },
+    )
+    resp.raise_for_status()
+    assert resp.json() == [{"part_number": 1, "etag": "456", "size": 200}]
+
     # Simulate CompleteMultipartUpload. We want to "sealed" it.
     for locator in resp_data:
         client.patch(
@@ -873,6 +1184,175 @@ def test_multipart_flow(client):
     assert resp_data["region"] == "us-west-1"
 
 
+def test_append_parts(client):
+    """Parts for several locators are recorded in one call; the primary's are mirrored."""
+    bucket = {"bucket": "my-append-parts-bucket"}
+    resp = client.post(
+        "/start_create_bucket",
+        json={
+            **bucket,
+            "client_from_region": "aws:us-west-1",
+            "warmup_regions": ["gcp:us-west1"],
+        },
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    upload = {**bucket, "key": "my-key", "client_from_region": "aws:us-west-1"}
+    resp = client.post(
+        "/start_upload",
+        json={
+            **upload,
+            "is_multipart": True,
+            "policy": "push",
+            "warmup_regions": ["gcp:us-west1"],
+        },
+    )
+    resp.raise_for_status()
+    upload_id = resp.json()["multipart_upload_id"]
+    locators = resp.json()["locators"]
+    assert len(locators) == 2
+    for locator in locators:
+        client.patch(
+            "/set_multipart_id",
+            json={"id": locator["id"], "multipart_upload_id": locator["tag"]},
+        ).raise_for_status()
+
+    # The bucket's primary region is the one it was created from
+    primary = next(locator for locator in locators if locator["tag"] == "aws:us-west-1")
+    parts = [
+        {"id": locator["id"], "part_number": n, "etag": f"etag-{n}", "size": 5}
+        for locator in locators
+        for n in (2, 1, 3)
+    ]
+    # A part reported twice in a batch keeps its last report
+    parts.append({"id": primary["id"], "part_number": 2, "etag": "retry", "size": 6})
+    client.patch("/append_parts", json={"parts": parts}).raise_for_status()
+
+    resp = client.post(
+        "/list_parts", json={**bucket, "key": "my-key", "upload_id": upload_id}
+    )
+    resp.raise_for_status()
+    assert [(p["part_number"], p["etag"], p["size"]) for p in resp.json()] == [
+        (1, "etag-1", 5),
+        (2, "retry", 6),
+        (3, "etag-3", 5),
+    ]
+
+    resp = client.post(
+        "/continue_upload",
+        json={**upload, "multipart_upload_id": upload_id, "do_list_parts": True},
+    )
+    resp.raise_for_status()
+    for locator in resp.json():
+        etags = {p["part_number"]: p["etag"] for p in locator["parts"]}
+        retried = locator["id"] == primary["id"]
+        assert etags == {1: "etag-1", 2: "retry" if retried else "etag-2", 3: "etag-3"}
+
+    # An unknown locator fails the whole batch
+    resp = client.patch(
+        "/append_parts",
+        json={
+            "parts": [
+                {"id": locators[0]["id"], "part_number": 4, "etag": "e", "size": 1},
+                {"id": 987654321, "part_number": 4, "etag": "e", "size": 1},
+            ]
+        },
+    )
+    assert resp.status_code == 404
+    resp = client.post(
+        "/list_parts", json={**bucket, "key": "my-key", "upload_id": upload_id}
+    )
+    assert [p["part_number"] for p in resp.json()] == [1, 2, 3]
+
+    # Batches larger than one statement's bound parameters are split across upserts
+    parts = [
+        {"id": primary["id"], "part_number": n, "etag": f"bulk-{n}", "size": n}
+        for n in range(1, 1001)
+    ]
+    client.patch("/append_parts", json={"parts": parts}).raise_for_status()
+    resp = client.post(
+        "/list_parts", json={**bucket, "key": "my-key", "upload_id": upload_id}
+    )
+    assert [(p["part_number"], p["etag"]) for p in resp.json()] == [
+        (n, f"bulk-{n}") for n in range(1, 1001)
+    ]
+
+
+def test_list_parts_pagination(client):
+    """ListParts pages through an upload with part-number-marker / max-parts."""
+    bucket = {"bucket": "my-list-parts-bucket"}
+    resp = client.post(
+        "/start_create_bucket", json={**bucket, "client_from_region": "aws:us-west-1"}
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+    resp = client.post(
+        "/start_upload",
+        json={
+            **bucket,
+            "key": "my-key",
+            "client_from_region": "aws:us-west-1",
+            "is_multipart": True,
+        },
+    )
+    resp.raise_for_status()
+    upload_id = resp.json()["multipart_upload_id"]
+    locator_id = resp.json()["locators"][0]["id"]
+    client.patch(
+        "/append_parts",
+        json={
+            "parts": [
+                {"id": locator_id, "part_number": n, "etag": f"etag-{n}", "size": n}
+                for n in range(25, 0, -1)
+            ]
+        },
+    ).raise_for_status()
+
+    upload = {**bucket, "key": "my-key", "upload_id": upload_id}
+    pages, marker = [], None
+    while True:
+        resp = client.post(
+            "/list_parts_v2",
+            json={**upload, "max_parts": 10, "part_number_marker": marker},
+        )
+        resp.raise_for_status()
+        page = resp.json()
+        pages.append([part["part_number"] for part in page["parts"]])
+        if not page["is_truncated"]:
+            assert page["next_part_number_marker"] is None
+            break
+        marker = page["next_part_number_marker"]
+    assert pages == [list(range(1, 11)), list(range(11, 21)), list(range(21, 26))]
+    resp = client.post("/list_parts_v2", json={**upload, "max_parts": 0})
+    assert resp.json() == {
+        "parts": [],
+        "is_truncated": False,
+        "next_part_number_marker": None,
+    }
+
+    resp = client.post(
+        "/list_parts", json={**upload, "part_number_marker": 20, "max_parts": 3}
+    )
+    resp.raise_for_status()
+    assert resp.json() == [
+        {"part_number": n, "etag": f"etag-{n}", "size": n} for n in (21, 22, 23)
+    ]
+    resp = client.post("/list_parts", json={**upload, "part_number": 7})
+    assert resp.json() == [{"part_number": 7, "etag": "etag-7", "size": 7}]
+
+    resp = client.post("/list_parts_v2", json={**upload, "upload_id": "missing"})
+    assert resp.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_metadata_clean_up(client):
     """Test that the background process in `complete_create_bucket` endpoint functions correctly."""
@@ -922,3 +1402,1072 @@ async def test_metadata_clean_up(client):
     )
     # rm_lock_on_timeout should have reset all locks. So search should return 'ready'
     assert resp.json()["status"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_sweep_timed_out_locks_in_batches(client):
+    """The sweeper only releases expired locks, drains backlogs in batches and records stats."""
+    resp = client.post(
+        "/start_create_bucket",
+        json={"bucket": "my-sweep-bucket", "client_from_region": "aws:us-west-1"},
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    keys = [f"sweep-key-{i}" for i in range(5)]
+    for key in keys:
+        client.post(
+            "/start_upload",
+            json={
+                "bucket": "my-sweep-bucket",
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+                "is_multipart": False,
+            },
+        ).raise_for_status()
+
+    def statuses():
+        return [
+            client.post(
+                "/locate_object_status",
+                json={
+                    "bucket": "my-sweep-bucket",
+                    "key": key,
+                    "client_from_region": "aws:us-west-1",
+                },
+            ).json()["status"]
+            for key in keys
+        ]
+
+    # Locks acquired just now have not timed out yet
+    rows = await sweep_timed_out_locks(datetime.utcnow() - timedelta(minutes=10))
+    assert rows["physical_object_locators"] == 0
+    assert rows["logical_objects"] == 0
+    assert statuses() == ["pending"] * len(keys)
+
+    batches_before = sweep_stats.batches
+    rows = await sweep_timed_out_locks(datetime.utcnow(), batch_size=2)
+    assert rows["physical_object_locators"] == len(keys)
+    assert rows["logical_objects"] == len(keys)
+    assert statuses() == ["ready"] * len(keys)
+    # 5 rows in batches of 2 take 3 batches for each of the two object tables
+    assert sweep_stats.batches - batches_before >= 6
+    assert sweep_stats.last_rows == rows
+    assert sweep_stats.last_duration_seconds > 0
+
+
+def test_locate_object_cache(client):
+    """Repeated lookups are served from the cache, and writes to the object invalidate it."""
+    resp = client.post(
+        "/start_create_bucket",
+        json={"bucket": "my-cache-bucket", "client_from_region": "aws:us-west-1"},
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    resp = client.post(
+        "/start_upload",
+        json={
+            "bucket": "my-cache-bucket",
+            "key": "my-key",
+            "client_from_region": "aws:us-west-1",
+            "is_multipart": False,
+            "policy": "push",
+        },
+    )
+    resp.raise_for_status()
+    for locator in resp.json()["locators"]:
+        client.patch(
+            "/complete_upload",
+            json={
+                "id": locator["id"],
+                "size": 100,
+                "etag": "123",
+                "last_modified": "2020-01-01T00:00:00",
+            },
+        ).raise_for_status()
+
+    locate_request = {
+        "bucket": "my-cache-bucket",
+        "key": "my-key",
+        "client_from_region": "aws:us-east-1",
+    }
+    hits = locate_cache.hits
+    first = client.post("/locate_object", json=locate_request).json()
+    second = client.post("/locate_object", json=locate_request).json()
+    assert first == second
+    assert first["tag"] == "aws:us-west-1"
+    assert locate_cache.hits == hits + 1
+
+    # Pull the object into the client's region; the cached fallback must be dropped
+    resp = client.post(
+        "/start_upload",
+        json={
+            "bucket": "my-cache-bucket",
+            "key": "my-key",
+            "client_from_region": "aws:us-east-1",
+            "is_multipart": False,
+        },
+    )
+    resp.raise_for_status()
+    for locator in resp.json()["locators"]:
+        client.patch(
+            "/complete_upload",
+            json={
+                "id": locator["id"],
+                "size": 100,
+                "etag": "123",
+                "last_modified": "2020-01-01T00:00:00",
+            },
+        ).raise_for_status()
+    resp = client.post("/locate_object", json=locate_request)
+    assert resp.json()["tag"] == "aws:us-east-1"
+
+    client.post(
+        "/start_delete_objects", json={"bucket": "my-cache-bucket", "keys": ["my-key"]}
+    ).raise_for_status()
+    assert client.post("/locate_object", json=locate_request).status_code == 404
+
+
+def test_locate_objects(client):
+    """The batch endpoint resolves many keys at once with the same choice as locate_object."""
+    resp = client.post(
+        "/start_create_bucket",
+        json={
+            "bucket": "my-batch-locate-bucket",
+            "client_from_region": "aws:us-west-1",
+            "warmup_regions": ["gcp:us-west1"],
+        },
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    keys = ["layer-1", "layer-2", "layer-3"]
+    for key in keys:
+        resp = client.post(
+            "/start_upload",
+            json={
+                "bucket": "my-batch-locate-bucket",
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+                "is_multipart": False,
+                "policy": "push",
+            },
+        )
+        resp.raise_for_status()
+        for locator in resp.json()["locators"]:
+            client.patch(
+                "/complete_upload",
+                json={
+                    "id": locator["id"],
+                    "size": 100,
+                    "etag": key,
+                    "last_modified": "2020-01-01T00:00:00",
+                },
+            ).raise_for_status()
+
+    for region in ["aws:us-west-1", "gcp:us-west1", "aws:eu-central-1"]:
+        single = client.post(
+            "/locate_object",
+            json={
+                "bucket": "my-batch-locate-bucket",
+                "key": "layer-2",
+                "client_from_region": region,
+            },
+        ).json()
+        resp = client.post(
+            "/locate_objects",
+            json={
+                "bucket": "my-batch-locate-bucket",
+                "keys": keys + ["missing-layer"],
+                "client_from_region": region,
+            },
+        )
+        resp.raise_for_status()
+        locators = resp.json()["locators"]
+        assert locators["missing-layer"] is None
+        assert locators["layer-2"] == single
+        assert [locators[key]["etag"] for key in keys] == keys
+
+    # More keys than SQLite binds in one statement are resolved in chunks
+    locate_cache.clear()
+    many_keys = [f"missing-layer-{i}" for i in range(1200)] + keys
+    resp = client.post(
+        "/locate_objects",
+        json={
+            "bucket": "my-batch-locate-bucket",
+            "keys": many_keys,
+            "client_from_region": "aws:us-west-1",
+        },
+    )
+    resp.raise_for_status()
+    locators = resp.json()["locators"]
+    assert len(locators) == len(many_keys)
+    assert sum(locator is not None for locator in locators.values()) == len(keys)
+    assert [locators[key]["etag"] for key in keys] == keys
+
+
+@pytest.mark.asyncio
+async def test_single_flight(client):
+    """Concurrent identical lookups share one query."""
+    flights = SingleFlight("test")
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = []
+
+    async def lookup(value):
+        calls.append(value)
+        started.set()
+        await release.wait()
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    async def burst(value, n=5):
+        started.clear()
+        release.clear()
+        tasks = [
+            asyncio.create_task(flights.do("key", lambda: lookup(value)))
+            for _ in range(n)
+        ]
+        await started.wait()
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert await burst("value") == ["value"] * 5
+    error = ValueError("lookup failed")
+    assert await burst(error) == [error] * 5
+    assert len(calls) == 2
+
+    # If the caller running the lookup goes away, a waiter runs it instead
+    started.clear()
+    release.clear()
+    leader = asyncio.create_task(flights.do("key", lambda: lookup("leader")))
+    await started.wait()
+    follower = asyncio.create_task(flights.do("key", lambda: lookup("follower")))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+    assert await follower == "follower"
+
+    # Through the API, a burst of lookups for one key runs far fewer queries
+    bucket = {"bucket": "my-single-flight-bucket"}
+    resp = client.post(
+        "/start_create_bucket", json={**bucket, "client_from_region": "aws:us-west-1"}
+    )
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+    resp = client.post(
+        "/start_upload",
+        json={
+            **bucket,
+            "key": "hot-layer",
+            "client_from_region": "aws:us-west-1",
+            "is_multipart": False,
+        },
+    )
+    resp.raise_for_status()
+    for locator in resp.json()["locators"]:
+        client.patch(
+            "/complete_upload",
+            json={
+                "id": locator["id"],
+                "size": 100,
+                "etag": "123",
+                "last_modified": "2020-01-01T00:00:00",
+            },
+        ).raise_for_status()
+
+    coalesced = dict(coalesced_requests.values)
+    request = {**bucket, "key": "hot-layer", "client_from_region": "aws:us-west-1"}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://skystore"
+    ) as async_client:
+        responses = await asyncio.gather(
+            *[async_client.post("/locate_object", json=request) for _ in range(20)],
+            *[async_client.post("/head_object", json=request) for _ in range(20)],
+        )
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.text for response in responses[:20]}) == 1
+    assert len({response.text for response in responses[20:]}) == 1
+    for lookup_name in ("locate", "head"):
+        joined = coalesced_requests.values.get((lookup_name,), 0)
+        assert joined - coalesced.get((lookup_name,), 0) > 0
+
+
+@pytest.mark.asyncio
+async def test_key_filter(client, monkeypatch):
+    """Lookups of keys that were never created, or just found missing, skip the
+    database."""
+    bloom = ScalableBloomFilter(1000, 0.01)
+    for i in range(5000):
+        bloom.add(f"key-{i}")
+    assert len(bloom.filters) > 1
+    assert all(f"key-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+
+    filter = KeyFilter()
+    monkeypatch.setattr(object_operations, "key_filter", filter)
+    monkeypatch.setattr(key_filter, "key_filter", filter)
+    monkeypatch.setattr(metrics, "SQL_DEBUG", True)
+    bucket = {"bucket": "my-key-filter-bucket"}
+    region = {"client_from_region": "aws:us-west-1"}
+
+    def head(key, status, statements):
+        resp = client.post("/head_object", json={**bucket, "key": key})
+        assert resp.status_code == status
+        assert int(resp.headers["x-skystore-sql-statements"]) == statements
+
+    def upload(key):
+        resp = client.post(
+            "/start_upload",
+            json={**bucket, **region, "key": key, "is_multipart": False},
+        )
+        resp.raise_for_status()
+        return resp.json()["locators"]
+
+    def complete(locators):
+        for locator in locators:
+            client.patch(
+                "/complete_upload",
+                json={
+                    "id": locator["id"],
+                    "size": 100,
+                    "etag": "123",
+                    "last_modified": "2020-01-01T00:00:00",
+                },
+            ).raise_for_status()
+
+    resp = client.post("/start_create_bucket", json={**bucket, **region})
+    resp.raise_for_status()
+    for physical_bucket in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": physical_bucket["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+    complete(upload("present"))
+
+    # Until the filter is built from the database every key may exist
+    head("missing", 404, 1)
+    await filter.rebuild()
+    assert filter.may_contain(bucket["bucket"], "present")
+    head("missing", 404, 0)
+    head("never-written", 404, 0)
+    head("present", 200, 1)
+    resp = client.post(
+        "/locate_object", json={**bucket, **region, "key": "never-written"}
+    )
+    assert resp.status_code == 404
+    assert int(resp.headers["x-skystore-sql-statements"]) == 0
+
+    # A key being uploaded is rightly in the filter; its misses go to the negative cache
+    locators = upload("pending")
+    head("pending", 404, 2)
+    head("pending", 404, 0)
+    assert filter.false_positives == 0
+    # A key with no object that the filter lets through counts once, however many
+    # concurrent lookups share the query
+    filter.add(bucket["bucket"], "ghost")
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://skystore"
+    ) as async_client:
+        responses = await asyncio.gather(
+            *[
+                async_client.post("/head_object", json={**bucket, "key": "ghost"})
+                for _ in range(5)
+            ]
+        )
+    assert [resp.status_code for resp in responses] == [404] * 5
+    assert filter.false_positives == 1
+    # Completing an upload adds its key again, e.g. after a rebuild that read the table
+    # before the upload started
+    filter._buckets.pop(bucket["bucket"])
+    complete(locators)
+    assert filter.may_contain(bucket["bucket"], "pending")
+    head("pending", 200, 1)
+
+    # Deleting keys rebuilds the bucket's filter without them
+    resp = client.post("/start_delete_objects", json={**bucket, "keys": ["present"]})
+    resp.raise_for_status()
+    for physical_object in resp.json()["locators"]["present"]:
+        client.patch(
+            "/complete_delete_objects", json={"ids": [physical_object["id"]]}
+        ).raise_for_status()
+    for _ in range(100):
+        if not filter.may_contain(bucket["bucket"], "present"):
+            break
+        await asyncio.sleep(0.01)
+    assert not filter.may_contain(bucket["bucket"], "present")
+    assert filter.may_contain(bucket["bucket"], "pending")
+
+    stats = filter.stats()
+    assert stats["keys"] >= 1 and stats["bytes"] > 0
+    assert 0 < stats["false_positive_ratio"] < 1
+    resp = client.get("/metrics")
+    assert "skystore_key_filter_bytes " in resp.text
+    assert "skystore_key_filter_false_positive_ratio " in resp.text
+
+
+def test_complete_uploads(client, monkeypatch):
+    """All copies of a push upload are completed with one call and one transaction."""
+    monkeypatch.setattr(metrics, "SQL_DEBUG", True)
+    bucket = {"bucket": "my-complete-uploads-bucket"}
+    resp = client.post(
+        "/start_create_bucket",
+        json={
+            **bucket,
+            "client_from_region": "aws:us-west-1",
+            "warmup_regions": ["aws:us-east-1", "gcp:us-west1"],
+        },
+    )
+    resp.raise_for_status()
+    for locator in resp.json()["locators"]:
+        client.patch(
+            "/complete_create_bucket",
+            json={"id": locator["id"], "creation_date": "2020-01-01T00:00:00"},
+        ).raise_for_status()
+
+    def start_upload(key):
+        resp = client.post(
+            "/start_upload",
+            json={
+                **bucket,
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+                "is_multipart": False,
+                "policy": "push",
+            },
+        )
+        resp.raise_for_status()
+        return [locator["id"] for locator in resp.json()["locators"]]
+
+    def status(key):
+        return client.post(
+            "/locate_object_status",
+            json={**bucket, "key": key, "client_from_region": "aws:us-west-1"},
+        ).json()["status"]
+
+    completed = {"size": 42, "etag": "etag", "last_modified": "2020-01-01T00:00:00"}
+    ids = start_upload("my-key")
+    assert len(ids) == 3
+    resp = client.patch(
+        "/complete_uploads",
+        json={"uploads": [{"id": id, **completed, "policy": "push"} for id in ids]},
+    )
+    resp.raise_for_status()
+    # One read, then the locator and logical object updates
+    assert int(resp.headers["x-skystore-sql-statements"]) <= 3
+    assert status("my-key") == "ready"
+    resp = client.post("/head_object", json={**bucket, "key": "my-key"})
+    assert (resp.json()["size"], resp.json()["etag"]) == (42, "etag")
+    for region in ("aws:us-east-1", "gcp:us-west1"):
+        resp = client.post(
+            "/locate_object",
+            json={**bucket, "key": "my-key", "client_from_region": region},
+        )
+        assert resp.json()["tag"] == region
+
+    # An unknown locator fails the whole batch, which leaves the upload pending
+    ids = start_upload("my-other-key")
+    resp = client.patch(
+        "/complete_uploads",
+        json={
+            "uploads": [
+                {"id": id, **completed, "policy": "push"} for id in ids + [987654321]
+            ]
+        },
+    )
+    assert resp.status_code == 404
+    assert status("my-other-key") == "pending"
+
+
+def test_bucket_topology_cache(client):
+    """start_upload reads the bucket topology from the cache until a bucket operation
+    changes it."""
+    bucket = {"bucket": "my-topology-bucket"}
+
+    def create_bucket(warmup_regions):
+        resp = client.post(
+            "/start_create_bucket",
+            json={
+                **bucket,
+                "client_from_region": "aws:us-west-1",
+                "warmup_regions": warmup_regions,
+            },
+        )
+        resp.raise_for_status()
+        for locator in resp.json()["locators"]:
+            client.patch(
+                "/complete_create_bucket",
+                json={"id": locator["id"], "creation_date": "2020-01-01T00:00:00"},
+            ).raise_for_status()
+
+    def push_regions(key):
+        resp = client.post(
+            "/start_upload",
+            json={
+                **bucket,
+                "key": key,
+                "client_from_region": "aws:us-west-1",
+                "is_multipart": False,
+                "policy": "push",
+            },
+        )
+        resp.raise_for_status()
+        locators = resp.json()["locators"]
+        for locator in locators:
+            client.patch(
+                "/complete_upload",
+                json={
+                    "id": locator["id"],
+                    "size": 1,
+                    "etag": "e",
+                    "last_modified": "2020-01-01T00:00:00",
+                },
+            ).raise_for_status()
+        return sorted(locator["tag"] for locator in locators)
+
+    create_bucket(["aws:us-east-1"])
+    assert push_regions("key-1") == ["aws:us-east-1", "aws:us-west-1"]
+    hits = bucket_topology_cache.hits
+    assert push_regions("key-2") == ["aws:us-east-1", "aws:us-west-1"]
+    assert bucket_topology_cache.hits == hits + 1
+
+    # Deleting and recreating the bucket with other warmup regions drops the cached entry
+    resp = client.post(
+        "/start_delete_objects", json={**bucket, "keys": ["key-1", "key-2"]}
+    )
+    resp.raise_for_status()
+    ids = [locator["id"] for ls in resp.json()["locators"].values() for locator in ls]
+    client.patch("/complete_delete_objects", json={"ids": ids}).raise_for_status()
+    resp = client.post("/start_delete_bucket", json=bucket)
+    resp.raise_for_status()
+    for locator in resp.json()["locators"]:
+        client.patch(
+            "/complete_delete_bucket", json={"id": locator["id"]}
+        ).raise_for_status()
+
+    create_bucket(["gcp:us-west1"])
+    assert push_regions("key-3") == ["aws:us-west-1", "gcp:us-west1"]
+
+    resp = client.post(
+        "/start_upload",
+        json={
+            "bucket": "my-missing-bucket",
+            "key": "key",
+            "client_from_region": "aws:us-west-1",
+            "is_multipart": False,
+        },
+    )
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_migrations_upgrade_unversioned_database(tmp_path):
+    """A database created before versioning picks up the indexes added by later migrations."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("DROP TABLE schema_migrations"))
+        await conn.execute(text("DROP INDEX ix_logical_objects_bucket_key_status"))
+
+    # Run twice: the second run must be a no-op
+    for _ in range(2):
+        async with engine.begin() as conn:
+            await run_migrations(conn)
+
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).get_indexes("logical_objects")
+        )
+        versions = (
+            await conn.execute(text("SELECT version FROM schema_migrations"))
+        ).scalars()
+        assert "ix_logical_objects_bucket_key_status" in {i["name"] for i in indexes}
+        assert list(versions) == [version for version, _, _ in MIGRATIONS]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_migrations_dedupe_multipart_parts(tmp_path):
+    """Duplicate part numbers are collapsed to the latest row before the unique index is built."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+        await conn.execute(text("DELETE FROM schema_migrations WHERE version >= 4"))
+        await conn.execute(
+            text("DROP INDEX ix_physical_multipart_upload_parts_locator_id_part_number")
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO physical_multipart_upload_parts "
+                "(physical_object_locator_id, part_number, etag, size) VALUES "
+                "(1, 1, 'old', 1), (1, 1, 'new', 2), (1, 2, 'other', 3), (2, 1, 'x', 4)"
+            )
+        )
+
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+
+    async with engine.connect() as conn:
+        parts = await conn.execute(
+            text(
+                "SELECT physical_object_locator_id, part_number, etag "
+                "FROM physical_multipart_upload_parts ORDER BY 1, 2"
+            )
+        )
+        assert list(parts) == [(1, 1, "new"), (1, 2, "other"), (2, 1, "x")]
+        indexes = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).get_indexes(
+                "physical_multipart_upload_parts"
+            )
+        )
+        assert [i["unique"] for i in indexes] == [True]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_migrations_upgrade_baseline_with_duplicate_parts(tmp_path):
+    """A version-0 database with duplicate part numbers upgrades through every migration."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'baseline.db'}")
+    async with engine.begin() as conn:
+        # The baseline schema: today's tables without any index or later table
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("DROP TABLE schema_migrations"))
+        await conn.execute(text("DROP TABLE leases"))
+        index_names = await conn.run_sync(
+            lambda sync_conn: [
+                index["name"]
+                for table in inspect(sync_conn).get_table_names()
+                for index in inspect(sync_conn).get_indexes(table)
+            ]
+        )
+        for name in index_names:
+            await conn.execute(text(f"DROP INDEX {name}"))
+        await conn.execute(
+            text(
+                "INSERT INTO logical_multipart_upload_parts "
+                "(logical_object_id, part_number, etag, size) VALUES "
+                "(1, 1, 'old', 1), (1, 1, 'new', 2), (1, 2, 'other', 3)"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO physical_multipart_upload_parts "
+                "(physical_object_locator_id, part_number, etag, size) VALUES "
+                "(1, 1, 'old', 1), (1, 1, 'new', 2)"
+            )
+        )
+
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+
+    async with engine.connect() as conn:
+        for table, expected in [
+            ("logical_multipart_upload_parts", [(1, "new"), (2, "other")]),
+            ("physical_multipart_upload_parts", [(1, "new")]),
+        ]:
+            parts = await conn.execute(
+                text(f"SELECT part_number, etag FROM {table} ORDER BY 1")
+            )
+            assert list(parts) == expected
+            indexes = await conn.run_sync(
+                lambda sync_conn: inspect(sync_conn).get_indexes(table)
+            )
+            assert [i["unique"] for i in indexes] == [True]
+        versions = (
+            await conn.execute(text("SELECT version FROM schema_migrations"))
+        ).scalars()
+        assert list(versions) == [version for version, _, _ in MIGRATIONS]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_load_test_scenarios(client):
+    """Every load test scenario replays the proxy's request sequence without errors."""
+    load_test = LoadTest(
+        init_region_tags, buckets=2, objects=40, fanout=2, parts=2, delete_batch=10
+    )
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://skystore"
+    ) as async_client:
+        primaries = await load_test.create_buckets(async_client)
+        await load_test.populate(engine, primaries)
+        for scenario in SCENARIOS:
+            result = await load_test.run(async_client, scenario, 8, 4)
+            assert result["errors"] == 0, result.get("first_error")
+            assert result["count"] == 8
+            assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+
+
+@pytest.mark.asyncio
+async def test_metrics(client):
+    """/metrics reports per-route latency and SQL work, caches and the sweeper."""
+    client.post(
+        "/start_create_bucket",
+        json={"bucket": "my-metrics-bucket", "client_from_region": "aws:us-west-1"},
+    ).raise_for_status()
+    for _ in range(2):
+        client.post(
+            "/locate_object",
+            json={
+                "bucket": "my-metrics-bucket",
+                "key": "missing",
+                "client_from_region": "aws:us-west-1",
+            },
+        )
+    client.get("/no-such-route")
+    await rm_lock_on_timeout(0, test=True)
+
+    resp = client.get("/metrics")
+    resp.raise_for_status()
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in resp.text.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    def sample(name, **labels):
+        if labels:
+            name += "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+        return samples.get(name)
+
+    route = dict(method="POST", route="/start_create_bucket")
+    assert sample("skystore_http_request_duration_seconds_count", **route, status=200)
+    assert sample("skystore_http_request_sql_statements_sum", **route) >= 1
+    assert sample("skystore_http_request_sql_seconds_count", **route) >= 1
+    assert sample(
+        "skystore_http_request_duration_seconds_count",
+        method="GET",
+        route="unmatched",
+        status=404,
+    )
+    assert (
+        sample("skystore_http_requests_in_flight", method="GET", route="/metrics") == 1
+    )
+    assert sample("skystore_db_statements_total", engine="default") > 0
+    assert sample("skystore_db_pool_checkout_seconds_count", engine="default") > 0
+    assert sample("skystore_cache_misses_total", cache="locate") is not None
+    assert 0 <= sample("skystore_cache_hit_ratio", cache="locate") <= 1
+    assert sample("skystore_sweeper_duration_seconds_count") >= 1
+    assert sample("skystore_sweeper_rows_total", table="logical_objects") is not None
+
+
+@pytest.mark.asyncio
+async def test_sql_statement_budgets(client, monkeypatch, caplog):
+    """Proxy flows stay within their SQL statement budgets; N+1 patterns are flagged."""
+    monkeypatch.setattr(metrics, "SQL_DEBUG", True)
+
+    def call(method, path, body, budget):
+        resp = client.request(method, path, json=body)
+        resp.raise_for_status()
+        statements = int(resp.headers["x-skystore-sql-statements"])
+        assert statements <= budget, f"{path} executed {statements} statements"
+        return resp.json()
+
+    bucket = {"bucket": "my-budget-bucket"}
+    region = {"client_from_region": "aws:us-west-1"}
+    locators = call(
+        "POST",
+        "/start_create_bucket",
+        {**bucket, **region, "warmup_regions": ["aws:us-east-1"]},
+        8,
+    )["locators"]
+    for locator in locators:
+        call(
+            "PATCH",
+            "/complete_create_bucket",
+            {"id": locator["id"], "creation_date": "2020-01-01T00:00:00"},
+            5,
+        )
+
+    completed = {"size": 1, "etag": "e", "last_modified": "2020-01-01T00:00:00"}
+    upload = {**bucket, **region, "key": "my-key", "policy": "push"}
+    locators = call("POST", "/start_upload", {**upload, "is_multipart": False}, 5)
+    for locator in locators["locators"]:
+        call(
+            "PATCH",
+            "/complete_upload",
+            {"id": locator["id"], **completed, "policy": "push"},
+            3,
+        )
+
+    call("POST", "/locate_object", {**bucket, **region, "key": "my-key"}, 1)
+    call("POST", "/locate_object", {**bucket, **region, "key": "my-key"}, 0)
+    call("POST", "/head_object", {**bucket, "key": "my-key"}, 1)
+    call("POST", "/list_objects_v2", bucket, 2)
+
+    upload = {**upload, "key": "my-multipart-key"}
+    # The bucket topology is cached now: one query for the object, then the inserts
+    resp = call("POST", "/start_upload", {**upload, "is_multipart": True}, 4)
+    upload_id = resp["multipart_upload_id"]
+    for locator in resp["locators"]:
+        call(
+            "PATCH",
+            "/set_multipart_id",
+            {"id": locator["id"], "multipart_upload_id": "physical-id"},
+            4,
+        )
+    continue_request = {**upload, "multipart_upload_id": upload_id}
+    for part_number in (1, 2):
+        locators = call(
+            "POST", "/continue_upload", {**continue_request, "do_list_parts": False}, 1
+        )
+        for locator in locators:
+            call(
+                "PATCH",
+                "/append_part",
+                {
+                    "id": locator["id"],
+                    "part_number": part_number,
+                    "etag": "e",
+                    "size": 5,
+                },
+                3,
+            )
+    locators = call(
+        "POST", "/continue_upload", {**continue_request, "do_list_parts": True}, 2
+    )
+    call(
+        "POST",
+        "/list_parts",
+        {**bucket, "key": upload["key"], "upload_id": upload_id},
+        2,
+    )
+    for locator in locators:
+        call(
+            "PATCH",
+            "/complete_upload",
+            {"id": locator["id"], **completed, "policy": "push"},
+            3,
+        )
+
+    resp = call(
+        "POST",
+        "/start_delete_objects",
+        {**bucket, "keys": ["my-key", "my-multipart-key"]},
+        3,
+    )
+    ids = [locator["id"] for ls in resp["locators"].values() for locator in ls]
+    call("PATCH", "/complete_delete_objects", {"ids": ids}, 5)
+
+    # A statement repeated within one request is flagged as a possible N+1 query
+    n_plus_one = FastAPI()
+    n_plus_one.add_middleware(MetricsMiddleware)
+
+    @n_plus_one.get("/n_plus_one")
+    async def query_per_item():
+        async with engine.connect() as conn:
+            for item in range(3):
+                await conn.execute(
+                    text("SELECT key FROM logical_objects WHERE id = :id"), {"id": item}
+                )
+
+    with TestClient(n_plus_one) as n_plus_one_client:
+        with caplog.at_level("WARNING", logger="skystore"):
+            resp = n_plus_one_client.get("/n_plus_one")
+    assert resp.headers["x-skystore-sql-repeated"] == "2"
+    assert "GET /n_plus_one executed the same statement 3 times" in caplog.text
+
+    # Handlers called directly are held to budgets with capture_statements; the lookup
+    # runs its query whether or not the key filter could have ruled the key out
+    monkeypatch.setattr(object_operations, "key_filter", None)
+    async with async_read_session() as db:
+        with capture_statements() as stats:
+            await locate_object(
+                LocateObjectRequest(**bucket, **region, key="missing-key"), db
+            )
+    assert stats.statements == 1
+    assert stats.repeated() == {}
+
+
+def test_statement_shape():
+    """IN lists of any length share a shape, including Postgres' typed placeholders."""
+    for statement, shape in [
+        (
+            "SELECT id FROM t\n WHERE key IN (?, ?, ?)",
+            "SELECT id FROM t WHERE key IN (?, ...)",
+        ),
+        ("SELECT id FROM t WHERE id = ?", "SELECT id FROM t WHERE id = ?"),
+        (
+            "SELECT id FROM t WHERE key IN ($1::VARCHAR, $2::VARCHAR, $3::VARCHAR)",
+            "SELECT id FROM t WHERE key IN (?, ...)",
+        ),
+        (
+            "SELECT id FROM t WHERE ts IN ($1::TIMESTAMP WITHOUT TIME ZONE, "
+            "$2::TIMESTAMP WITHOUT TIME ZONE) AND id IN ($3::INTEGER, $4::INTEGER)",
+            "SELECT id FROM t WHERE ts IN (?, ...) AND id IN (?, ...)",
+        ),
+    ]:
+        assert statement_shape(statement) == shape
+
+
+@pytest.mark.asyncio
+async def test_sqlite_performance_profile(monkeypatch, tmp_path):
+    """The performance profile runs WAL with one writer connection, and reads on the
+    read-only pool proceed while a write transaction is open."""
+    monkeypatch.setattr(
+        "operations.utils.db.DB_URL",
+        make_url(f"sqlite+aiosqlite:///{tmp_path / 'performance.db'}"),
+    )
+    monkeypatch.setattr("operations.utils.db.use_sqlite_performance_profile", True)
+    writer = create_engine_from_env()
+    reader = create_engine_from_env(read_only=True)
+    assert writer.pool.size() == 1
+    assert reader.url.query["mode"] == "ro"
+
+    async with writer.begin() as conn:
+        await conn.exec_driver_sql("CREATE TABLE profile (value INTEGER)")
+        await conn.exec_driver_sql("INSERT INTO profile VALUES (1)")
+        assert await conn.scalar(text("PRAGMA journal_mode")) == "wal"
+        # NORMAL
+        assert await conn.scalar(text("PRAGMA synchronous")) == 1
+        assert await conn.scalar(text("PRAGMA busy_timeout")) == SQLITE_BUSY_TIMEOUT_MS
+
+    async with reader.connect() as conn:
+        with pytest.raises(OperationalError):
+            await conn.exec_driver_sql("INSERT INTO profile VALUES (2)")
+
+    monkeypatch.setattr(
+        "operations.utils.db.async_read_session",
+        async_sessionmaker(reader, expire_on_commit=False),
+    )
+    async with writer.begin() as conn:
+        await conn.exec_driver_sql("INSERT INTO profile VALUES (3)")
+        # The write transaction holds SQLite's write lock; WAL readers do not wait for
+        # it and see the last committed state
+        async for session in get_read_session():
+            values = await session.scalars(text("SELECT value FROM profile"))
+            assert list(values) == [1]
+
+    await writer.dispose()
+    await reader.dispose()
+
+
+@pytest.mark.asyncio
+async def test_group_commit(client, monkeypatch, tmp_path):
+    """A batch's writes become visible together when it commits; a failing write fails
+    alone."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'group_commit.db'}"
+    writer = create_async_engine(url, poolclass=NullPool)
+    use_explicit_transactions(writer)
+    reader = create_async_engine(url, poolclass=NullPool)
+    async with reader.connect() as conn:
+        # Outside a transaction, as SQLite requires
+        await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    async with writer.begin() as conn:
+        await conn.run_sync(DBLease.__table__.create)
+
+    async def visible():
+        async with reader.connect() as conn:
+            return await conn.scalar(select(func.count()).select_from(DBLease))
+
+    committer = GroupCommitter(
+        async_sessionmaker(writer, expire_on_commit=False), max_delay=0.05, max_batch=3
+    )
+    seen = []
+
+    def lease_write(name, fail=False):
+        async def write(db):
+            db.add(DBLease(name=name, holder="test", expires_at=datetime.utcnow()))
+            await db.flush()
+            # What another connection sees while the batch is still open
+            seen.append(await visible())
+            if fail:
+                raise ValueError(name)
+            return name
+
+        return write
+
+    names = [f"group-commit-{i}" for i in range(5)]
+    results = await asyncio.gather(
+        *[
+            committer.submit(lease_write(name, fail=name.endswith("1")))
+            for name in names
+        ],
+        return_exceptions=True,
+    )
+    assert results[0] == names[0] and results[2:] == names[2:]
+    assert isinstance(results[1], ValueError)
+    # Nothing in the first batch of three is visible until it commits, and then both of
+    # its successful writes appear at once
+    assert seen == [0, 0, 0, 2, 2]
+    assert await visible() == 4
+    async with reader.connect() as conn:
+        stored = await conn.scalars(select(DBLease.name).order_by(DBLease.name))
+        assert list(stored) == names[:1] + names[2:]
+    await writer.dispose()
+    await reader.dispose()
+
+    # Handlers acknowledge writes once the batch holding them commits
+    monkeypatch.setattr(
+        group_commit,
+        "group_committer",
+        GroupCommitter(async_session, max_delay=0.05, max_batch=3),
+    )
+    bucket = {"bucket": "my-group-commit-bucket"}
+    resp = client.post(
+        "/start_create_bucket", json={**bucket, "client_from_region": "aws:us-west-1"}
+    )
+    resp.raise_for_status()
+    batches = group_commit.batch_size.values[()][2]
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://skystore"
+    ) as async_client:
+        responses = await asyncio.gather(
+            *[
+                async_client.patch(
+                    "/complete_create_bucket",
+                    json={"id": locator["id"], "creation_date": "2020-01-01T00:00:00"},
+                )
+                for locator in resp.json()["locators"]
+            ]
+        )
+    assert all(response.status_code == 200 for response in responses)
+    assert group_commit.batch_size.values[()][2] - batches == 2
+    resp = client.post(
+        "/locate_bucket_status", json={**bucket, "client_from_region": "aws:us-west-1"}
+    )
+    assert resp.json()["status"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_background_task_lease(client):
+    """Only one worker holds a lease; another takes it over once released or expired."""
+    first = Lease("test-lease", ttl=timedelta(minutes=5), holder="worker-1")
+    second = Lease("test-lease", ttl=timedelta(minutes=5), holder="worker-2")
+
+    assert await first.acquire()
+    assert not await second.acquire()
+    # The holder renews its own lease
+    assert await first.acquire()
+    assert not await second.acquire()
+
+    await first.release()
+    assert await second.acquire()
+    assert not await first.acquire()
+
+    # A lease its holder stopped renewing expires
+    second.ttl = timedelta(seconds=-1)
+    assert await second.acquire()
+    assert await first.acquire()
+    assert not await second.acquire()
+    await first.release()
@@ -0,0 +1,169 @@
+from types import SimpleNamespace
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from experiment.simulator import encode_trace, simulate
+from experiment.trace_generator import TraceSpec, write_trace
+from operations.policy.transfer_policy import get_transfer_policy
+from operations.policy.utils.definitions import GB
+from operations.policy.utils.helper import make_nx_graph
+from operations.policy.utils.profile_matrix import RegionProfiles, load_profiles
+from operations.schemas.object_schemas import LocateObjectRequest
+
+
+def test_compiled_profiles_round_trip(tmp_path):
+    """The compiled artifact loads back into the graph parsed from the CSV profiles."""
+    graph = make_nx_graph()
+    path = str(tmp_path / "profiles.bin")
+    RegionProfiles.from_graph(graph).save(path)
+
+    loaded = RegionProfiles.load(path)
+    assert loaded.regions == list(graph.nodes)
+    assert not loaded.cost.flags.writeable
+
+    compiled_graph = loaded.to_graph()
+    assert dict(compiled_graph.nodes(data=True)) == dict(graph.nodes(data=True))
+    assert set(compiled_graph.edges) == set(graph.edges)
+    for src, dst, data in graph.edges(data=True):
+        assert compiled_graph[src][dst] == data
+
+    doubled = loaded.to_graph(num_vms=2)
+    src, dst = next(iter(graph.edges))
+    assert doubled[src][dst]["throughput"] == 2 * graph[src][dst]["throughput"]
+
+
+def test_transfer_policies_share_profiles():
+    """Constructing policies does not reload the profiles."""
+    cheapest = get_transfer_policy("cheapest")
+    closest = get_transfer_policy("closest")
+    assert cheapest.stat_graph is closest.stat_graph
+
+
+def test_make_nx_graph():
+    """Every region and link is built; benchmark/policy_graph.py times the build."""
+    graph = make_nx_graph()
+
+    assert graph.number_of_nodes() == 71
+    assert graph.number_of_edges() == 71 * 71
+    assert sum("latency" in data for _, _, data in graph.edges(data=True)) == 343
+
+
+def test_matrix_transfer_policies_match_graph():
+    """Matrix-backed picks, single and batched, match the graph-based definition."""
+    graph = make_nx_graph()
+    regions = list(graph.nodes)
+    rng = random.Random(0)
+    clients, locator_sets = [], []
+    for _ in range(2000):
+        clients.append(rng.choice(regions))
+        locator_sets.append(
+            [
+                SimpleNamespace(location_tag=region)
+                for region in rng.sample(regions, rng.randint(1, 6))
+            ]
+        )
+
+    for name, metric, pick in [
+        ("cheapest", "cost", min),
+        ("closest", "throughput", max),
+    ]:
+        policy = get_transfer_policy(name)
+
+        def expected(client, locators):
+            for locator in locators:
+                if locator.location_tag == client:
+                    return locator
+            return pick(
+                locators, key=lambda loc: graph[client][loc.location_tag][metric]
+            )
+
+        singles = [
+            policy.get(
+                LocateObjectRequest(bucket="b", key="k", client_from_region=client),
+                locators,
+            )
+            for client, locators in zip(clients, locator_sets)
+        ]
+        batch = policy.get_many(clients, locator_sets)
+        for client, locators, single, batched in zip(
+            clients, locator_sets, singles, batch
+        ):
+            assert single is expected(client, locators)
+            assert batched is single
+
+    # A local copy wins even when the region has no profile
+    policy = get_transfer_policy("cheapest")
+    local = SimpleNamespace(location_tag="gcp:us-west1")
+    remote = SimpleNamespace(location_tag="aws:us-west-1")
+    assert policy.get_many(["gcp:us-west1"], [[remote, local]]) == [local]
+    with pytest.raises(KeyError):
+        policy.get_many(["gcp:us-west1"], [[remote]])
+
+
+def test_simulator_accounts_trace(tmp_path):
+    """Replaying the bundled trace charges one cross-region read per read."""
+    trace_regions, num_objects = encode_trace(
+        os.path.join("experiment", "trace", "two_regions.csv"), str(tmp_path)
+    )
+    regions = ["aws:eu-south-1", "aws:eu-north-1"]
+    trace_region_ids = [regions.index(r) for r in trace_regions]
+
+    result = simulate(
+        "write_local", "cheapest", regions, str(tmp_path), trace_region_ids, num_objects
+    )
+    assert "error" not in result
+    assert (result["reads"], result["writes"], result["failed_reads"]) == (2, 1, 0)
+
+    profiles = load_profiles()
+    src, dst = (profiles.region_index[r] for r in regions)
+    assert result["egress_cost"] == pytest.approx(
+        2 * 100000 / GB * profiles.cost[src, dst]
+    )
+    assert result["request_cost"] == pytest.approx(
+        profiles.price_put[src] + 2 * profiles.price_get[src]
+    )
+    assert result["storage_cost"] > 0
+
+
+def test_trace_generator(tmp_path):
+    """Generated traces are time-ordered, read only written objects and replay cleanly."""
+    spec = TraceSpec(
+        regions={"aws:us-east-1": 2, "aws:eu-central-1": 1},
+        ops=20000,
+        objects=1000,
+        affinity=1.0,
+        drift_hours=0,
+        diurnal_amplitude=0,
+    )
+    path = str(tmp_path / "trace.csv.gz")
+    assert write_trace(spec, path, chunk_rows=5000) == (20000, 1000)
+
+    trace = pd.read_csv(path, parse_dates=["timestamp"])
+    assert list(trace.columns) == ["timestamp", "op", "issue_region", "data_id", "size"]
+    assert trace["timestamp"].is_monotonic_increasing
+    assert (trace.groupby("data_id")["op"].first() == "write").all()
+    assert (trace.groupby("data_id")["size"].nunique() == 1).all()
+    # Without drift every object is only requested from its home region
+    assert (trace.groupby("data_id")["issue_region"].nunique() == 1).all()
+    assert (trace["issue_region"] == "aws:us-east-1").mean() == pytest.approx(
+        2 / 3, abs=0.02
+    )
+    # Identical specs generate identical traces
+    write_trace(spec, str(tmp_path / "again.csv.gz"), chunk_rows=5000)
+    assert pd.read_csv(str(tmp_path / "again.csv.gz")).equals(pd.read_csv(path))
+
+    trace_regions, num_objects = encode_trace(path, str(tmp_path))
+    result = simulate(
+        "write_local",
+        "cheapest",
+        trace_regions,
+        str(tmp_path),
+        list(range(len(trace_regions))),
+        num_objects,
+    )
+    assert result["reads"] + result["writes"] == 20000
+    assert result["failed_reads"] == 0
+    assert result["egress_cost"] == 0